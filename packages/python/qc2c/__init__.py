@@ -0,0 +1 @@
+from .geocoder import Geocoder
@@ -0,0 +1,59 @@
+from typing import Optional
+
+from .geocoder import Geocoder
+from .nearest import DEFAULT_MAX_DISTANCE
+
+try:
+    import pyarrow as pa
+except ImportError:  # pyarrow is an optional extra
+    pa = None
+
+
+def _require_pyarrow() -> None:
+    if pa is None:
+        raise ImportError(
+            "qc2c arrow lookups require pyarrow, install it with: pip install qc2c[arrow]"
+        )
+
+
+def lookup(
+    table, lat: str = "lat", lng: str = "lng", geocoder: Optional[Geocoder] = None,
+    max_distance: Optional[float] = DEFAULT_MAX_DISTANCE,
+):
+    """
+    Determine countries of coordinates columns of Arrow table, requires pyarrow and numpy.
+
+    Record batches are looked up one by one, float64 columns without nulls are read without copying
+    and countries are returned dictionary encoded, so results take 4 bytes per row.
+
+    Args:
+        table: `pyarrow.Table` or `pyarrow.RecordBatch`.
+        lat: Name of latitude column.
+        lng: Name of longitude column.
+        geocoder: Geocoder to use, pass one to reuse loaded sectors across calls.
+        max_distance: Points outside of all polygons get the country with the nearest border
+            within this distance in km, None to disable, see `Geocoder.lookup_codes`.
+
+    Returns:
+        `pyarrow.ChunkedArray` of dictionary<int32, string> type, one chunk per record batch,
+        null where no country was found.
+    """
+    _require_pyarrow()
+    geocoder = geocoder or Geocoder()
+    if isinstance(table, pa.RecordBatch):
+        table = pa.Table.from_batches([table])
+
+    categories = []
+    batches_codes = []
+    # aligned batches of both columns, chunks of columns may differ
+    for batch in table.select([lat, lng]).to_batches():
+        lats, lngs = (column.to_numpy(zero_copy_only=False) for column in batch.columns)
+        codes, categories = geocoder.lookup_codes(lats, lngs, max_distance, categories)
+        batches_codes.append(codes)
+
+    # codes are consistent across batches, so all chunks share the final dictionary
+    dictionary = pa.array(categories, pa.string())
+    return pa.chunked_array(
+        [pa.DictionaryArray.from_arrays(pa.array(codes, mask=codes < 0), dictionary) for codes in batches_codes],
+        type=pa.dictionary(pa.int32(), pa.string()),
+    )
@@ -0,0 +1,245 @@
+import mmap
+import struct
+import sys
+from array import array
+from collections.abc import Mapping, Sequence
+from itertools import accumulate
+from typing import Dict, Iterator, List, Optional, Tuple
+
+from .sector import GRID_CELL_SIZE, CompiledSector
+
+# Binary sector layout, all values little-endian:
+#   header: magic "QC2C", version (u16), coordinates typecode ("d" or "f"), padding,
+#           number of countries, polygons, points and size of names block (u32 each)
+#   coordinates: flat [lat, lng, lat, lng, ...] array of all polygon points
+#   country offsets: index of the first polygon of each country, plus total polygons count
+#   polygon offsets: index of the first point of each polygon, plus total points count
+#   names: utf-8 country keys separated by newlines
+#   (version 2) padding to 4 bytes, then grid index of `CompiledSector`:
+#     index header: cell size in degrees (f64), counts and values typecodes ("B", "H" or "I"), padding,
+#                   number of cells and cell values (u32 each)
+#     cell counts: number of values of each cell, padded to 4 bytes
+#     cell values: entry position in lookup order times two, plus one for cells lying fully inside the polygon
+MAGIC = b"QC2C"
+VERSION = 2
+# version 1 files have no grid index, it is built on load
+VERSIONS = (1, 2)
+HEADER = struct.Struct("<4sHcxIIII")
+INDEX_HEADER = struct.Struct("<dccxxII")
+
+
+def _get_typecode(maximum: int) -> str:
+    # smallest unsigned typecode holding the value
+    return "B" if maximum < 0x100 else "H" if maximum < 0x10000 else "I"
+
+
+def dumps_sector(
+    sector_manifest: Dict[str, List[List[List[float]]]], typecode: str = "d", cell_size: float = GRID_CELL_SIZE
+) -> bytes:
+    """
+    Serialize sector into binary format, with grid index of the compiled sector.
+
+    Args:
+        sector_manifest: Dict mapping country keys to polygons (list of coordinate lists).
+        typecode: Coordinates precision, "d" for float64 or "f" for float32.
+        cell_size: Size of grid index cell in degrees, sectors compiled with other cell size build their index.
+
+    Returns:
+        Binary sector.
+    """
+    coordinates = array(typecode)
+    country_offsets = array("I", [0])
+    polygon_offsets = array("I", [0])
+    for polygons in sector_manifest.values():
+        for polygon in polygons:
+            for lat, lng in polygon:
+                coordinates.append(lat)
+                coordinates.append(lng)
+            polygon_offsets.append(len(coordinates) // 2)
+        country_offsets.append(len(polygon_offsets) - 1)
+    names = "\n".join(sector_manifest).encode("utf-8")
+
+    if sys.byteorder != "little":
+        for values in (coordinates, country_offsets, polygon_offsets):
+            values.byteswap()
+
+    header = HEADER.pack(
+        MAGIC, VERSION, typecode.encode("ascii"),
+        len(sector_manifest), len(polygon_offsets) - 1, len(coordinates) // 2, len(names),
+    )
+    body = header + coordinates.tobytes() + country_offsets.tobytes() + polygon_offsets.tobytes() + names
+    body += bytes(-len(body) % 4)
+
+    # index is built over coordinates as read back, so lookup order matches the reader exactly
+    sector = CompiledSector(BinarySector(body + INDEX_HEADER.pack(cell_size, b"B", b"B", 0, 0)), cell_size)
+    cells = sector.index.get_cells(sector.entries)
+    cell_counts = array(_get_typecode(max(map(len, cells), default=0)), map(len, cells))
+    cell_values = array(_get_typecode(2 * len(sector.entries)), (value for cell in cells for value in cell))
+    if sys.byteorder != "little":
+        for values in (cell_counts, cell_values):
+            values.byteswap()
+    index_header = INDEX_HEADER.pack(
+        cell_size, cell_counts.typecode.encode("ascii"), cell_values.typecode.encode("ascii"),
+        len(cell_counts), len(cell_values),
+    )
+    counts = cell_counts.tobytes()
+    return body + index_header + counts + bytes(-len(counts) % 4) + cell_values.tobytes()
+
+
+def dump_sector(
+    sector_manifest: Dict[str, List[List[List[float]]]], file_path: str, typecode: str = "d",
+    cell_size: float = GRID_CELL_SIZE,
+) -> None:
+    """
+    Write sector in binary format.
+
+    Args:
+        sector_manifest: Dict mapping country keys to polygons (list of coordinate lists).
+        file_path: Output file path.
+        typecode: Coordinates precision, "d" for float64 or "f" for float32.
+        cell_size: Size of grid index cell in degrees.
+    """
+    with open(file_path, "wb") as file:
+        file.write(dumps_sector(sector_manifest, typecode, cell_size))
+
+
+def _cast(buffer: memoryview, typecode: str):
+    if sys.byteorder == "little":
+        return buffer.cast(typecode)
+    # big-endian platforms can not share pages, swap a private copy
+    values = array(typecode, buffer.tobytes())
+    values.byteswap()
+    return values
+
+
+class Ring(Sequence):
+    """
+    Polygon view over flat coordinates, without copying them.
+
+    Args:
+        coordinates: Flat [lat, lng, lat, lng, ...] sequence of polygon points.
+    """
+
+    __slots__ = ("coordinates",)
+
+    def __init__(self, coordinates):
+        self.coordinates = coordinates
+
+    def __len__(self) -> int:
+        return len(self.coordinates) // 2
+
+    def __getitem__(self, index: int) -> Tuple[float, float]:
+        n = len(self.coordinates) // 2
+        if index < 0:
+            index += n
+        if not 0 <= index < n:
+            raise IndexError("ring index out of range")
+        return self.coordinates[2 * index], self.coordinates[2 * index + 1]
+
+
+class BinarySector(Mapping):
+    """
+    Sector manifest backed by binary sector buffer.
+
+    Coordinates are never copied: polygons are `Ring` views over the buffer,
+    so sectors opened with `load_sector` share memory pages between processes.
+    Grid index stored with the sector is restored by `CompiledSector` without testing polygons against cells.
+
+    Args:
+        buffer: Binary sector, as produced by `dumps_sector`.
+    """
+
+    def __init__(self, buffer):
+        view = memoryview(buffer)
+        magic, version, typecode, n_countries, n_polygons, n_points, names_size = HEADER.unpack_from(view)
+        if magic != MAGIC or version not in VERSIONS:
+            raise ValueError("unsupported binary sector format")
+        typecode = typecode.decode("ascii")
+
+        start = HEADER.size
+        end = start + 2 * n_points * array(typecode).itemsize
+        self.coordinates = _cast(view[start:end], typecode)
+        start, end = end, end + 4 * (n_countries + 1)
+        self.country_offsets = _cast(view[start:end], "I")
+        start, end = end, end + 4 * (n_polygons + 1)
+        self.polygon_offsets = _cast(view[start:end], "I")
+        names = bytes(view[end:end + names_size]).decode("utf-8")
+        self.names = names.split("\n") if n_countries else []
+        self._index = {name: i for i, name in enumerate(self.names)}
+
+        self._grid_index = None
+        if version >= 2:
+            start = end + names_size
+            start += -start % 4
+            cell_size, counts_typecode, values_typecode, n_cells, n_values = INDEX_HEADER.unpack_from(view, start)
+            counts_typecode, values_typecode = counts_typecode.decode("ascii"), values_typecode.decode("ascii")
+            start += INDEX_HEADER.size
+            end = start + n_cells * array(counts_typecode).itemsize
+            cell_counts = _cast(view[start:end], counts_typecode)
+            start = end + (-end % 4)
+            cell_values = _cast(view[start:start + n_values * array(values_typecode).itemsize], values_typecode)
+            if n_cells:
+                self._grid_index = cell_size, cell_counts, cell_values
+
+    def __getitem__(self, key: str) -> List[Ring]:
+        i = self._index[key]
+        offsets = self.polygon_offsets
+        return [
+            Ring(self.coordinates[2 * offsets[polygon]:2 * offsets[polygon + 1]])
+            for polygon in range(self.country_offsets[i], self.country_offsets[i + 1])
+        ]
+
+    def __iter__(self) -> Iterator[str]:
+        return iter(self.names)
+
+    def flat_polygons(self, key: str) -> List[Tuple[memoryview, Tuple[int, int]]]:
+        """
+        Get country polygons flattened, as views over the buffer.
+
+        Args:
+            key: Country key.
+
+        Returns:
+            List of (coordinates, rings offsets) for every polygon of the country.
+        """
+        i = self._index[key]
+        offsets = self.polygon_offsets
+        result = []
+        for polygon in range(self.country_offsets[i], self.country_offsets[i + 1]):
+            start, end = offsets[polygon], offsets[polygon + 1]
+            result.append((self.coordinates[2 * start:2 * end], (0, end - start)))
+        return result
+
+    def __len__(self) -> int:
+        return len(self.names)
+
+    def get_index_cells(self, cell_size: float) -> Optional[List[memoryview]]:
+        """
+        Get grid index cells stored with the sector, see `GridIndex.get_cells`.
+
+        Args:
+            cell_size: Size of grid index cell in degrees.
+
+        Returns:
+            Cell values of every cell, None if the sector has no index of this cell size.
+        """
+        if self._grid_index is None or self._grid_index[0] != cell_size:
+            return None
+        _, counts, values = self._grid_index
+        values = values.tolist()
+        empty = ()
+        return [values[end - count:end] if count else empty for count, end in zip(counts, accumulate(counts))]
+
+
+def load_sector(file_path: str) -> BinarySector:
+    """
+    Open binary sector file, memory-mapped read-only.
+
+    Args:
+        file_path: Binary sector file path.
+
+    Returns:
+        Sector manifest backed by the mapped file.
+    """
+    with open(file_path, "rb") as file:
+        return BinarySector(mmap.mmap(file.fileno(), 0, access=mmap.ACCESS_READ))
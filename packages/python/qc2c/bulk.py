@@ -0,0 +1,340 @@
+from typing import Any, Dict, List, Mapping, Optional, Sequence, Tuple
+
+from .core import get_bounds, get_polygons
+from .nearest import DEGREE_LENGTH
+
+try:
+    import numpy as np
+except ImportError:  # numpy is an optional extra
+    np = None
+
+# upper bound of (points x edges) cells evaluated at once by points_in_polygon
+CHUNK_SIZE = 1 << 20
+# size of BorderIndex cells in degrees, a few of them cover the default nearest country search distance
+BORDER_CELL_SIZE = 0.25
+
+
+def _require_numpy() -> None:
+    if np is None:
+        raise ImportError(
+            "qc2c bulk lookups require numpy, install it with: pip install qc2c[numpy]"
+        )
+
+
+def points_in_polygon(lats, lngs, polygon: List[List[float]]):
+    """
+    Check which points are inside a polygon, vectorized over points and polygon edges.
+
+    Uses the same ray casting rule as `core.point_in_polygon`, so both paths agree on every point.
+
+    Args:
+        lats: 1-D array of latitudes.
+        lngs: 1-D array of longitudes.
+        polygon: List of [lat, lng] points defining polygon vertices.
+
+    Returns:
+        Boolean array, True where the point is inside polygon.
+    """
+    _require_numpy()
+    x = np.asarray(lats, dtype=np.float64)
+    y = np.asarray(lngs, dtype=np.float64)
+    inside = np.zeros(x.shape, dtype=bool)
+
+    vertices = np.asarray(polygon, dtype=np.float64).reshape(-1, 2)
+    if len(vertices) == 0 or len(x) == 0:
+        return inside
+
+    # reject points outside of polygon bounding box before touching the edges
+    lat_min, lng_min = vertices.min(axis=0)
+    lat_max, lng_max = vertices.max(axis=0)
+    candidates = np.flatnonzero((x >= lat_min) & (x <= lat_max) & (y >= lng_min) & (y <= lng_max))
+    if len(candidates) == 0:
+        return inside
+
+    xi, yi = vertices[:, 0], vertices[:, 1]
+    xj, yj = np.roll(xi, 1), np.roll(yi, 1)
+    slope = (xj - xi) / (yj - yi + 1e-15)
+
+    step = max(1, CHUNK_SIZE // len(vertices))
+    for start in range(0, len(candidates), step):
+        index = candidates[start:start + step]
+        px = x[index, None]
+        py = y[index, None]
+        crossing = ((yi > py) != (yj > py)) & (px < slope * (py - yi) + xi)
+        inside[index] = (np.count_nonzero(crossing, axis=1) % 2) == 1
+    return inside
+
+
+def as_coordinates(lats, lngs) -> Tuple[Any, Any]:
+    """
+    Convert latitudes and longitudes to float64 arrays, without copying contiguous float64 input.
+
+    Args:
+        lats: 1-D array-like of latitudes.
+        lngs: 1-D array-like of longitudes.
+
+    Returns:
+        (latitudes array, longitudes array).
+    """
+    _require_numpy()
+    x = np.asarray(lats, dtype=np.float64)
+    y = np.asarray(lngs, dtype=np.float64)
+    if x.shape != y.shape or x.ndim != 1:
+        raise ValueError("lats and lngs must be 1-D arrays of the same length")
+    return x, y
+
+
+def lookup_codes(
+    sectors_manifest: Dict[str, Any], sectors: Mapping[str, Dict[str, Sequence]], lats, lngs,
+    categories: Optional[List[str]] = None,
+) -> Tuple[Any, List[str]]:
+    """
+    Determine countries for many coordinates at once, as integer codes of country keys.
+
+    Points are bucketed by sector bounds first, then each sector is loaded once
+    and its polygons are tested against all points of the bucket.
+    As in `get_sector` and `get_country`, the first matching sector and country win.
+    Contiguous float64 arrays are used without copying and no Python object is created per point,
+    so results of large batches take 4 bytes per point.
+
+    Args:
+        sectors_manifest: Dict mapping sector keys to bounding box lists [lat_min, lng_min, lat_max, lng_max]
+            (or to dicts with 'bounds' key).
+        sectors: Mapping of sector keys to sector manifests, accessed only for sectors containing points.
+        lats: 1-D array of latitudes.
+        lngs: 1-D array of longitudes.
+        categories: Country keys of already assigned codes, extended in place with new countries,
+            so codes stay consistent across batches.
+
+    Returns:
+        (int32 array of indexes into categories, -1 where no country was found, categories).
+    """
+    x, y = as_coordinates(lats, lngs)
+    categories = [] if categories is None else categories
+    codes_index = {country: code for code, country in enumerate(categories)}
+    codes = np.full(x.shape, -1, dtype=np.int32)
+    pending = np.ones(x.shape, dtype=bool)
+
+    for key, sector in sectors_manifest.items():
+        lat_min, lng_min, lat_max, lng_max = get_bounds(sector)
+        in_sector = pending & (x >= lat_min) & (x <= lat_max) & (y >= lng_min) & (y <= lng_max)
+        index = np.flatnonzero(in_sector)
+        if len(index) == 0:
+            continue
+        # first matching sector wins, same as get_sector
+        pending[index] = False
+
+        for country, polygons in sectors[key].items():
+            for polygon in get_polygons(polygons):
+                if len(index) == 0:
+                    break
+                # even-odd rule across rings, points inside holes are outside of polygon
+                hit = np.zeros(index.shape, dtype=bool)
+                for ring in polygon:
+                    hit ^= points_in_polygon(x[index], y[index], ring)
+                if not hit.any():
+                    continue
+                if country not in codes_index:
+                    codes_index[country] = len(categories)
+                    categories.append(country)
+                codes[index[hit]] = codes_index[country]
+                index = index[~hit]
+    return codes, categories
+
+
+class BorderIndex:
+    """
+    Polygon edges of a sector bucketed into raster cells, for nearest border queries vectorized over points.
+
+    Points with no edge within the search distance are rejected by counting edge cells of their search box,
+    distances are measured only to edges in cells of the box, so large coastline polygons are not scanned whole.
+    Edges are sampled at most one cell apart and searched boxes are grown by one cell,
+    so no edge within the search box is missed.
+
+    Args:
+        sector: Compiled sector, integer coordinates of quantized sectors are scaled back to degrees.
+        cell_size: Size of raster cell in degrees.
+    """
+
+    def __init__(self, sector, cell_size: float = BORDER_CELL_SIZE):
+        _require_numpy()
+        self.cell_size = cell_size
+        self.keys = []
+        resolution = getattr(sector, "resolution", 1.0)
+        keys_index = {}
+        starts, ends, owners = [], [], []
+        for key, _, (coordinates, offsets) in sector.entries:
+            code = keys_index.get(key)
+            if code is None:
+                code = keys_index[key] = len(self.keys)
+                self.keys.append(key)
+            points = np.asarray(coordinates, dtype=np.float64).reshape(-1, 2)
+            for r in range(len(offsets) - 1):
+                ring = points[offsets[r]:offsets[r + 1]]
+                if len(ring):
+                    # every edge ends at the start of the previous one, rings are closed
+                    starts.append(ring)
+                    ends.append(np.roll(ring, 1, axis=0))
+                    owners.append(np.full(len(ring), code, dtype=np.int32))
+        if not starts:
+            self.lat, self.lng, self.rows, self.cols = 0.0, 0.0, 0, 0
+            self.counts = np.zeros((1, 1), dtype=np.int64)
+            return
+
+        self.a = np.concatenate(starts) * resolution
+        self.b = np.concatenate(ends) * resolution
+        self.owners = np.concatenate(owners)
+        a, b = self.a, self.b
+        steps = np.ceil(np.abs(b - a).max(axis=1) / cell_size).astype(np.int64) + 1
+        edges = np.repeat(np.arange(len(a)), steps)
+        t = (np.arange(len(edges)) - np.repeat(np.cumsum(steps) - steps, steps)) / np.repeat(
+            np.maximum(steps - 1, 1), steps
+        )
+        samples = a[edges] + (b - a)[edges] * t[:, None]
+
+        self.lat, self.lng = samples.min(axis=0)
+        cells = ((samples - (self.lat, self.lng)) / cell_size).astype(np.int64)
+        self.rows, self.cols = (int(count) for count in cells.max(axis=0) + 1)
+        cells = cells[:, 0] * self.cols + cells[:, 1]
+
+        # edges of every cell, cell by cell, each edge once per cell
+        pairs = np.unique(cells * len(a) + edges)
+        self.edges = pairs % len(a)
+        self.offsets = np.searchsorted(pairs // len(a), np.arange(self.rows * self.cols + 1))
+        # summed area table of cells with edges, counts of such cells in any box take four reads
+        marked = (np.diff(self.offsets) > 0).reshape(self.rows, self.cols).astype(np.int64)
+        self.counts = np.zeros((self.rows + 1, self.cols + 1), dtype=np.int64)
+        self.counts[1:, 1:] = marked.cumsum(axis=0).cumsum(axis=1)
+
+    def _get_boxes(self, lats, lngs, lat_radius: float, lng_radius):
+        # rows and columns of cells of search boxes, grown by one cell, clipped to the raster
+        size = self.cell_size
+        row_min = np.floor((lats - lat_radius - self.lat) / size) - 1
+        row_max = np.floor((lats + lat_radius - self.lat) / size) + 1
+        col_min = np.floor((lngs - lng_radius - self.lng) / size) - 1
+        col_max = np.floor((lngs + lng_radius - self.lng) / size) + 1
+        inside = (row_max >= 0) & (row_min < self.rows) & (col_max >= 0) & (col_min < self.cols)
+        row_min, row_max = (np.clip(rows, 0, self.rows - 1).astype(np.int64) for rows in (row_min, row_max))
+        col_min, col_max = (np.clip(cols, 0, self.cols - 1).astype(np.int64) for cols in (col_min, col_max))
+        return inside, row_min, row_max, col_min, col_max
+
+    def near(self, lats, lngs, lat_radius: float, lng_radius):
+        """
+        Check which points may have a border within the search box.
+
+        Args:
+            lats: 1-D array of finite latitudes.
+            lngs: 1-D array of finite longitudes.
+            lat_radius: Search radius along latitude, in degrees.
+            lng_radius: Search radius along longitude, in degrees, scalar or array of one per point.
+
+        Returns:
+            Boolean array, False where no edge of the sector is within the search box.
+        """
+        if not self.rows:
+            return np.zeros(np.shape(lats), dtype=bool)
+        inside, row_min, row_max, col_min, col_max = self._get_boxes(lats, lngs, lat_radius, lng_radius)
+        counts = self.counts
+        marked = (
+            counts[row_max + 1, col_max + 1] - counts[row_min, col_max + 1]
+            - counts[row_max + 1, col_min] + counts[row_min, col_min]
+        )
+        return inside & (marked > 0)
+
+    def nearest(self, lats, lngs, lat_radius: float, lng_radius, max_distance: float) -> Tuple[Any, Any, Any]:
+        """
+        Find the country with the nearest border of every point.
+
+        Distances are measured as in `nearest.distance_to_polygon`, countries at the same distance,
+        e.g. sharing the nearest vertex, are resolved in lookup order.
+
+        Args:
+            lats: 1-D array of finite latitudes.
+            lngs: 1-D array of finite longitudes.
+            lat_radius: Search radius along latitude, in degrees, see `nearest.get_search_radius`.
+            lng_radius: Search radius along longitude, in degrees, array of one per point.
+            max_distance: Maximum distance to the border, in km.
+
+        Returns:
+            (indexes of points with a border within max_distance, indexes into `keys` of their countries,
+            distances in km).
+        """
+        points = np.flatnonzero(self.near(lats, lngs, lat_radius, lng_radius))
+        empty = np.zeros(0, dtype=np.int64)
+        if len(points) == 0:
+            return empty, empty, np.zeros(0)
+        _, row_min, row_max, col_min, col_max = self._get_boxes(
+            lats[points], lngs[points], lat_radius, lng_radius[points]
+        )
+
+        # ranges of edges of every box row, cells of a row are contiguous
+        starts, stops, owners = [], [], []
+        for row in range(int((row_max - row_min).max()) + 1):
+            valid = np.flatnonzero(row_min + row <= row_max)
+            cells = (row_min[valid] + row) * self.cols
+            starts.append(self.offsets[cells + col_min[valid]])
+            stops.append(self.offsets[cells + col_max[valid] + 1])
+            owners.append(valid)
+        starts, stops, owners = np.concatenate(starts), np.concatenate(stops), np.concatenate(owners)
+        lengths = stops - starts
+        owners = np.repeat(owners, lengths)
+        edges = self.edges[
+            np.arange(lengths.sum()) - np.repeat(np.cumsum(lengths) - lengths - starts, lengths)
+        ]
+
+        # equirectangular projection around every point, as in distance_to_polygon, edges from the previous point
+        # in the same direction, so both give the same distances
+        lat, lng = lats[points][owners], lngs[points][owners]
+        scale = np.cos(np.radians(lat))
+        ax, ay = self.b[edges, 0] - lat, (self.b[edges, 1] - lng) * scale
+        bx, by = self.a[edges, 0] - lat, (self.a[edges, 1] - lng) * scale
+        dx, dy = bx - ax, by - ay
+        length = dx * dx + dy * dy
+        t = np.clip(-(ax * dx + ay * dy) / np.where(length == 0, 1.0, length), 0.0, 1.0)
+        px, py = ax + t * dx, ay + t * dy
+        distances = np.sqrt(px * px + py * py) * DEGREE_LENGTH
+
+        # the nearest edge of every point, the first of sorted distances, on ties the edge of the country
+        # tested first by lookups, entries are in lookup order
+        order = np.lexsort((edges, distances, owners))
+        owners, first = np.unique(owners[order], return_index=True)
+        nearest = order[first]
+        found = distances[nearest] <= max_distance
+        return points[owners[found]], self.owners[edges[nearest[found]]], distances[nearest[found]]
+
+
+def decode_codes(codes, categories: List[str]):
+    """
+    Convert country codes to country keys.
+
+    Args:
+        codes: Array of indexes into categories, -1 where no country was found.
+        categories: Country keys.
+
+    Returns:
+        Object array of country keys, None where no country was found.
+    """
+    _require_numpy()
+    # code -1 picks the trailing None
+    return np.array(categories + [None], dtype=object)[codes]
+
+
+def lookup_many(
+    sectors_manifest: Dict[str, Any], sectors: Mapping[str, Dict[str, Sequence]], lats, lngs
+):
+    """
+    Determine countries for many coordinates at once.
+
+    Same as `lookup_codes`, with country keys in the result.
+
+    Args:
+        sectors_manifest: Dict mapping sector keys to bounding box lists [lat_min, lng_min, lat_max, lng_max]
+            (or to dicts with 'bounds' key).
+        sectors: Mapping of sector keys to sector manifests, accessed only for sectors containing points.
+        lats: 1-D array of latitudes.
+        lngs: 1-D array of longitudes.
+
+    Returns:
+        Object array of country keys, None where no country was found.
+    """
+    return decode_codes(*lookup_codes(sectors_manifest, sectors, lats, lngs))
@@ -0,0 +1,316 @@
+import argparse
+import csv
+import os
+import sys
+import time
+from collections import deque
+from math import isfinite, nan
+from multiprocessing import Pool
+from typing import Any, Dict, Iterable, Iterator, List, Optional, Sequence, Tuple
+
+from .geocoder import Geocoder
+
+# rows read, sent to a worker and written at once, memory use is bounded by a few chunks per worker
+DEFAULT_CHUNK_SIZE = 50000
+DEFAULT_COUNTRY_COLUMN = "country"
+PARQUET_EXTENSIONS = (".parquet", ".pq")
+
+_geocoder = None
+
+
+def _require_pyarrow():
+    try:
+        import pyarrow
+        import pyarrow.parquet
+    except ImportError:  # pyarrow is an optional extra
+        raise ImportError("parquet files require pyarrow, install it with: pip install qc2c[arrow]")
+    return pyarrow, pyarrow.parquet
+
+
+def _init_worker(quantized: bool) -> None:
+    global _geocoder
+    _geocoder = Geocoder(binary=not quantized, quantized=quantized)
+
+
+def _parse_coordinate(value: Any) -> float:
+    try:
+        return float(value)
+    except (TypeError, ValueError):
+        return nan
+
+
+def _lookup_chunk(lats: Sequence[Any], lngs: Sequence[Any], max_distance: Optional[float]) -> List[Optional[str]]:
+    lookup = _geocoder.lookup
+    countries = []
+    for lat, lng in zip(lats, lngs):
+        lat, lng = _parse_coordinate(lat), _parse_coordinate(lng)
+        # empty, malformed, nan and inf coordinates get no country
+        countries.append(lookup(lat, lng, max_distance) if isfinite(lat) and isfinite(lng) else None)
+    return countries
+
+
+def _lookup_codes_chunk(lats, lngs, max_distance: Optional[float]) -> Tuple[Any, List[str]]:
+    return _geocoder.lookup_codes(lats, lngs, max_distance)
+
+
+def lookup_chunks(
+    chunks: Iterable[Tuple[Any, Sequence[Any], Sequence[Any]]], workers: int = 1,
+    max_distance: Optional[float] = None, quantized: bool = False, columnar: bool = False,
+) -> Iterator[Tuple[Any, Any]]:
+    """
+    Determine countries of coordinates chunks, in worker processes.
+
+    Chunks are read lazily, at most two per worker are in flight, results are yielded in input order.
+
+    Args:
+        chunks: Iterable of (payload, latitudes, longitudes), coordinates may be numbers or strings,
+            float64 numpy arrays if columnar.
+        workers: Number of worker processes, 1 to look up in the current process.
+        max_distance: If given, points outside of all polygons get the country with the nearest border
+            within this distance in km.
+        quantized: Use quantized sectors instead of memory-mapped binary sectors.
+        columnar: Look up chunks with `Geocoder.lookup_codes`, requires numpy.
+
+    Returns:
+        Iterator of (payload, country keys) for every chunk, None where no country was found,
+        or (payload, (codes, categories)) if columnar.
+    """
+    lookup_chunk = _lookup_codes_chunk if columnar else _lookup_chunk
+    if workers <= 1:
+        _init_worker(quantized)
+        for payload, lats, lngs in chunks:
+            yield payload, lookup_chunk(lats, lngs, max_distance)
+        return
+
+    with Pool(workers, initializer=_init_worker, initargs=(quantized,)) as pool:
+        pending = deque()
+        for payload, lats, lngs in chunks:
+            pending.append((payload, pool.apply_async(lookup_chunk, (lats, lngs, max_distance))))
+            if len(pending) >= 2 * workers:
+                payload, result = pending.popleft()
+                yield payload, result.get()
+        while pending:
+            payload, result = pending.popleft()
+            yield payload, result.get()
+
+
+def _get_column(rows: List[List[str]], index: int) -> List[str]:
+    # short rows get an empty value, so malformed lines get no country instead of failing the file
+    return [row[index] if len(row) > index else "" for row in rows]
+
+
+class Progress:
+    """
+    Throughput statistics of annotated rows, printed to stderr.
+
+    Args:
+        quiet: Do not print anything.
+    """
+
+    def __init__(self, quiet: bool = False):
+        self.quiet = quiet
+        self.rows = 0
+        self.found = 0
+        self.start = time.perf_counter()
+        # progress line is rewritten in place on terminals only
+        self.live = not quiet and sys.stderr.isatty()
+
+    def add(self, countries: List[Optional[str]]) -> None:
+        self.add_counts(len(countries), len(countries) - countries.count(None))
+
+    def add_counts(self, rows: int, found: int) -> None:
+        self.rows += rows
+        self.found += found
+        if self.live:
+            print("\rqc2c: %d rows, %.0f rows/s" % (self.rows, self.rows / self.get_seconds()), end="", file=sys.stderr)
+
+    def get_seconds(self) -> float:
+        return max(time.perf_counter() - self.start, 1e-9)
+
+    def get_stats(self) -> Dict[str, Any]:
+        seconds = self.get_seconds()
+        return {"rows": self.rows, "found": self.found, "seconds": seconds, "rows_per_second": self.rows / seconds}
+
+    def finish(self) -> Dict[str, Any]:
+        stats = self.get_stats()
+        if not self.quiet:
+            print(
+                "%sqc2c: annotated %d rows (%d with country) in %.2f s, %.0f rows/s"
+                % ("\r" if self.live else "", stats["rows"], stats["found"], stats["seconds"],
+                   stats["rows_per_second"]),
+                file=sys.stderr,
+            )
+        return stats
+
+
+def annotate_csv(
+    input_file: str, output_file: str, lat_column: str = "lat", lng_column: str = "lng",
+    country_column: str = DEFAULT_COUNTRY_COLUMN, chunk_size: int = DEFAULT_CHUNK_SIZE, workers: int = 1,
+    max_distance: Optional[float] = None, quantized: bool = False, delimiter: str = ",", quiet: bool = False,
+) -> Dict[str, Any]:
+    """
+    Append country column to CSV file, streamed in chunks.
+
+    Args:
+        input_file: Input CSV file path with header row, "-" for stdin.
+        output_file: Output CSV file path, "-" for stdout.
+        lat_column: Name of latitude column.
+        lng_column: Name of longitude column.
+        country_column: Name of appended country column, empty where no country was found,
+            must not be a column of the input.
+        chunk_size: Rows per chunk.
+        workers: Number of worker processes.
+        max_distance: If given, points outside of all polygons get the country with the nearest border
+            within this distance in km.
+        quantized: Use quantized sectors instead of memory-mapped binary sectors.
+        delimiter: CSV delimiter.
+        quiet: Do not print throughput statistics.
+
+    Returns:
+        Dict with rows, found, seconds and rows_per_second.
+    """
+    source = sys.stdin if input_file == "-" else open(input_file, "r", encoding="utf-8", newline="")
+    target = None
+    try:
+        reader = csv.reader(source, delimiter=delimiter)
+        header = next(reader, None)
+        if header is None:
+            raise ValueError("input file is empty")
+        for column in (lat_column, lng_column):
+            if column not in header:
+                raise ValueError("column %s not found in input header" % column)
+        if country_column in header:
+            raise ValueError("column %s already exists in input header" % country_column)
+        lat_index, lng_index = header.index(lat_column), header.index(lng_column)
+        # output is created only for valid input, rejected runs leave no truncated file behind
+        target = sys.stdout if output_file == "-" else open(output_file, "w", encoding="utf-8", newline="")
+        writer = csv.writer(target, delimiter=delimiter)
+        writer.writerow(header + [country_column])
+
+        def read_chunks() -> Iterator[Tuple[List[List[str]], List[str], List[str]]]:
+            rows = []
+            for row in reader:
+                rows.append(row)
+                if len(rows) == chunk_size:
+                    yield rows, _get_column(rows, lat_index), _get_column(rows, lng_index)
+                    rows = []
+            if rows:
+                yield rows, _get_column(rows, lat_index), _get_column(rows, lng_index)
+
+        progress = Progress(quiet)
+        for rows, countries in lookup_chunks(read_chunks(), workers, max_distance, quantized):
+            writer.writerows(row + [country or ""] for row, country in zip(rows, countries))
+            progress.add(countries)
+        return progress.finish()
+    finally:
+        if source is not sys.stdin:
+            source.close()
+        if target is not None and target is not sys.stdout:
+            target.close()
+
+
+def annotate_parquet(
+    input_file: str, output_file: str, lat_column: str = "lat", lng_column: str = "lng",
+    country_column: str = DEFAULT_COUNTRY_COLUMN, chunk_size: int = DEFAULT_CHUNK_SIZE, workers: int = 1,
+    max_distance: Optional[float] = None, quantized: bool = False, quiet: bool = False,
+) -> Dict[str, Any]:
+    """
+    Append dictionary encoded country column to Parquet file, streamed in record batches, requires pyarrow.
+
+    Numeric columns are looked up with `Geocoder.lookup_codes` without converting values to Python objects,
+    nulls get no country. Output is written for empty input too, with no rows and the schema of a non-empty one.
+
+    Args:
+        input_file: Input Parquet file path.
+        output_file: Output Parquet file path.
+        lat_column: Name of latitude column.
+        lng_column: Name of longitude column.
+        country_column: Name of appended country column, null where no country was found,
+            must not be a column of the input.
+        chunk_size: Rows per record batch.
+        workers: Number of worker processes.
+        max_distance: If given, points outside of all polygons get the country with the nearest border
+            within this distance in km.
+        quantized: Use quantized sectors instead of memory-mapped binary sectors.
+        quiet: Do not print throughput statistics.
+
+    Returns:
+        Dict with rows, found, seconds and rows_per_second.
+    """
+    pa, pq = _require_pyarrow()
+    import numpy as np  # dependency of pyarrow
+
+    source = pq.ParquetFile(input_file)
+    for column in (lat_column, lng_column):
+        if column not in source.schema_arrow.names:
+            raise ValueError("column %s not found in input schema" % column)
+    if country_column in source.schema_arrow.names:
+        raise ValueError("column %s already exists in input schema" % country_column)
+    country_field = pa.field(country_column, pa.dictionary(pa.int32(), pa.string()))
+
+    def get_coordinates(column):
+        # float64 arrays, nulls and malformed values are NaN, which match no country
+        if pa.types.is_floating(column.type) or pa.types.is_integer(column.type):
+            return column.to_numpy(zero_copy_only=False).astype(np.float64, copy=False)
+        return np.array([_parse_coordinate(value) for value in column.to_pylist()], dtype=np.float64)
+
+    def read_chunks():
+        for batch in source.iter_batches(batch_size=chunk_size):
+            yield batch, get_coordinates(batch.column(lat_column)), get_coordinates(batch.column(lng_column))
+
+    progress = Progress(quiet)
+    with pq.ParquetWriter(output_file, source.schema_arrow.append(country_field)) as writer:
+        for batch, (codes, categories) in lookup_chunks(read_chunks(), workers, max_distance, quantized, True):
+            countries = pa.DictionaryArray.from_arrays(
+                pa.array(codes, pa.int32(), mask=codes < 0), pa.array(categories, pa.string())
+            )
+            writer.write_table(pa.Table.from_batches([batch]).append_column(country_field, countries))
+            progress.add_counts(len(codes), int((codes >= 0).sum()))
+    return progress.finish()
+
+
+def main(argv: Optional[Sequence[str]] = None) -> None:
+    parser = argparse.ArgumentParser(prog="qc2c", description="Quick Coordinates To Country")
+    commands = parser.add_subparsers(dest="command", required=True)
+
+    annotate = commands.add_parser("annotate", help="append country column to CSV or Parquet file")
+    annotate.add_argument("input", help="input file, '-' for CSV from stdin")
+    annotate.add_argument("-o", "--output", default="-", help="output file, '-' for CSV to stdout (default: -)")
+    annotate.add_argument("--lat-col", default="lat", help="latitude column (default: %(default)s)")
+    annotate.add_argument("--lng-col", default="lng", help="longitude column (default: %(default)s)")
+    annotate.add_argument("--country-col", default=DEFAULT_COUNTRY_COLUMN,
+                          help="appended country column (default: %(default)s)")
+    annotate.add_argument("--format", choices=("csv", "parquet"),
+                          help="file format (default: from input file extension)")
+    annotate.add_argument("--delimiter", default=",", help="CSV delimiter (default: %(default)s)")
+    annotate.add_argument("--chunk-size", type=int, default=DEFAULT_CHUNK_SIZE,
+                          help="rows per chunk (default: %(default)s)")
+    annotate.add_argument("--workers", type=int, default=0,
+                          help="number of worker processes (default: 0, one per core)")
+    annotate.add_argument("--max-distance", type=float,
+                          help="points outside of all polygons get the country with the nearest border within km")
+    annotate.add_argument("--quantized", action="store_true",
+                          help="use quantized sectors instead of memory-mapped binary sectors")
+    annotate.add_argument("-q", "--quiet", action="store_true", help="do not print throughput statistics")
+    args = parser.parse_args(argv)
+
+    file_format = args.format or ("parquet" if args.input.lower().endswith(PARQUET_EXTENSIONS) else "csv")
+    options = dict(
+        lat_column=args.lat_col, lng_column=args.lng_col, country_column=args.country_col,
+        chunk_size=args.chunk_size, workers=args.workers or os.cpu_count() or 1,
+        max_distance=args.max_distance, quantized=args.quantized, quiet=args.quiet,
+    )
+    try:
+        if file_format == "parquet":
+            if args.output == "-":
+                parser.error("parquet output requires --output file")
+            annotate_parquet(args.input, args.output, **options)
+        else:
+            annotate_csv(args.input, args.output, delimiter=args.delimiter, **options)
+    except (ImportError, ValueError, OSError) as error:
+        print("qc2c: %s" % error, file=sys.stderr)
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -1,14 +1,47 @@
-from typing import Dict, List, Optional
+import re
+from array import array
+from itertools import islice
+from typing import Any, Dict, List, Optional, Sequence, Tuple, Union
+
+# polygon flattened for lookups: coordinates [lat, lng, lat, lng, ...] and offsets of rings points
+FlatPolygon = Tuple[Sequence[float], Sequence[int]]
+
+# quadtree manifests (generated by workflow stage 1) name sectors by path of quadrants from the world box,
+# e.g. "world_sector_q03.json.gz": quadrant 0 of the world box, then quadrant 3 of it
+QUADTREE_BOUNDS = (-90.0, -180.0, 90.0, 180.0)
+QUADTREE_KEY = re.compile(r"^(.*_q)([0-3]*)(\..*)$")
+QUADTREE_MAX_DEPTH = 32
+
+
+def get_bounds(sector: Union[List[float], Dict[str, Any]]) -> List[float]:
+    """
+    Get sector bounding box from world manifest entry.
+
+    Args:
+        sector: Bounding box list [lat_min, lng_min, lat_max, lng_max],
+            or dict with 'bounds' key (as in manifest extended with country centers in stage 4).
+
+    Returns:
+        Bounding box list [lat_min, lng_min, lat_max, lng_max].
+    """
+    if isinstance(sector, dict):
+        return sector["bounds"]
+    return sector
 
 
 def get_sector(
-    sectors_manifest: Dict[str, List[float]], coordinates: Dict[str, float]
+    sectors_manifest: Dict[str, Union[List[float], Dict[str, Any]]], coordinates: Dict[str, float]
 ) -> Optional[str]:
     """
     Find which sector a coordinate falls into based on bounding boxes.
 
+    Bounds are inclusive, points on edges shared by sectors belong to the first of them in manifest order.
+    Quadtree manifests can be scanned too, `get_quadtree_sector` resolves them in time logarithmic
+    to number of sectors.
+
     Args:
-        sectors_manifest: Dict mapping sector keys to bounding box lists [lat_min, lng_min, lat_max, lng_max].
+        sectors_manifest: Dict mapping sector keys to bounding box lists [lat_min, lng_min, lat_max, lng_max]
+            (or to dicts with 'bounds' key).
         coordinates: Dict with 'lat' and 'lng' keys.
 
     Returns:
@@ -17,13 +50,62 @@ def get_sector(
     lat = coordinates["lat"]
     lng = coordinates["lng"]
 
-    for key, bounds in sectors_manifest.items():
-        lat_min, lng_min, lat_max, lng_max = bounds
+    for key, sector in sectors_manifest.items():
+        lat_min, lng_min, lat_max, lng_max = get_bounds(sector)
         if lat_min <= lat <= lat_max and lng_min <= lng <= lng_max:
             return key
     return None
 
 
+def get_quadtree_sector(
+    sectors_manifest: Dict[str, Union[List[float], Dict[str, Any]]], coordinates: Dict[str, float]
+) -> Optional[str]:
+    """
+    Find which sector of quadtree manifest a coordinate falls into, descending from the world box.
+
+    Each step picks quadrant containing the point and checks if manifest has a sector of this path,
+    so only keys are looked up and bounds are never scanned. Points on edges of quadrants belong
+    to the lower one, which comes first in manifest order, same as in `get_sector`.
+
+    Args:
+        sectors_manifest: Dict mapping quadtree sector keys (e.g. "world_sector_q03.json") to bounding boxes,
+            covering the whole world box.
+        coordinates: Dict with 'lat' and 'lng' keys.
+
+    Returns:
+        Sector key if found, else None.
+    """
+    match = QUADTREE_KEY.match(next(iter(sectors_manifest), ""))
+    if match is None:
+        raise ValueError("sectors manifest is not a quadtree manifest")
+    prefix, _, suffix = match.groups()
+
+    lat = coordinates["lat"]
+    lng = coordinates["lng"]
+    lat_min, lng_min, lat_max, lng_max = QUADTREE_BOUNDS
+    if not (lat_min <= lat <= lat_max and lng_min <= lng <= lng_max):
+        return None
+
+    path = ""
+    for _ in range(QUADTREE_MAX_DEPTH + 1):
+        key = prefix + path + suffix
+        if key in sectors_manifest:
+            return key
+        lat_mid = (lat_min + lat_max) / 2
+        lng_mid = (lng_min + lng_max) / 2
+        quadrant = 0
+        if lat > lat_mid:
+            lat_min, quadrant = lat_mid, 2
+        else:
+            lat_max = lat_mid
+        if lng > lng_mid:
+            lng_min, quadrant = lng_mid, quadrant + 1
+        else:
+            lng_max = lng_mid
+        path += str(quadrant)
+    return None
+
+
 def point_in_polygon(point: List[float], polygon: List[List[float]]) -> bool:
     """
     Check if a point is inside a polygon using ray casting algorithm.
@@ -52,14 +134,110 @@ def point_in_polygon(point: List[float], polygon: List[List[float]]) -> bool:
     return inside
 
 
+def get_polygons(country: List) -> List[List[List[List[float]]]]:
+    """
+    Normalize country geometry to list of polygons with holes.
+
+    Country may be given as a single ring, as a list of rings (each being a separate polygon,
+    as in the shipped sector files) or as a list of polygons, each being a list of rings
+    with exterior first and holes after it (as in GeoJSON MultiPolygon).
+
+    Args:
+        country: Country geometry.
+
+    Returns:
+        List of polygons, each being a list of rings.
+    """
+    if not country:
+        return []
+    if not isinstance(country[0][0], (list, tuple)):
+        return [[country]]
+    if not isinstance(country[0][0][0], (list, tuple)):
+        return [[ring] for ring in country]
+    return country
+
+
+def flatten_polygon(polygon: List[List[List[float]]]) -> FlatPolygon:
+    """
+    Flatten polygon rings into a single coordinates array.
+
+    Args:
+        polygon: List of rings, exterior first and holes after it.
+
+    Returns:
+        Coordinates [lat, lng, lat, lng, ...] and offsets of rings points, [0, end of ring 1, end of ring 2, ...].
+    """
+    coordinates = array("d")
+    offsets = [0]
+    for ring in polygon:
+        for lat, lng in ring:
+            coordinates.append(lat)
+            coordinates.append(lng)
+        offsets.append(len(coordinates) // 2)
+    return coordinates, tuple(offsets)
+
+
+def point_in_flat_polygon(point: List[float], coordinates: Sequence[float], offsets: Sequence[int]) -> bool:
+    """
+    Check if a point is inside a flattened polygon, testing all rings in a single pass.
+
+    Uses the same ray casting rule as `point_in_polygon`, with even-odd rule across rings,
+    so points inside holes are outside of polygon.
+
+    Args:
+        point: [lat, lng]
+        coordinates: Flat [lat, lng, lat, lng, ...] points of all rings.
+        offsets: Offsets of rings points, [0, end of ring 1, end of ring 2, ...].
+
+    Returns:
+        True if point is inside polygon, else False.
+    """
+    x, y = point
+    inside = False
+
+    for r in range(len(offsets) - 1):
+        start, end = 2 * offsets[r], 2 * offsets[r + 1]
+        if start == end:
+            continue
+        xj, yj = coordinates[end - 2], coordinates[end - 1]
+        # iterate ring points in place, without copying them
+        points = islice(coordinates, start, end)
+        for xi, yi in zip(points, points):
+            if ((yi > y) != (yj > y)) and (x < (xj - xi) * (y - yi) / (yj - yi + 1e-15) + xi):
+                inside = not inside
+            xj, yj = xi, yi
+    return inside
+
+
+def point_in_country(point: List[float], country: List) -> bool:
+    """
+    Check if a point is inside any polygon of a country.
+
+    Args:
+        point: [lat, lng]
+        country: Country geometry, as accepted by `get_polygons`.
+
+    Returns:
+        True if point is inside country, else False.
+    """
+    if not country:
+        return False
+    if not isinstance(country[0][0], (list, tuple)):
+        return point_in_polygon(point, country)
+    if not isinstance(country[0][0][0], (list, tuple)):
+        return any(point_in_polygon(point, ring) for ring in country)
+    # polygons with holes: point has to be inside odd number of polygon rings
+    return any(sum(point_in_polygon(point, ring) for ring in polygon) % 2 == 1 for polygon in country)
+
+
 def get_country(
-    sector_manifest: Dict[str, List[List[float]]], coordinates: Dict[str, float]
+    sector_manifest: Dict[str, List], coordinates: Dict[str, float]
 ) -> Optional[str]:
     """
     Determine the country within a sector by testing polygons.
 
     Args:
-        sector_manifest: Dict mapping country keys to polygons (list of coordinate lists).
+        sector_manifest: Dict mapping country keys to polygons, in any shape accepted by `get_polygons`.
         coordinates: Dict with 'lat' and 'lng' keys.
 
     Returns:
@@ -67,7 +245,7 @@ def get_country(
     """
     point = [coordinates["lat"], coordinates["lng"]]
 
-    for key, polygon in sector_manifest.items():
-        if point_in_polygon(point, polygon):
+    for key, country in sector_manifest.items():
+        if point_in_country(point, country):
             return key
     return None
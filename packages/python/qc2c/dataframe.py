@@ -0,0 +1,84 @@
+from typing import Optional
+
+from .geocoder import Geocoder
+from .nearest import DEFAULT_MAX_DISTANCE
+
+try:
+    import numpy as np
+    import pandas as pd
+except ImportError:  # pandas is an optional extra
+    pd = None
+
+
+def _require_pandas() -> None:
+    if pd is None:
+        raise ImportError(
+            "qc2c dataframe lookups require pandas, install it with: pip install qc2c[pandas]"
+        )
+
+
+def _get_column(frame, column: str):
+    series = frame[column]
+    if isinstance(series.dtype, np.dtype):
+        # numpy backed columns are passed as they are, float64 ones without copying
+        return series.to_numpy()
+    # nullable extension columns get NaN for missing values, which matches no country
+    return series.to_numpy(dtype=np.float64, na_value=np.nan)
+
+
+def lookup(
+    frame, lat: str = "lat", lng: str = "lng", geocoder: Optional[Geocoder] = None,
+    max_distance: Optional[float] = DEFAULT_MAX_DISTANCE,
+):
+    """
+    Determine countries of coordinates columns of pandas DataFrame, requires pandas.
+
+    float64 columns are read without copying and countries are returned as categorical,
+    so results take at most 4 bytes per row.
+
+    Args:
+        frame: `pandas.DataFrame`.
+        lat: Name of latitude column.
+        lng: Name of longitude column.
+        geocoder: Geocoder to use, pass one to reuse loaded sectors across calls.
+        max_distance: Points outside of all polygons get the country with the nearest border
+            within this distance in km, None to disable, see `Geocoder.lookup_codes`.
+
+    Returns:
+        Categorical `pandas.Series` with the index of the frame, NaN where no country was found.
+    """
+    _require_pandas()
+    geocoder = geocoder or Geocoder()
+    lats, lngs = _get_column(frame, lat), _get_column(frame, lng)
+    codes, categories = geocoder.lookup_codes(lats, lngs, max_distance)
+    return pd.Series(pd.Categorical.from_codes(codes, categories=categories), index=frame.index, name="country")
+
+
+if pd is not None:
+
+    @pd.api.extensions.register_dataframe_accessor("qc2c")
+    class QC2CAccessor:
+        """
+        DataFrame accessor, registered on import of this module.
+
+            import qc2c.dataframe
+            frame["country"] = frame.qc2c.lookup("lat", "lng")
+
+        Args:
+            frame: `pandas.DataFrame`.
+        """
+
+        def __init__(self, frame):
+            self._frame = frame
+
+        def lookup(
+            self, lat: str = "lat", lng: str = "lng", geocoder: Optional[Geocoder] = None,
+            max_distance: Optional[float] = DEFAULT_MAX_DISTANCE,
+        ):
+            """
+            Determine countries of coordinates columns, see `lookup`.
+
+            Returns:
+                Categorical `pandas.Series`, NaN where no country was found.
+            """
+            return lookup(self._frame, lat, lng, geocoder, max_distance)
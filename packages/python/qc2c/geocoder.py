@@ -0,0 +1,485 @@
+import gzip
+import json
+from collections import OrderedDict
+from math import isfinite
+from time import perf_counter
+from typing import Any, Dict, Iterable, Iterator, List, Optional, Tuple, Union
+
+from .binary import BinarySector, load_sector
+from .core import get_bounds
+from .grid import CellGrid, load_grid
+from .locator import SectorLocator
+from .metrics import GRID, OUTSIDE, POLYGON, LookupMetrics
+from .nearest import DEFAULT_MAX_DISTANCE, KDTree, get_centroids, get_search_radius
+from .quantized import CompiledQuantizedSector, QuantizedSector
+from .quantized import load_sector as load_quantized_sector
+from .sector import CompiledSector
+
+try:
+    from importlib.resources import as_file, files
+except ImportError:  # Python < 3.9
+    files = None
+    from importlib.resources import path, read_binary
+
+DATA_PACKAGE = __package__ + ".data.gz"
+BINARY_DATA_PACKAGE = __package__ + ".data.bin"
+GRID_DATA_PACKAGE = __package__ + ".data.grid"
+QUANTIZED_DATA_PACKAGE = __package__ + ".data.quantized"
+MANIFEST = "world_sectors.json.gz"
+DEFAULT_CACHE_SIZE = 16
+
+
+def read_data(name: str) -> bytes:
+    """
+    Read bundled data file.
+
+    Args:
+        name: File name within `qc2c/data/gz`.
+
+    Returns:
+        Raw file content.
+    """
+    if files is None:
+        return read_binary(DATA_PACKAGE, name)
+    return files(DATA_PACKAGE).joinpath(name).read_bytes()
+
+
+def load_data(name: str) -> Any:
+    """
+    Decompress and parse bundled gzipped JSON file.
+
+    Args:
+        name: File name within `qc2c/data/gz`.
+
+    Returns:
+        Parsed JSON content.
+    """
+    return json.loads(gzip.decompress(read_data(name)).decode("utf-8"))
+
+
+def load_binary_data(name: str) -> BinarySector:
+    """
+    Memory-map bundled binary sector file.
+
+    Args:
+        name: Sector key from the world manifest, e.g. "world_sector_1.json.gz".
+
+    Returns:
+        Sector manifest backed by the mapped file.
+    """
+    name = name.split(".", 1)[0] + ".bin"
+    if files is None:
+        with path(BINARY_DATA_PACKAGE, name) as file_path:
+            return load_sector(str(file_path))
+    with as_file(files(BINARY_DATA_PACKAGE).joinpath(name)) as file_path:
+        return load_sector(str(file_path))
+
+
+def load_quantized_data(name: str) -> QuantizedSector:
+    """
+    Read bundled quantized sector file.
+
+    Args:
+        name: Sector key from the world manifest, e.g. "world_sector_1.json.gz".
+
+    Returns:
+        Decoded sector manifest, with integer coordinates.
+    """
+    name = name.split(".", 1)[0] + ".qsec"
+    if files is None:
+        with path(QUANTIZED_DATA_PACKAGE, name) as file_path:
+            return load_quantized_sector(str(file_path))
+    return QuantizedSector(files(QUANTIZED_DATA_PACKAGE).joinpath(name).read_bytes())
+
+
+def load_grid_data(name: str) -> CellGrid:
+    """
+    Memory-map bundled grid of cells labels.
+
+    Args:
+        name: Sector key from the world manifest, e.g. "world_sector_1.json.gz".
+
+    Returns:
+        Grid backed by the mapped file.
+    """
+    name = name.split(".", 1)[0] + ".grid"
+    if files is None:
+        with path(GRID_DATA_PACKAGE, name) as file_path:
+            return load_grid(str(file_path))
+    with as_file(files(GRID_DATA_PACKAGE).joinpath(name)) as file_path:
+        return load_grid(str(file_path))
+
+
+class SectorCache:
+    """
+    Bounded LRU cache of compiled sectors, loading sectors on first access.
+
+    Args:
+        maxsize: Maximum number of sectors kept in memory, None for no limit.
+    """
+
+    def __init__(self, maxsize: Optional[int] = DEFAULT_CACHE_SIZE):
+        self.maxsize = maxsize
+        self._sectors = OrderedDict()
+
+    def load(self, key: str) -> CompiledSector:
+        """Read and compile sector, override to load sectors from another source."""
+        return CompiledSector(load_data(key))
+
+    def __getitem__(self, key: str) -> CompiledSector:
+        try:
+            self._sectors.move_to_end(key)
+            return self._sectors[key]
+        except KeyError:
+            pass
+        sector = self.load(key)
+        self._sectors[key] = sector
+        if self.maxsize is not None and len(self._sectors) > self.maxsize:
+            self._sectors.popitem(last=False)
+        return sector
+
+    def __contains__(self, key: str) -> bool:
+        return key in self._sectors
+
+    def __len__(self) -> int:
+        return len(self._sectors)
+
+    def clear(self) -> None:
+        self._sectors.clear()
+
+
+class BinarySectorCache(SectorCache):
+    """
+    Sector cache reading memory-mapped binary sectors, coordinates are shared between processes.
+    """
+
+    def load(self, key: str) -> CompiledSector:
+        return CompiledSector(load_binary_data(key))
+
+
+class QuantizedSectorCache(SectorCache):
+    """
+    Sector cache reading quantized sectors, points are tested against integer coordinates.
+    """
+
+    def load(self, key: str) -> CompiledSector:
+        return CompiledQuantizedSector(load_quantized_data(key))
+
+
+class Geocoder:
+    """
+    Country lookup over data bundled with the package.
+
+    Only the world manifest is read on creation, sectors are decompressed and parsed
+    on first hit and kept in a bounded LRU cache.
+    Points in grid cells lying fully inside a country or outside of all polygons are answered
+    from precomputed cells labels, without loading the sector.
+
+    Args:
+        cache_size: Maximum number of parsed sectors kept in memory, None for no limit.
+        binary: Read memory-mapped binary sectors instead of gzipped JSON.
+        grid: Answer lookups from precomputed cells labels where possible.
+        quantized: Read smaller quantized sectors with integer coordinates instead of gzipped JSON,
+            results differ from full precision sectors only within quantization resolution (about 11 m) of borders.
+        metrics: True or `LookupMetrics` instance to count and time every `lookup`, see `get_metrics`.
+            Lookups without metrics run the plain lookup, with no instrumentation overhead.
+    """
+
+    def __init__(
+        self, cache_size: Optional[int] = DEFAULT_CACHE_SIZE, binary: bool = False, grid: bool = True,
+        metrics: Union[bool, LookupMetrics, None] = None, quantized: bool = False,
+    ):
+        if binary and quantized:
+            raise ValueError("binary and quantized sectors can not be used together")
+        self.sectors_manifest = load_data(MANIFEST)
+        self.locator = SectorLocator(self.sectors_manifest)
+        self.bounds = [(key, get_bounds(sector)) for key, sector in self.sectors_manifest.items()]
+        if binary:
+            self.sectors = BinarySectorCache(cache_size)
+        elif quantized:
+            self.sectors = QuantizedSectorCache(cache_size)
+        else:
+            self.sectors = SectorCache(cache_size)
+        # memory-mapped grids are small, so all of them are kept once loaded
+        self.grids = {} if grid else None
+        self._centroids = None
+        self._border_indexes = {}
+        self.metrics = LookupMetrics() if metrics is True else metrics or None
+        if self.metrics is not None:
+            self.lookup = self._lookup_with_metrics
+
+    def get_sector(self, lat: float, lng: float) -> Optional[str]:
+        """
+        Find which sector a coordinate falls into.
+
+        Args:
+            lat: Latitude.
+            lng: Longitude.
+
+        Returns:
+            Sector key if found, else None.
+        """
+        return self.locator.get_sector(lat, lng)
+
+    @property
+    def centroids(self) -> KDTree:
+        """KD-tree of country centers from the world manifest, built on first use."""
+        if self._centroids is None:
+            self._centroids = KDTree(get_centroids(self.sectors_manifest))
+        return self._centroids
+
+    def get_nearby_sectors(
+        self, lat: float, lng: float, lat_radius: float, lng_radius: float
+    ) -> Iterator[Tuple[str, float]]:
+        """
+        Find sectors overlapping the box around a point, including sectors across the antimeridian.
+
+        Args:
+            lat: Latitude.
+            lng: Longitude.
+            lat_radius: Box radius along latitude, in degrees.
+            lng_radius: Box radius along longitude, in degrees.
+
+        Returns:
+            Iterator of (sector key, longitude of the point shifted by 360 degrees towards the sector if needed).
+        """
+        for key, (lat_min, lng_min, lat_max, lng_max) in self.bounds:
+            if not lat_min - lat_radius <= lat <= lat_max + lat_radius:
+                continue
+            for shifted in (lng, lng - 360.0, lng + 360.0):
+                if lng_min - lng_radius <= shifted <= lng_max + lng_radius:
+                    yield key, shifted
+
+    def get_border_index(self, key: str):
+        """
+        Get polygon edges of a sector bucketed into raster cells, built on first use, requires numpy.
+
+        Args:
+            key: Sector key from the world manifest.
+
+        Returns:
+            `bulk.BorderIndex` of the sector.
+        """
+        from .bulk import BorderIndex
+
+        border_index = self._border_indexes.get(key)
+        if border_index is None:
+            border_index = self._border_indexes[key] = BorderIndex(self.sectors[key])
+        return border_index
+
+    def nearest(
+        self, lat: float, lng: float, max_distance: float = DEFAULT_MAX_DISTANCE, method: str = "border"
+    ) -> Optional[str]:
+        """
+        Find the nearest country, for points outside of all polygons (e.g. ports and beaches).
+
+        Args:
+            lat: Latitude.
+            lng: Longitude.
+            max_distance: Maximum distance in km.
+            method: "border" measures distance to the nearest polygon edge of all sectors within max_distance,
+                "centroid" to the nearest country center from the world manifest, without loading sectors.
+
+        Returns:
+            Country key if found within max_distance, else None.
+        """
+        if method == "centroid":
+            result = self.centroids.nearest(lat, lng, max_distance)
+        elif method == "border":
+            result = None
+            if isfinite(lat) and isfinite(lng):
+                lat_radius, lng_radius = get_search_radius(lat, max_distance)
+                # borders across sector edges and the antimeridian may be nearer than those of the point sector
+                for key, shifted in self.get_nearby_sectors(lat, lng, lat_radius, lng_radius):
+                    found = self.sectors[key].get_nearest_country(lat, shifted, max_distance)
+                    if found is not None and (result is None or found[1] < result[1]):
+                        result = found
+        else:
+            raise ValueError("unknown nearest method: %s" % method)
+        return None if result is None else result[0]
+
+    def lookup(self, lat: float, lng: float, max_distance: Optional[float] = None) -> Optional[str]:
+        """
+        Determine the country of a coordinate.
+
+        Args:
+            lat: Latitude.
+            lng: Longitude.
+            max_distance: If given, points outside of all polygons get the country with the nearest border
+                within this distance in km.
+
+        Returns:
+            Country key if found, else None.
+        """
+        key = self.get_sector(lat, lng)
+        if key is None:
+            return None
+        grid = self.get_grid(key)
+        if grid is None:
+            country = self.sectors[key].get_country(lat, lng)
+        else:
+            resolved, country = grid.lookup(lat, lng)
+            if not resolved:
+                country = self.sectors[key].get_country(lat, lng)
+        if country is None and max_distance:
+            return self.nearest(lat, lng, max_distance)
+        return country
+
+    def get_grid(self, key: str) -> Optional[CellGrid]:
+        """
+        Get precomputed cells labels of a sector, loaded on first use.
+
+        Args:
+            key: Sector key from the world manifest.
+
+        Returns:
+            Grid of the sector, None if grids are disabled.
+        """
+        if self.grids is None:
+            return None
+        grid = self.grids.get(key)
+        if grid is None:
+            grid = self.grids[key] = load_grid_data(key)
+        return grid
+
+    def stream(
+        self, points: Iterable[Tuple[float, float]], max_distance: Optional[float] = None
+    ) -> Iterator[Optional[str]]:
+        """
+        Determine countries of consecutive track points, reusing the result of the previous point where possible.
+
+        Args:
+            points: Iterable of (lat, lng) pairs, e.g. GPS trajectory, may be unbounded.
+            max_distance: If given, points outside of all polygons get the country with the nearest border
+                within this distance in km.
+
+        Returns:
+            Iterator of country keys, None where no country was found, same as `lookup` of each point.
+        """
+        from .trajectory import Trajectory
+
+        return Trajectory(self, max_distance).stream(points)
+
+    def _lookup_with_metrics(self, lat: float, lng: float, max_distance: Optional[float] = None) -> Optional[str]:
+        # same as lookup, recording how the point was answered
+        start = perf_counter()
+        polygons = vertices = 0
+        cache_hit = None
+        country = None
+        key = self.get_sector(lat, lng)
+        if key is None:
+            path = OUTSIDE
+        else:
+            resolved = False
+            grid = self.get_grid(key)
+            if grid is not None:
+                resolved, country = grid.lookup(lat, lng)
+            if resolved:
+                path = GRID
+            else:
+                path = POLYGON
+                cache_hit = key in self.sectors
+                country, polygons, vertices = self.sectors[key].get_country_stats(lat, lng)
+        nearest = key is not None and country is None and bool(max_distance)
+        if nearest:
+            country = self.nearest(lat, lng, max_distance)
+        self.metrics.add(lat, lng, key, country, path, polygons, vertices, cache_hit, nearest, perf_counter() - start)
+        return country
+
+    def get_metrics(self) -> Dict[str, Any]:
+        """
+        Get snapshot of lookup metrics, requires Geocoder created with `metrics`.
+
+        Returns:
+            Plain dict of `LookupMetrics.snapshot` counters, with keys of sectors currently cached
+            under "cached_sectors" and of loaded grids under "loaded_grids".
+        """
+        if self.metrics is None:
+            raise ValueError("metrics are disabled, create Geocoder with metrics=True")
+        snapshot = self.metrics.snapshot()
+        snapshot["cached_sectors"] = list(self.sectors._sectors)
+        snapshot["loaded_grids"] = [] if self.grids is None else list(self.grids)
+        return snapshot
+
+    def lookup_many(self, lats, lngs, max_distance: Optional[float] = DEFAULT_MAX_DISTANCE):
+        """
+        Determine countries for many coordinates at once, requires numpy.
+
+        Args:
+            lats: 1-D array of latitudes.
+            lngs: 1-D array of longitudes.
+            max_distance: Points outside of all polygons get the country with the nearest border
+                within this distance in km, None to disable, see `lookup_codes`.
+
+        Returns:
+            Object array of country keys, None where no country was found.
+        """
+        from .bulk import decode_codes
+
+        return decode_codes(*self.lookup_codes(lats, lngs, max_distance))
+
+    def lookup_codes(
+        self, lats, lngs, max_distance: Optional[float] = DEFAULT_MAX_DISTANCE, categories: Optional[List[str]] = None,
+    ) -> Tuple[Any, List[str]]:
+        """
+        Determine countries for many coordinates at once, as integer codes of country keys, requires numpy.
+
+        Contiguous float64 arrays are used without copying, see `bulk.lookup_codes`.
+
+        Args:
+            lats: 1-D array of latitudes.
+            lngs: 1-D array of longitudes.
+            max_distance: Points outside of all polygons get the country with the nearest border
+                within this distance in km, None to disable. Distances are measured vectorized, only to edges
+                near the points, adding about 0.2 us per point to random global points.
+            categories: Country keys of already assigned codes, extended in place with new countries,
+                so codes stay consistent across batches.
+
+        Returns:
+            (int32 array of indexes into categories, -1 where no country was found, categories).
+        """
+        import numpy as np
+
+        from .bulk import as_coordinates, lookup_codes
+
+        lats, lngs = as_coordinates(lats, lngs)
+        codes, categories = lookup_codes(self.sectors_manifest, self.sectors, lats, lngs, categories)
+        if max_distance:
+            codes_index = {country: code for code, country in enumerate(categories)}
+            # NaN stands for missing coordinates in arrow and dataframe lookups, they have no nearest country
+            misses = ((codes < 0) & np.isfinite(lats) & np.isfinite(lngs)).nonzero()[0]
+            for i, country in zip(*self._nearest_many(lats[misses], lngs[misses], max_distance)):
+                if country not in codes_index:
+                    codes_index[country] = len(categories)
+                    categories.append(country)
+                codes[misses[i]] = codes_index[country]
+        return codes, categories
+
+    def _nearest_many(self, lats, lngs, max_distance: float) -> Tuple[List[int], List[str]]:
+        # vectorized nearest, same sectors as get_nearby_sectors, distances to edges near the points only
+        import numpy as np
+
+        lat_radius, _ = get_search_radius(0.0, max_distance)
+        lng_radius = np.minimum(
+            360.0, lat_radius / np.maximum(np.cos(np.radians(np.minimum(np.abs(lats) + lat_radius, 90.0))), 1e-9)
+        )
+        distances = np.full(lats.shape, np.inf)
+        countries = np.full(lats.shape, None, dtype=object)
+        for key, (lat_min, lng_min, lat_max, lng_max) in self.bounds:
+            in_lat = (lats >= lat_min - lat_radius) & (lats <= lat_max + lat_radius)
+            for shift in (0.0, -360.0, 360.0):
+                shifted = lngs + shift
+                index = np.flatnonzero(in_lat & (shifted >= lng_min - lng_radius) & (shifted <= lng_max + lng_radius))
+                if len(index) == 0:
+                    continue
+                border_index = self.get_border_index(key)
+                points, codes, found = border_index.nearest(
+                    lats[index], shifted[index], lat_radius, lng_radius[index], max_distance
+                )
+                points = index[points]
+                nearer = found < distances[points]
+                points = points[nearer]
+                distances[points] = found[nearer]
+                countries[points] = np.array(border_index.keys, dtype=object)[codes[nearer]]
+        found = np.flatnonzero(distances <= max_distance)
+        return found.tolist(), countries[found].tolist()
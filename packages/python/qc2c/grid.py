@@ -0,0 +1,144 @@
+import mmap
+import struct
+import sys
+from array import array
+from typing import List, Optional, Sequence, Tuple
+
+# Packed cells grid layout, all values little-endian:
+#   header: magic "QC2G", version (u16), labels typecode ("B" or "H"), padding,
+#           origin latitude and longitude, cell size (f64 each), number of rows, columns
+#           and size of names block (u32 each)
+#   labels: rows x columns array, 0 for cells outside of all polygons, index of country + 1 for cells
+#           lying fully inside that country, maximum value of typecode for boundary cells
+#   names: utf-8 country keys separated by newlines
+MAGIC = b"QC2G"
+VERSION = 1
+HEADER = struct.Struct("<4sHcxdddIII")
+EMPTY = 0
+
+
+def dumps_grid(
+    labels: Sequence[Optional[int]], names: List[str], origin: Tuple[float, float], cell_size: float, cols: int
+) -> bytes:
+    """
+    Serialize grid of cells labels into packed format.
+
+    Args:
+        labels: Label of every cell, row by row: 0 for empty cells, index of country in names + 1
+            for cells fully inside that country, None for boundary cells.
+        names: Country keys.
+        origin: [lat, lng] of the first cell corner, lower bounds of the sector.
+        cell_size: Size of cells in degrees.
+        cols: Number of cells in a row.
+
+    Returns:
+        Packed grid.
+    """
+    typecode = "B" if len(names) < 0xFF else "H"
+    boundary = (1 << (8 * array(typecode).itemsize)) - 1
+    packed = array(typecode, [boundary if label is None else label for label in labels])
+    encoded_names = "\n".join(names).encode("utf-8")
+    if sys.byteorder != "little":
+        packed.byteswap()
+
+    header = HEADER.pack(
+        MAGIC, VERSION, typecode.encode("ascii"),
+        origin[0], origin[1], cell_size, len(labels) // cols, cols, len(encoded_names),
+    )
+    return header + packed.tobytes() + encoded_names
+
+
+class CellGrid:
+    """
+    Labels of sector grid cells precomputed by workflow stage 3, backed by packed grid buffer.
+
+    Cells lying fully inside a country or outside of all polygons are answered by a single array index,
+    only points in boundary cells need point in polygon tests.
+
+    Args:
+        buffer: Packed grid, as produced by `dumps_grid`.
+    """
+
+    def __init__(self, buffer):
+        view = memoryview(buffer)
+        magic, version, typecode, lat, lng, cell_size, rows, cols, names_size = HEADER.unpack_from(view)
+        if magic != MAGIC or version != VERSION:
+            raise ValueError("unsupported grid format")
+        typecode = typecode.decode("ascii")
+
+        self.lat = lat
+        self.lng = lng
+        self.cell_size = cell_size
+        self.rows = rows
+        self.cols = cols
+        self.lat_max = lat + rows * cell_size
+        self.lng_max = lng + cols * cell_size
+        self.boundary = (1 << (8 * array(typecode).itemsize)) - 1
+
+        start = HEADER.size
+        end = start + rows * cols * array(typecode).itemsize
+        if sys.byteorder == "little":
+            self.labels = view[start:end].cast(typecode)
+        else:
+            self.labels = array(typecode, view[start:end].tobytes())
+            self.labels.byteswap()
+        names = bytes(view[end:end + names_size]).decode("utf-8")
+        # label 0 stands for empty cells
+        self.names = [None] + (names.split("\n") if names else [])
+
+    def get_label(self, lat: float, lng: float) -> int:
+        """
+        Get label of the cell containing a coordinate.
+
+        Args:
+            lat: Latitude.
+            lng: Longitude.
+
+        Returns:
+            Cell label, `boundary` for boundary cells and points outside of the grid.
+        """
+        row = (lat - self.lat) / self.cell_size
+        col = (lng - self.lng) / self.cell_size
+        # also rejects NaN and infinite coordinates, which cannot be converted to int
+        if not (0 <= row < self.rows + 1 and 0 <= col < self.cols + 1):
+            return self.boundary
+        row, col = int(row), int(col)
+        # points on upper edges of the grid belong to the last row or column
+        if row == self.rows and lat <= self.lat_max:
+            row -= 1
+        if col == self.cols and lng <= self.lng_max:
+            col -= 1
+        if not (0 <= row < self.rows and 0 <= col < self.cols):
+            return self.boundary
+        return self.labels[row * self.cols + col]
+
+    def lookup(self, lat: float, lng: float) -> Tuple[bool, Optional[str]]:
+        """
+        Determine the country of a coordinate from its cell label.
+
+        Args:
+            lat: Latitude.
+            lng: Longitude.
+
+        Returns:
+            (True, country key or None) if the cell answers the lookup,
+            (False, None) for boundary cells, which need point in polygon tests.
+        """
+        label = self.get_label(lat, lng)
+        if label == self.boundary:
+            return False, None
+        return True, self.names[label]
+
+
+def load_grid(file_path: str) -> CellGrid:
+    """
+    Open packed grid file, memory-mapped read-only.
+
+    Args:
+        file_path: Packed grid file path.
+
+    Returns:
+        Grid backed by the mapped file.
+    """
+    with open(file_path, "rb") as file:
+        return CellGrid(mmap.mmap(file.fileno(), 0, access=mmap.ACCESS_READ))
@@ -0,0 +1,64 @@
+from math import floor
+from typing import Any, Dict, List, Optional, Tuple
+
+from .core import get_bounds
+
+# size of lookup table cells in degrees
+LOCATOR_CELL_SIZE = 1.0
+
+
+class SectorLocator:
+    """
+    Constant time sector lookup, precompiled from the world manifest.
+
+    The globe is split into a coarse table of cells, each listing sectors overlapping it
+    in manifest order. Lookup reads one cell and checks bounds of its few sectors,
+    with the same result as `get_sector`: bounds are inclusive and points on shared edges
+    belong to the first sector in manifest order.
+
+    Args:
+        sectors_manifest: Dict mapping sector keys to bounding box lists [lat_min, lng_min, lat_max, lng_max]
+            (or to dicts with 'bounds' key).
+        cell_size: Size of lookup table cell in degrees.
+    """
+
+    def __init__(self, sectors_manifest: Dict[str, Any], cell_size: float = LOCATOR_CELL_SIZE):
+        self.cell_size = cell_size
+        self.rows = int(floor(180 / cell_size)) + 1
+        self.cols = int(floor(360 / cell_size)) + 1
+
+        cells: List[List[Tuple[str, List[float]]]] = [[] for _ in range(self.rows * self.cols)]
+        for key, sector in sectors_manifest.items():
+            bounds = get_bounds(sector)
+            lat_min, lng_min, lat_max, lng_max = bounds
+            for row in range(self._row(lat_min), self._row(lat_max) + 1):
+                for col in range(self._col(lng_min), self._col(lng_max) + 1):
+                    cells[row * self.cols + col].append((key, bounds))
+        empty = ()
+        self.cells = [tuple(cell) if cell else empty for cell in cells]
+
+    # coordinates outside of the table are clamped to its border cells, NaN to the last one,
+    # where bounds checks of sectors reject them
+    def _row(self, lat: float) -> int:
+        row = (lat + 90) / self.cell_size
+        return 0 if row < 0 else int(row) if row < self.rows else self.rows - 1
+
+    def _col(self, lng: float) -> int:
+        col = (lng + 180) / self.cell_size
+        return 0 if col < 0 else int(col) if col < self.cols else self.cols - 1
+
+    def get_sector(self, lat: float, lng: float) -> Optional[str]:
+        """
+        Find which sector a coordinate falls into.
+
+        Args:
+            lat: Latitude.
+            lng: Longitude.
+
+        Returns:
+            Sector key if found, else None.
+        """
+        for key, (lat_min, lng_min, lat_max, lng_max) in self.cells[self._row(lat) * self.cols + self._col(lng)]:
+            if lat_min <= lat <= lat_max and lng_min <= lng <= lng_max:
+                return key
+        return None
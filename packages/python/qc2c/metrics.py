@@ -0,0 +1,124 @@
+from bisect import bisect_left
+from typing import Any, Callable, Dict, Optional, Sequence
+
+# upper bounds of latency histogram buckets in microseconds, the last bucket takes all slower lookups
+LATENCY_BUCKETS = (1, 2, 5, 10, 20, 50, 100, 200, 500, 1000, 2000, 5000, 10000, 50000, 100000)
+# how lookups were answered
+OUTSIDE = "outside"
+GRID = "grid"
+POLYGON = "polygon"
+
+
+class LookupMetrics:
+    """
+    Counters and latency histogram of geocoder lookups.
+
+    Totals are kept for all lookups and for every sector separately, so slow or often missed regions
+    and the number of sectors worth caching can be read from `snapshot`.
+    Counters are updated without locks, use one instance per thread for exact numbers.
+
+    Args:
+        callback: Called after every lookup with a dict describing it: lat, lng, sector, country,
+            path ("outside", "grid" or "polygon"), polygons and vertices tested, cache_hit
+            (None if no sector was needed), nearest (fallback to the nearest border used) and seconds.
+        buckets: Upper bounds of latency histogram buckets in microseconds, ascending.
+    """
+
+    def __init__(
+        self, callback: Optional[Callable[[Dict[str, Any]], None]] = None, buckets: Sequence[float] = LATENCY_BUCKETS
+    ):
+        self.callback = callback
+        self.buckets = tuple(buckets)
+        self.reset()
+
+    def reset(self) -> None:
+        """Set all counters to zero."""
+        self.lookups = 0
+        self.misses = 0
+        self.paths = {OUTSIDE: 0, GRID: 0, POLYGON: 0}
+        self.nearest = 0
+        self.cache_hits = 0
+        self.cache_misses = 0
+        self.polygons = 0
+        self.vertices = 0
+        self.seconds = 0.0
+        self.latency = [0] * (len(self.buckets) + 1)
+        self.sectors = {}
+
+    def add(
+        self, lat: float, lng: float, sector: Optional[str], country: Optional[str], path: str,
+        polygons: int = 0, vertices: int = 0, cache_hit: Optional[bool] = None, nearest: bool = False,
+        seconds: float = 0.0,
+    ) -> None:
+        """
+        Record a single lookup.
+
+        Args:
+            lat: Latitude.
+            lng: Longitude.
+            sector: Sector key, None for points outside of all sectors.
+            country: Country key found, None for misses.
+            path: How the lookup was answered, "outside", "grid" or "polygon".
+            polygons: Number of point in polygon tests.
+            vertices: Number of vertices of tested polygons.
+            cache_hit: Whether the sector was cached already, None if it was not needed.
+            nearest: Whether the nearest border fallback was used.
+            seconds: Lookup duration.
+        """
+        self.lookups += 1
+        self.misses += country is None
+        self.paths[path] += 1
+        self.nearest += nearest
+        if cache_hit is not None:
+            if cache_hit:
+                self.cache_hits += 1
+            else:
+                self.cache_misses += 1
+        self.polygons += polygons
+        self.vertices += vertices
+        self.seconds += seconds
+        self.latency[bisect_left(self.buckets, seconds * 1e6)] += 1
+
+        if sector is not None:
+            totals = self.sectors.get(sector)
+            if totals is None:
+                totals = self.sectors[sector] = {
+                    "lookups": 0, "misses": 0, "polygons": 0, "vertices": 0, "seconds": 0.0,
+                }
+            totals["lookups"] += 1
+            totals["misses"] += country is None
+            totals["polygons"] += polygons
+            totals["vertices"] += vertices
+            totals["seconds"] += seconds
+
+        if self.callback is not None:
+            self.callback({
+                "lat": lat, "lng": lng, "sector": sector, "country": country, "path": path,
+                "polygons": polygons, "vertices": vertices, "cache_hit": cache_hit, "nearest": nearest,
+                "seconds": seconds,
+            })
+
+    def snapshot(self) -> Dict[str, Any]:
+        """
+        Get copy of all counters.
+
+        Returns:
+            Plain dict of totals, rates, per sector totals and latency histogram
+            (counts of lookups up to each bucket bound, the last one without bound).
+        """
+        cache_lookups = self.cache_hits + self.cache_misses
+        return {
+            "lookups": self.lookups,
+            "misses": self.misses,
+            "miss_rate": self.misses / self.lookups if self.lookups else 0.0,
+            "paths": dict(self.paths),
+            "nearest": self.nearest,
+            "cache_hits": self.cache_hits,
+            "cache_misses": self.cache_misses,
+            "cache_hit_rate": self.cache_hits / cache_lookups if cache_lookups else 0.0,
+            "polygons": self.polygons,
+            "vertices": self.vertices,
+            "seconds": self.seconds,
+            "sectors": {key: dict(totals) for key, totals in self.sectors.items()},
+            "latency_us": {"buckets": list(self.buckets) + [None], "counts": list(self.latency)},
+        }
@@ -0,0 +1,168 @@
+from math import asin, cos, pi, radians, sin, sqrt
+from typing import Any, Dict, List, Optional, Tuple
+
+from .core import FlatPolygon
+
+# mean Earth radius in km
+EARTH_RADIUS = 6371.0088
+# length of one degree of latitude in km
+DEGREE_LENGTH = 111.195
+# default search distance of nearest country fallback in km
+DEFAULT_MAX_DISTANCE = 20.0
+
+
+def haversine(lat1: float, lng1: float, lat2: float, lng2: float) -> float:
+    """
+    Compute great-circle distance between two coordinates.
+
+    Args:
+        lat1: Latitude of the first point.
+        lng1: Longitude of the first point.
+        lat2: Latitude of the second point.
+        lng2: Longitude of the second point.
+
+    Returns:
+        Distance in km.
+    """
+    d_lat = radians(lat2 - lat1)
+    d_lng = radians(lng2 - lng1)
+    a = sin(d_lat / 2) ** 2 + cos(radians(lat1)) * cos(radians(lat2)) * sin(d_lng / 2) ** 2
+    return 2 * EARTH_RADIUS * asin(min(1.0, sqrt(a)))
+
+
+def get_search_radius(lat: float, max_distance: float) -> Tuple[float, float]:
+    """
+    Get size of box around a point containing all coordinates within a distance.
+
+    Args:
+        lat: Latitude of the point.
+        max_distance: Distance in km.
+
+    Returns:
+        (radius along latitude, radius along longitude) in degrees, the latter at most 360 near the poles.
+    """
+    lat_radius = max_distance / DEGREE_LENGTH
+    return lat_radius, min(360.0, lat_radius / max(cos(radians(min(abs(lat) + lat_radius, 90.0))), 1e-9))
+
+
+def distance_to_polygon(lat: float, lng: float, polygon: FlatPolygon) -> float:
+    """
+    Compute distance from a point to the nearest polygon edge.
+
+    Uses equirectangular projection around the point, accurate for distances of up to few hundred km.
+
+    Args:
+        lat: Latitude.
+        lng: Longitude.
+        polygon: Flattened polygon, coordinates and rings offsets.
+
+    Returns:
+        Distance in km.
+    """
+    scale = cos(radians(lat))
+    coordinates, offsets = polygon
+    best = float("inf")
+    for r in range(len(offsets) - 1):
+        ring = coordinates[2 * offsets[r]:2 * offsets[r + 1]]
+        if not ring:
+            continue
+        # project ring around the point, so the point is at (0, 0)
+        ax, ay = ring[-2] - lat, (ring[-1] - lng) * scale
+        points = iter(ring)
+        for b_lat, b_lng in zip(points, points):
+            bx, by = b_lat - lat, (b_lng - lng) * scale
+            dx, dy = bx - ax, by - ay
+            length = dx * dx + dy * dy
+            t = 0.0 if length == 0 else min(1.0, max(0.0, -(ax * dx + ay * dy) / length))
+            px, py = ax + t * dx, ay + t * dy
+            best = min(best, px * px + py * py)
+            ax, ay = bx, by
+    return sqrt(best) * DEGREE_LENGTH
+
+
+def get_centroids(sectors_manifest: Dict[str, Any]) -> List[Tuple[str, float, float]]:
+    """
+    Collect country centers of all sectors from the world manifest extended in stage 4.
+
+    Args:
+        sectors_manifest: Dict mapping sector keys to dicts with 'center' key.
+
+    Returns:
+        List of (country key, lat, lng), a country split across sectors has a center in each of them.
+    """
+    centroids = []
+    for sector in sectors_manifest.values():
+        if isinstance(sector, dict):
+            for key, (lat, lng) in sector.get("center", {}).items():
+                centroids.append((key, lat, lng))
+    return centroids
+
+
+def _to_vector(lat: float, lng: float) -> Tuple[float, float, float]:
+    # unit sphere vector, chord length grows with great-circle distance
+    lat, lng = radians(lat), radians(lng)
+    return cos(lat) * cos(lng), cos(lat) * sin(lng), sin(lat)
+
+
+class KDTree:
+    """
+    KD-tree of points on the unit sphere, for nearest neighbour queries by great-circle distance.
+
+    Args:
+        points: List of (key, lat, lng).
+    """
+
+    def __init__(self, points: List[Tuple[str, float, float]]):
+        self.points = points
+        self.root = self._build([(_to_vector(lat, lng), i) for i, (_, lat, lng) in enumerate(points)], 0)
+
+    def _build(self, nodes: List[Tuple[Tuple[float, float, float], int]], axis: int):
+        if not nodes:
+            return None
+        nodes.sort(key=lambda node: node[0][axis])
+        median = len(nodes) // 2
+        vector, index = nodes[median]
+        next_axis = (axis + 1) % 3
+        return vector, index, axis, self._build(nodes[:median], next_axis), self._build(nodes[median + 1:], next_axis)
+
+    def nearest(self, lat: float, lng: float, max_distance: Optional[float] = None) -> Optional[Tuple[str, float]]:
+        """
+        Find the nearest point.
+
+        Args:
+            lat: Latitude.
+            lng: Longitude.
+            max_distance: Maximum distance in km, None for no limit.
+
+        Returns:
+            (key, distance in km) of the nearest point, None if there is no point within max_distance.
+        """
+        target = _to_vector(lat, lng)
+        if max_distance is None:
+            best = [4.0 + 1e-9, -1]
+        else:
+            # squared chord length of max_distance arc
+            best = [(2 * sin(min(max_distance / EARTH_RADIUS, pi) / 2)) ** 2, -1]
+
+        # (node, squared distance from target to the node half-space)
+        stack = [(self.root, 0.0)]
+        while stack:
+            node, bound = stack.pop()
+            if node is None or bound > best[0]:
+                continue
+            vector, index, axis, left, right = node
+            distance = sum((a - b) ** 2 for a, b in zip(vector, target))
+            if distance <= best[0]:
+                best = [distance, index]
+            delta = target[axis] - vector[axis]
+            near, far = (left, right) if delta < 0 else (right, left)
+            stack.append((far, delta * delta))
+            stack.append((near, bound))
+
+        if best[1] < 0:
+            return None
+        key, point_lat, point_lng = self.points[best[1]]
+        return key, haversine(lat, lng, point_lat, point_lng)
+
+    def __len__(self) -> int:
+        return len(self.points)
@@ -0,0 +1,212 @@
+import gzip
+import struct
+import sys
+from array import array
+from collections.abc import Mapping
+from itertools import accumulate
+from typing import Dict, Iterator, List, Optional, Tuple
+
+from .nearest import distance_to_polygon, get_search_radius
+from .sector import GRID_CELL_SIZE, CompiledSector
+
+# Quantized sector layout, gzip compressed, all values little-endian:
+#   header: magic "QC2Q", version (u16), padding, resolution in degrees (f64),
+#           number of countries, polygons, points and size of names block (u32 each)
+#   deltas: flat [lat, lng, lat, lng, ...] int32 array of coordinates divided by resolution and rounded,
+#           each point stored as difference from the previous one (the first one from 0)
+#   country offsets: index of the first polygon of each country, plus total polygons count
+#   polygon offsets: index of the first point of each polygon, plus total points count
+#   names: utf-8 country keys separated by newlines
+MAGIC = b"QC2Q"
+VERSION = 1
+HEADER = struct.Struct("<4sHxxdIIII")
+# 1e-4 degree is about 11 m, three orders of magnitude below simplification tolerance of the workflow
+DEFAULT_RESOLUTION = 1e-4
+
+
+def quantize(value: float, resolution: float = DEFAULT_RESOLUTION) -> int:
+    """
+    Convert coordinate to fixed-point integer.
+
+    Args:
+        value: Latitude or longitude.
+        resolution: Size of integer unit in degrees.
+
+    Returns:
+        Coordinate in units of resolution, rounded to the nearest integer.
+    """
+    return int(round(value / resolution))
+
+
+def dumps_sector(sector_manifest: Dict[str, List[List[List[float]]]], resolution: float = DEFAULT_RESOLUTION) -> bytes:
+    """
+    Serialize sector into quantized, delta encoded format.
+
+    Args:
+        sector_manifest: Dict mapping country keys to polygons (list of coordinate lists).
+        resolution: Size of integer unit in degrees.
+
+    Returns:
+        Gzip compressed quantized sector.
+    """
+    deltas = array("i")
+    country_offsets = array("I", [0])
+    polygon_offsets = array("I", [0])
+    previous_lat = previous_lng = 0
+    for polygons in sector_manifest.values():
+        for polygon in polygons:
+            for lat, lng in polygon:
+                lat, lng = quantize(lat, resolution), quantize(lng, resolution)
+                deltas.append(lat - previous_lat)
+                deltas.append(lng - previous_lng)
+                previous_lat, previous_lng = lat, lng
+            polygon_offsets.append(len(deltas) // 2)
+        country_offsets.append(len(polygon_offsets) - 1)
+    names = "\n".join(sector_manifest).encode("utf-8")
+
+    if sys.byteorder != "little":
+        for values in (deltas, country_offsets, polygon_offsets):
+            values.byteswap()
+
+    header = HEADER.pack(
+        MAGIC, VERSION, resolution, len(sector_manifest), len(polygon_offsets) - 1, len(deltas) // 2, len(names),
+    )
+    return gzip.compress(header + deltas.tobytes() + country_offsets.tobytes() + polygon_offsets.tobytes() + names)
+
+
+def _read(buffer: bytes, typecode: str, start: int, count: int) -> Tuple[array, int]:
+    values = array(typecode)
+    end = start + count * values.itemsize
+    values.frombytes(buffer[start:end])
+    if sys.byteorder != "little":
+        values.byteswap()
+    return values, end
+
+
+class QuantizedSector(Mapping):
+    """
+    Sector manifest decoded from quantized sector, coordinates are kept as integers.
+
+    Polygons accessed by key are converted back to degrees, `CompiledQuantizedSector` tests points
+    against the integer coordinates directly.
+
+    Args:
+        buffer: Gzip compressed quantized sector, as produced by `dumps_sector`.
+    """
+
+    def __init__(self, buffer: bytes):
+        buffer = gzip.decompress(buffer)
+        magic, version, resolution, n_countries, n_polygons, n_points, names_size = HEADER.unpack_from(buffer)
+        if magic != MAGIC or version != VERSION:
+            raise ValueError("unsupported quantized sector format")
+        self.resolution = resolution
+
+        deltas, end = _read(buffer, "i", HEADER.size, 2 * n_points)
+        # running sums of deltas restore coordinates, latitudes and longitudes separately
+        self.coordinates = array("i", bytes(deltas.itemsize * len(deltas)))
+        self.coordinates[0::2] = array("i", accumulate(deltas[0::2]))
+        self.coordinates[1::2] = array("i", accumulate(deltas[1::2]))
+        self.country_offsets, end = _read(buffer, "I", end, n_countries + 1)
+        self.polygon_offsets, end = _read(buffer, "I", end, n_polygons + 1)
+        names = buffer[end:end + names_size].decode("utf-8")
+        self.names = names.split("\n") if n_countries else []
+        self._index = {name: i for i, name in enumerate(self.names)}
+
+    def _polygons(self, key: str) -> Iterator[Tuple[int, int]]:
+        i = self._index[key]
+        offsets = self.polygon_offsets
+        for polygon in range(self.country_offsets[i], self.country_offsets[i + 1]):
+            yield offsets[polygon], offsets[polygon + 1]
+
+    def __getitem__(self, key: str) -> List[List[List[float]]]:
+        resolution = self.resolution
+        coordinates = self.coordinates
+        return [
+            [
+                [coordinates[2 * point] * resolution, coordinates[2 * point + 1] * resolution]
+                for point in range(start, end)
+            ]
+            for start, end in self._polygons(key)
+        ]
+
+    def __iter__(self) -> Iterator[str]:
+        return iter(self.names)
+
+    def __len__(self) -> int:
+        return len(self.names)
+
+    def flat_polygons(self, key: str) -> List[Tuple[array, Tuple[int, int]]]:
+        """
+        Get country polygons flattened.
+
+        Args:
+            key: Country key.
+
+        Returns:
+            List of (integer coordinates in units of resolution, rings offsets) for every polygon of the country.
+        """
+        # array copies are iterated faster than memoryview slices by ray casting
+        coordinates = self.coordinates
+        return [(coordinates[2 * start:2 * end], (0, end - start)) for start, end in self._polygons(key)]
+
+
+class CompiledQuantizedSector(CompiledSector):
+    """
+    Compiled sector testing points against integer coordinates of quantized sector.
+
+    Bounding boxes and grid index are built in units of resolution, points are scaled once per lookup.
+    Results match `CompiledSector` of the same polygons, converted back to degrees.
+
+    Args:
+        sector: Quantized sector.
+        cell_size: Size of grid index cell in degrees.
+    """
+
+    def __init__(self, sector: QuantizedSector, cell_size: float = GRID_CELL_SIZE):
+        self.resolution = sector.resolution
+        self.scale = 1.0 / sector.resolution
+        super().__init__(sector, cell_size * self.scale)
+
+    def get_country(self, lat: float, lng: float) -> Optional[str]:
+        return super().get_country(lat * self.scale, lng * self.scale)
+
+    def get_country_stats(self, lat: float, lng: float) -> Tuple[Optional[str], int, int]:
+        return super().get_country_stats(lat * self.scale, lng * self.scale)
+
+    def get_country_radius(self, lat: float, lng: float) -> Tuple[Optional[str], float]:
+        country, radius = super().get_country_radius(lat * self.scale, lng * self.scale)
+        return country, radius * self.resolution
+
+    def get_nearest_country(self, lat: float, lng: float, max_distance: float) -> Optional[Tuple[str, float]]:
+        scale = self.scale
+        lat_radius, lng_radius = get_search_radius(lat, max_distance)
+        lat_radius, lng_radius = lat_radius * scale, lng_radius * scale
+        x, y = lat * scale, lng * scale
+
+        best = None
+        for key, (lat_min, lng_min, lat_max, lng_max), polygon in self.index.nearby(x, y, lat_radius, lng_radius):
+            if not (
+                lat_min - lat_radius <= x <= lat_max + lat_radius
+                and lng_min - lng_radius <= y <= lng_max + lng_radius
+            ):
+                continue
+            # distances are measured in degrees, only polygons near the point are converted
+            coordinates = array("d", (value * self.resolution for value in polygon[0]))
+            distance = distance_to_polygon(lat, lng, (coordinates, polygon[1]))
+            if distance <= max_distance and (best is None or distance < best[1]):
+                best = key, distance
+        return best
+
+
+def load_sector(file_path: str) -> QuantizedSector:
+    """
+    Read quantized sector file.
+
+    Args:
+        file_path: Quantized sector file path.
+
+    Returns:
+        Decoded sector manifest.
+    """
+    with open(file_path, "rb") as file:
+        return QuantizedSector(file.read())
@@ -0,0 +1,420 @@
+from bisect import bisect_left
+from collections.abc import Mapping
+from math import floor, sqrt
+from typing import Dict, Iterator, List, Optional, Sequence, Tuple
+
+from .core import FlatPolygon, flatten_polygon, get_polygons, point_in_flat_polygon
+from .nearest import distance_to_polygon, get_search_radius
+
+BoundingBox = Tuple[float, float, float, float]
+# (country key, polygon bounding box, polygon or None if the cell lies fully inside the polygon)
+GridEntry = Tuple[str, BoundingBox, Optional[FlatPolygon]]
+
+# size of spatial index cells in degrees
+GRID_CELL_SIZE = 1.0
+# cells are enlarged by this margin when tested against edges, to stay safe on cell borders
+GRID_MARGIN = 1e-9
+
+
+def get_bounding_box(coordinates: Sequence[float]) -> BoundingBox:
+    """
+    Compute bounding box of a flattened polygon.
+
+    Args:
+        coordinates: Flat [lat, lng, lat, lng, ...] polygon points.
+
+    Returns:
+        Bounding box (lat_min, lng_min, lat_max, lng_max).
+    """
+    lats = coordinates[0::2]
+    lngs = coordinates[1::2]
+    return min(lats), min(lngs), max(lats), max(lngs)
+
+
+def merge_bounding_boxes(bounding_boxes: List[BoundingBox]) -> BoundingBox:
+    """
+    Compute bounding box covering all given bounding boxes.
+
+    Args:
+        bounding_boxes: List of bounding boxes (lat_min, lng_min, lat_max, lng_max).
+
+    Returns:
+        Bounding box (lat_min, lng_min, lat_max, lng_max).
+    """
+    lat_mins, lng_mins, lat_maxs, lng_maxs = zip(*bounding_boxes)
+    return min(lat_mins), min(lng_mins), max(lat_maxs), max(lng_maxs)
+
+
+def get_area(bounding_box: BoundingBox) -> float:
+    lat_min, lng_min, lat_max, lng_max = bounding_box
+    return (lat_max - lat_min) * (lng_max - lng_min)
+
+
+def _edges(polygon: FlatPolygon) -> Iterator[Tuple[float, float, float, float]]:
+    # yield (lat, lng) of both ends of every edge, for all polygon rings
+    coordinates, offsets = polygon
+    for r in range(len(offsets) - 1):
+        ring = coordinates[2 * offsets[r]:2 * offsets[r + 1]]
+        if not ring:
+            continue
+        a_lat, a_lng = ring[-2], ring[-1]
+        points = iter(ring)
+        for b_lat, b_lng in zip(points, points):
+            yield a_lat, a_lng, b_lat, b_lng
+            a_lat, a_lng = b_lat, b_lng
+
+
+def _distance_to_edges(lat: float, lng: float, polygon: FlatPolygon) -> float:
+    # planar distance in degrees from the point to the nearest edge, in the same plane as ray casting
+    best = float("inf")
+    for a_lat, a_lng, b_lat, b_lng in _edges(polygon):
+        ax, ay = a_lat - lat, a_lng - lng
+        dx, dy = b_lat - a_lat, b_lng - a_lng
+        length = dx * dx + dy * dy
+        t = 0.0 if length == 0 else min(1.0, max(0.0, -(ax * dx + ay * dy) / length))
+        px, py = ax + t * dx, ay + t * dy
+        best = min(best, px * px + py * py)
+    return sqrt(best)
+
+
+def _distance_to_box(lat: float, lng: float, bounding_box: BoundingBox) -> float:
+    # planar distance in degrees from the point to the box, 0 inside of it
+    lat_min, lng_min, lat_max, lng_max = bounding_box
+    d_lat = max(lat_min - lat, 0.0, lat - lat_max)
+    d_lng = max(lng_min - lng, 0.0, lng - lng_max)
+    return sqrt(d_lat * d_lat + d_lng * d_lng)
+
+
+def _segment_intersects_box(
+    a_lat: float, a_lng: float, b_lat: float, b_lng: float,
+    lat_min: float, lng_min: float, lat_max: float, lng_max: float,
+) -> bool:
+    # Liang-Barsky clipping of segment a-b against the box
+    t0, t1 = 0.0, 1.0
+    d_lat = b_lat - a_lat
+    d_lng = b_lng - a_lng
+    for p, q in (
+        (-d_lat, a_lat - lat_min),
+        (d_lat, lat_max - a_lat),
+        (-d_lng, a_lng - lng_min),
+        (d_lng, lng_max - a_lng),
+    ):
+        if p == 0:
+            if q < 0:
+                return False
+        else:
+            t = q / p
+            if p < 0:
+                t0 = max(t0, t)
+            else:
+                t1 = min(t1, t)
+            if t0 > t1:
+                return False
+    return True
+
+
+class GridIndex:
+    """
+    Uniform grid over sector polygons.
+
+    Each cell keeps polygons overlapping it, in lookup order. Polygons crossing
+    the cell need ray casting, while polygons covering the whole cell are stored
+    without vertices and answer without any point in polygon test.
+
+    Args:
+        entries: List of (country key, bounding box, flattened polygon) in lookup order.
+        cell_size: Size of grid cell in degrees.
+        cells: Cells precomputed for the same entries and cell size, as returned by `get_cells`,
+            so the index is restored without testing polygons against cells.
+    """
+
+    def __init__(
+        self, entries: List[Tuple[str, BoundingBox, FlatPolygon]], cell_size: float = GRID_CELL_SIZE,
+        cells: Optional[Sequence[Sequence[int]]] = None,
+    ):
+        self.cell_size = cell_size
+        if entries:
+            self.lat_min, self.lng_min, lat_max, lng_max = merge_bounding_boxes([box for _, box, _ in entries])
+        else:
+            self.lat_min, self.lng_min, lat_max, lng_max = 0.0, 0.0, 0.0, 0.0
+        self.rows = int(floor((lat_max - self.lat_min) / cell_size)) + 1
+        self.cols = int(floor((lng_max - self.lng_min) / cell_size)) + 1
+
+        empty = ()
+        if cells is not None and len(cells) == self.rows * self.cols:
+            # cell values are entry positions times two, plus one for cells lying fully inside the polygon
+            values = []
+            for key, box, polygon in entries:
+                values.append((key, box, polygon))
+                values.append((key, box, None))
+            self.cells = [tuple([values[value] for value in cell]) if cell else empty for cell in cells]
+            return
+
+        built = [[] for _ in range(self.rows * self.cols)]
+        for key, bounding_box, polygon in entries:
+            for cell, inside in self._cover(bounding_box, polygon):
+                built[cell].append((key, bounding_box, None if inside else polygon))
+        self.cells = [tuple(cell) if cell else empty for cell in built]
+
+    def get_cells(self, entries: List[Tuple[str, BoundingBox, FlatPolygon]]) -> List[List[int]]:
+        """
+        Encode cells as positions of entries, to restore the index without building it.
+
+        Args:
+            entries: Entries the index was built from.
+
+        Returns:
+            List of cell values for every cell, entry position times two, plus one if the cell lies
+            fully inside the polygon of the entry.
+        """
+        # every polygon has its own bounding box object, shared by all cells of the polygon
+        positions = {id(box): position for position, (_, box, _) in enumerate(entries)}
+        return [[2 * positions[id(box)] + (polygon is None) for _, box, polygon in cell] for cell in self.cells]
+
+    # same clamping as SectorLocator, safe for NaN and infinite coordinates
+    def _row(self, lat: float) -> int:
+        row = (lat - self.lat_min) / self.cell_size
+        return 0 if row < 0 else int(row) if row < self.rows else self.rows - 1
+
+    def _col(self, lng: float) -> int:
+        col = (lng - self.lng_min) / self.cell_size
+        return 0 if col < 0 else int(col) if col < self.cols else self.cols - 1
+
+    def _cover(self, bounding_box: BoundingBox, polygon: FlatPolygon) -> Iterator[Tuple[int, bool]]:
+        # yield (cell, fully inside) for all cells overlapping polygon
+        size = self.cell_size
+        row_min, row_max = self._row(bounding_box[0]), self._row(bounding_box[2])
+        col_min, col_max = self._col(bounding_box[1]), self._col(bounding_box[3])
+
+        # cells crossed by polygon edges
+        boundary = set()
+        edges = list(_edges(polygon))
+        for a_lat, a_lng, b_lat, b_lng in edges:
+            rows = range(self._row(min(a_lat, b_lat) - GRID_MARGIN), self._row(max(a_lat, b_lat) + GRID_MARGIN) + 1)
+            cols = range(self._col(min(a_lng, b_lng) - GRID_MARGIN), self._col(max(a_lng, b_lng) + GRID_MARGIN) + 1)
+            for row in rows:
+                cell_lat = self.lat_min + row * size
+                for col in cols:
+                    cell_lng = self.lng_min + col * size
+                    if _segment_intersects_box(
+                        a_lat, a_lng, b_lat, b_lng,
+                        cell_lat - GRID_MARGIN, cell_lng - GRID_MARGIN,
+                        cell_lat + size + GRID_MARGIN, cell_lng + size + GRID_MARGIN,
+                    ):
+                        boundary.add(row * self.cols + col)
+
+        for row in range(row_min, row_max + 1):
+            # cells without edges are entirely in or out, cast a ray along the row center
+            center_lat = self.lat_min + (row + 0.5) * size
+            crossings = sorted(
+                a_lng + (center_lat - a_lat) * (b_lng - a_lng) / (b_lat - a_lat)
+                for a_lat, a_lng, b_lat, b_lng in edges
+                if (b_lat > center_lat) != (a_lat > center_lat)
+            )
+            for col in range(col_min, col_max + 1):
+                cell = row * self.cols + col
+                if cell in boundary:
+                    yield cell, False
+                elif bisect_left(crossings, self.lng_min + (col + 0.5) * size) % 2 == 1:
+                    yield cell, True
+
+    def candidates(self, lat: float, lng: float) -> Tuple[GridEntry, ...]:
+        """
+        Get polygons which may contain the point.
+
+        Args:
+            lat: Latitude.
+            lng: Longitude.
+
+        Returns:
+            Tuple of (country key, bounding box, polygon or None if cell is fully inside), in lookup order.
+        """
+        return self.cells[self._row(lat) * self.cols + self._col(lng)]
+
+    def nearby(self, lat: float, lng: float, lat_radius: float, lng_radius: float) -> Iterator[GridEntry]:
+        """
+        Get polygons with edges near the point.
+
+        Args:
+            lat: Latitude.
+            lng: Longitude.
+            lat_radius: Search radius along latitude, in degrees.
+            lng_radius: Search radius along longitude, in degrees.
+
+        Returns:
+            Iterator of unique (country key, bounding box, polygon), in lookup order within each cell.
+        """
+        seen = set()
+        for row in range(self._row(lat - lat_radius), self._row(lat + lat_radius) + 1):
+            for col in range(self._col(lng - lng_radius), self._col(lng + lng_radius) + 1):
+                for entry in self.cells[row * self.cols + col]:
+                    # cells fully inside a polygon have its edges in cells closer to the point
+                    if entry[2] is not None and id(entry[2]) not in seen:
+                        seen.add(id(entry[2]))
+                        yield entry
+
+
+class CompiledSector(Mapping):
+    """
+    Sector manifest precompiled for repeated lookups.
+
+    Polygons are flattened into coordinates arrays, so all rings of a polygon
+    (including holes) are tested in a single pass.
+
+    Bounding box of every polygon and country is computed once, so lookup rejects
+    polygons that cannot contain the point with four comparisons before ray casting.
+    Countries are tested from the smallest bounding box, so enclaves (e.g. VAT in ITA)
+    take precedence over the country surrounding them.
+    Grid index limits tests to polygons overlapping the point cell.
+
+    Iterating the sector yields country keys in lookup order, values are country polygons.
+
+    Args:
+        sector_manifest: Dict mapping country keys to polygons (list of coordinate lists).
+        cell_size: Size of grid index cell in degrees.
+    """
+
+    def __init__(self, sector_manifest: Dict[str, List], cell_size: float = GRID_CELL_SIZE):
+        # binary sectors are flat already, use their coordinates without copying
+        flat_polygons = getattr(sector_manifest, "flat_polygons", None)
+
+        countries = []
+        for key, value in sector_manifest.items():
+            if flat_polygons is not None:
+                flat = flat_polygons(key)
+            else:
+                flat = [flatten_polygon(polygon) for polygon in get_polygons(value)]
+            polygons = [(get_bounding_box(polygon[0]), polygon) for polygon in flat if polygon[0]]
+            if not polygons:
+                continue
+            # test larger polygons of the country first, they are hit more often
+            polygons.sort(key=lambda item: get_area(item[0]), reverse=True)
+            bounding_box = merge_bounding_boxes([box for box, _ in polygons])
+            countries.append((bounding_box, key, polygons))
+
+        countries.sort(key=lambda item: get_area(item[0]))
+        self.countries = countries
+        # polygons are read from the source on access, decoding binary or quantized sectors only when asked
+        self._manifest = sector_manifest
+        self._keys = dict.fromkeys(key for _, key, _ in countries)
+        self.entries = [(key, box, polygon) for _, key, polygons in countries for box, polygon in polygons]
+        # binary sectors may carry the index built by the workflow
+        get_index_cells = getattr(sector_manifest, "get_index_cells", None)
+        cells = None if get_index_cells is None else get_index_cells(cell_size)
+        self.index = GridIndex(self.entries, cell_size, cells)
+
+    def __getitem__(self, key: str) -> List:
+        if key not in self._keys:
+            raise KeyError(key)
+        return self._manifest[key]
+
+    def __iter__(self) -> Iterator[str]:
+        return iter(self._keys)
+
+    def __len__(self) -> int:
+        return len(self._keys)
+
+    def get_country(self, lat: float, lng: float) -> Optional[str]:
+        """
+        Determine the country within a sector.
+
+        Args:
+            lat: Latitude.
+            lng: Longitude.
+
+        Returns:
+            Country key if found, else None.
+        """
+        point = [lat, lng]
+        for key, (lat_min, lng_min, lat_max, lng_max), polygon in self.index.candidates(lat, lng):
+            if not (lat_min <= lat <= lat_max and lng_min <= lng <= lng_max):
+                continue
+            if polygon is None or point_in_flat_polygon(point, *polygon):
+                return key
+        return None
+
+    def get_country_radius(self, lat: float, lng: float) -> Tuple[Optional[str], float]:
+        """
+        Determine the country within a sector, with radius of the circle around the point sharing the result.
+
+        Points closer than the radius lie in the same grid index cell and no edge of the polygons tested
+        before the match passes between them and the point, so `get_country` returns the same country for them.
+
+        Args:
+            lat: Latitude.
+            lng: Longitude.
+
+        Returns:
+            (country key or None, radius in degrees, 0 if the result holds for the point only).
+        """
+        index = self.index
+        size = index.cell_size
+        cell_lat = index.lat_min + index._row(lat) * size
+        cell_lng = index.lng_min + index._col(lng) * size
+        # points outside of the index were clamped to a border cell, their distance is negative
+        radius = min(lat - cell_lat, cell_lat + size - lat, lng - cell_lng, cell_lng + size - lng)
+
+        point = [lat, lng]
+        country = None
+        for key, bounding_box, polygon in index.candidates(lat, lng):
+            if polygon is not None and _distance_to_box(lat, lng, bounding_box) < radius:
+                radius = min(radius, _distance_to_edges(lat, lng, polygon))
+            lat_min, lng_min, lat_max, lng_max = bounding_box
+            if not (lat_min <= lat <= lat_max and lng_min <= lng <= lng_max):
+                continue
+            if polygon is None or point_in_flat_polygon(point, *polygon):
+                country = key
+                break
+        # stay clear of edges, where float rounding of ray casting may disagree with the distance
+        return country, max(radius - GRID_MARGIN, 0.0)
+
+    def get_country_stats(self, lat: float, lng: float) -> Tuple[Optional[str], int, int]:
+        """
+        Determine the country within a sector, counting work done, same result as `get_country`.
+
+        Args:
+            lat: Latitude.
+            lng: Longitude.
+
+        Returns:
+            (country key or None, number of point in polygon tests, number of vertices of tested polygons).
+        """
+        point = [lat, lng]
+        polygons = 0
+        vertices = 0
+        for key, (lat_min, lng_min, lat_max, lng_max), polygon in self.index.candidates(lat, lng):
+            if not (lat_min <= lat <= lat_max and lng_min <= lng <= lng_max):
+                continue
+            if polygon is None:
+                return key, polygons, vertices
+            polygons += 1
+            vertices += len(polygon[0]) // 2
+            if point_in_flat_polygon(point, *polygon):
+                return key, polygons, vertices
+        return None, polygons, vertices
+
+    def get_nearest_country(self, lat: float, lng: float, max_distance: float) -> Optional[Tuple[str, float]]:
+        """
+        Find the country with the nearest border, for points outside of all polygons.
+
+        Args:
+            lat: Latitude.
+            lng: Longitude.
+            max_distance: Maximum distance to the border, in km.
+
+        Returns:
+            (country key, distance in km), None if no border is within max_distance.
+        """
+        lat_radius, lng_radius = get_search_radius(lat, max_distance)
+
+        best = None
+        for key, (lat_min, lng_min, lat_max, lng_max), polygon in self.index.nearby(lat, lng, lat_radius, lng_radius):
+            if not (
+                lat_min - lat_radius <= lat <= lat_max + lat_radius
+                and lng_min - lng_radius <= lng <= lng_max + lng_radius
+            ):
+                continue
+            distance = distance_to_polygon(lat, lng, polygon)
+            if distance <= max_distance and (best is None or distance < best[1]):
+                best = key, distance
+        return best
@@ -0,0 +1,370 @@
+import asyncio
+import gc
+import json
+import os
+import signal
+import socket
+from concurrent.futures import ThreadPoolExecutor
+from math import isfinite
+from typing import Any, Dict, List, Optional, Sequence, Tuple
+from urllib.parse import parse_qs, urlsplit
+
+from ..geocoder import Geocoder
+
+DEFAULT_HOST = "127.0.0.1"
+DEFAULT_PORT = 8340
+# single point requests are coalesced into batches of at most this many points
+DEFAULT_BATCH_SIZE = 256
+# seconds to wait for more requests before a batch is resolved, 0 takes requests read in the same loop iteration
+DEFAULT_BATCH_DELAY = 0.0
+# vectorized bulk lookup pays off only for large batches (about 5 us per point at 16384 points, 120 us at 256),
+# smaller ones, including all micro-batches, are resolved point by point from grid cells (about 5 us per point)
+BULK_THRESHOLD = 16384
+MAX_BODY_SIZE = 16 << 20
+REASONS = {
+    200: "OK", 400: "Bad Request", 404: "Not Found", 405: "Method Not Allowed", 413: "Payload Too Large",
+    500: "Internal Server Error",
+}
+
+try:
+    import numpy as np
+except ImportError:  # bulk lookups require numpy
+    np = None
+
+
+def lookup_points(
+    geocoder: Geocoder, points: Sequence[Tuple[float, float]], max_distance: Optional[float] = None
+) -> List[Optional[str]]:
+    """
+    Determine countries of a batch of points.
+
+    Args:
+        geocoder: Geocoder to use.
+        points: Sequence of (lat, lng) pairs.
+        max_distance: If given, points outside of all polygons get the country with the nearest border
+            within this distance in km.
+
+    Returns:
+        List of country keys, None where no country was found.
+    """
+    if np is not None and len(points) >= BULK_THRESHOLD:
+        coordinates = np.asarray(points, dtype=np.float64).reshape(-1, 2)
+        return geocoder.lookup_many(coordinates[:, 0], coordinates[:, 1], max_distance).tolist()
+    lookup = geocoder.lookup
+    return [lookup(lat, lng, max_distance) for lat, lng in points]
+
+
+class Batcher:
+    """
+    Coalesces concurrent single point lookups into micro-batches.
+
+    Points are collected until the batch is full or the batch delay passes, then resolved at once,
+    so the event loop switches to lookups once per batch instead of once per request.
+    Batches are smaller than `BULK_THRESHOLD`, so points are looked up one by one from grid cells,
+    and a point failing its lookup fails its own request only.
+
+    Args:
+        geocoder: Geocoder to use.
+        max_distance: If given, points outside of all polygons get the country with the nearest border
+            within this distance in km.
+        batch_size: Maximum number of points in a batch.
+        batch_delay: Seconds to wait for more points before a batch is resolved.
+    """
+
+    def __init__(
+        self, geocoder: Geocoder, max_distance: Optional[float] = None,
+        batch_size: int = DEFAULT_BATCH_SIZE, batch_delay: float = DEFAULT_BATCH_DELAY,
+    ):
+        self.geocoder = geocoder
+        self.max_distance = max_distance
+        self.batch_size = batch_size
+        self.batch_delay = batch_delay
+        self.batches = 0
+        self.points = 0
+        self._pending = []
+        self._handle = None
+
+    async def lookup(self, lat: float, lng: float) -> Optional[str]:
+        """
+        Determine the country of a coordinate, with the next batch.
+
+        Args:
+            lat: Latitude.
+            lng: Longitude.
+
+        Returns:
+            Country key if found, else None.
+        """
+        loop = asyncio.get_running_loop()
+        future = loop.create_future()
+        self._pending.append((lat, lng, future))
+        if len(self._pending) >= self.batch_size:
+            self.flush()
+        elif self._handle is None:
+            if self.batch_delay > 0:
+                self._handle = loop.call_later(self.batch_delay, self.flush)
+            else:
+                self._handle = loop.call_soon(self.flush)
+        return await future
+
+    def flush(self) -> None:
+        """Resolve all pending points."""
+        if self._handle is not None:
+            self._handle.cancel()
+            self._handle = None
+        pending, self._pending = self._pending, []
+        if not pending:
+            return
+        self.batches += 1
+        self.points += len(pending)
+        lookup = self.geocoder.lookup
+        for lat, lng, future in pending:
+            # clients may disconnect before the batch is resolved
+            if future.done():
+                continue
+            try:
+                future.set_result(lookup(lat, lng, self.max_distance))
+            except Exception as error:
+                future.set_exception(error)
+
+
+class LookupServer:
+    """
+    HTTP/1.1 lookup service over TCP or Unix socket, with keep-alive connections.
+
+    Endpoints:
+        GET /lookup?lat=52.23&lng=21.01 -> {"country": "POL"}, coalesced into micro-batches
+        POST /lookup {"points": [[lat, lng], ...]} -> {"countries": ["POL", ...]}, resolved as one batch,
+            in a worker thread if it has more points than a micro-batch
+        GET /health -> {"status": "ok", "pid": ..., "batches": ..., "points": ...}
+
+    Args:
+        batcher: Batcher resolving lookups.
+    """
+
+    def __init__(self, batcher: Batcher):
+        self.batcher = batcher
+        # one thread, so large batches do not block the event loop, nor compete with each other for the GIL
+        self._executor = ThreadPoolExecutor(max_workers=1)
+
+    async def handle(self, reader: asyncio.StreamReader, writer: asyncio.StreamWriter) -> None:
+        try:
+            while True:
+                try:
+                    head = await reader.readuntil(b"\r\n\r\n")
+                except (asyncio.IncompleteReadError, asyncio.LimitOverrunError, ConnectionError):
+                    break
+                lines = head.decode("latin-1").split("\r\n")
+                try:
+                    method, target, version = lines[0].split(" ", 2)
+                except ValueError:
+                    await self._respond(writer, 400, {"error": "malformed request line"}, False)
+                    break
+                headers = {}
+                for line in lines[1:]:
+                    name, _, value = line.partition(":")
+                    if name:
+                        headers[name.strip().lower()] = value.strip()
+                keep_alive = version == "HTTP/1.1" and headers.get("connection", "").lower() != "close"
+
+                length = headers.get("content-length") or "0"
+                # digits only, int() would also take signs, spaces and underscores
+                if not (length.isascii() and length.isdigit()):
+                    await self._respond(writer, 400, {"error": "invalid content-length"}, False)
+                    break
+                length = int(length)
+                if length > MAX_BODY_SIZE:
+                    await self._respond(writer, 413, {"error": "request body too large"}, False)
+                    break
+                body = await reader.readexactly(length) if length else b""
+
+                try:
+                    status, payload = await self.dispatch(method, target, body)
+                except Exception as error:
+                    status, payload, keep_alive = 500, {"error": "internal error: %s" % type(error).__name__}, False
+                await self._respond(writer, status, payload, keep_alive)
+                if not keep_alive:
+                    break
+        except (asyncio.IncompleteReadError, ConnectionError):
+            pass
+        finally:
+            writer.close()
+
+    async def dispatch(self, method: str, target: str, body: bytes) -> Tuple[int, Dict[str, Any]]:
+        """
+        Route a request.
+
+        Args:
+            method: HTTP method.
+            target: Request target, path with query string.
+            body: Request body.
+
+        Returns:
+            (HTTP status, JSON payload).
+        """
+        url = urlsplit(target)
+        if url.path == "/health":
+            return 200, {"status": "ok", "pid": os.getpid(), "batches": self.batcher.batches,
+                         "points": self.batcher.points}
+        if url.path != "/lookup":
+            return 404, {"error": "unknown path: %s" % url.path}
+
+        if method == "GET":
+            query = parse_qs(url.query)
+            try:
+                lat, lng = float(query["lat"][0]), float(query["lng"][0])
+            except (KeyError, ValueError):
+                return 400, {"error": "lat and lng query parameters are required"}
+            # float() and json.loads() accept nan and inf
+            if not (isfinite(lat) and isfinite(lng)):
+                return 400, {"error": "lat and lng must be finite numbers"}
+            return 200, {"country": await self.batcher.lookup(lat, lng)}
+        if method == "POST":
+            try:
+                points = [(float(lat), float(lng)) for lat, lng in json.loads(body)["points"]]
+            except (KeyError, TypeError, ValueError):
+                return 400, {"error": "body must be JSON object with points list of [lat, lng] pairs"}
+            if not all(isfinite(lat) and isfinite(lng) for lat, lng in points):
+                return 400, {"error": "lat and lng must be finite numbers"}
+            batcher = self.batcher
+            if len(points) <= batcher.batch_size:
+                return 200, {"countries": lookup_points(batcher.geocoder, points, batcher.max_distance)}
+            countries = await asyncio.get_running_loop().run_in_executor(
+                self._executor, lookup_points, batcher.geocoder, points, batcher.max_distance
+            )
+            return 200, {"countries": countries}
+        return 405, {"error": "method not allowed: %s" % method}
+
+    @staticmethod
+    async def _respond(writer: asyncio.StreamWriter, status: int, payload: Dict[str, Any], keep_alive: bool) -> None:
+        content = json.dumps(payload, separators=(",", ":")).encode("utf-8")
+        writer.write(
+            (
+                "HTTP/1.1 %d %s\r\nContent-Type: application/json\r\nContent-Length: %d\r\nConnection: %s\r\n\r\n"
+                % (status, REASONS[status], len(content), "keep-alive" if keep_alive else "close")
+            ).encode("latin-1")
+            + content
+        )
+        await writer.drain()
+
+
+def create_socket(host: str = DEFAULT_HOST, port: int = DEFAULT_PORT, unix_path: Optional[str] = None) -> socket.socket:
+    """
+    Create listening socket, shared by all workers.
+
+    Args:
+        host: TCP host to bind.
+        port: TCP port to bind, 0 for any free port.
+        unix_path: If given, bind Unix socket at this path instead of TCP, replacing stale socket file.
+
+    Returns:
+        Bound, listening socket.
+    """
+    if unix_path:
+        if os.path.exists(unix_path):
+            os.remove(unix_path)
+        sock = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+        sock.bind(unix_path)
+    else:
+        sock = socket.socket(socket.AF_INET6 if ":" in host else socket.AF_INET, socket.SOCK_STREAM)
+        sock.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
+        sock.bind((host, port))
+    sock.listen(1024)
+    sock.setblocking(False)
+    return sock
+
+
+def load_geocoder(binary: bool = True, quantized: bool = False) -> Geocoder:
+    """
+    Create geocoder with all sectors and grids loaded, to be shared by forked workers.
+
+    Args:
+        binary: Use memory-mapped binary sectors, coordinates pages are shared between workers.
+        quantized: Use quantized sectors instead.
+
+    Returns:
+        Geocoder without sectors cache limit.
+    """
+    geocoder = Geocoder(cache_size=None, binary=binary and not quantized, quantized=quantized)
+    for key in geocoder.sectors_manifest:
+        geocoder.sectors[key]
+        geocoder.get_grid(key)
+    return geocoder
+
+
+def run_worker(sock: socket.socket, batcher: Batcher) -> None:
+    """
+    Serve requests from the socket until interrupted.
+
+    Args:
+        sock: Listening socket.
+        batcher: Batcher resolving lookups.
+    """
+    server = LookupServer(batcher)
+
+    async def serve() -> None:
+        if sock.family == getattr(socket, "AF_UNIX", None):
+            listener = await asyncio.start_unix_server(server.handle, sock=sock)
+        else:
+            listener = await asyncio.start_server(server.handle, sock=sock)
+        async with listener:
+            await listener.serve_forever()
+
+    try:
+        asyncio.run(serve())
+    except KeyboardInterrupt:
+        pass
+
+
+def serve(
+    sock: socket.socket, geocoder: Geocoder, workers: int = 1, max_distance: Optional[float] = None,
+    batch_size: int = DEFAULT_BATCH_SIZE, batch_delay: float = DEFAULT_BATCH_DELAY,
+) -> None:
+    """
+    Serve lookups from pre-forked worker processes, sharing the listening socket and loaded sectors.
+
+    Sectors are loaded before forking and tracked objects are frozen out of garbage collection,
+    so workers share read-only sector pages with the parent instead of copying them.
+    Platforms without fork run a single worker.
+
+    Args:
+        sock: Listening socket, see `create_socket`.
+        geocoder: Geocoder with sectors loaded, see `load_geocoder`.
+        workers: Number of worker processes.
+        max_distance: If given, points outside of all polygons get the country with the nearest border
+            within this distance in km.
+        batch_size: Maximum number of points in a micro-batch.
+        batch_delay: Seconds to wait for more points before a micro-batch is resolved.
+    """
+    batcher = Batcher(geocoder, max_distance, batch_size, batch_delay)
+    if workers <= 1 or not hasattr(os, "fork"):
+        run_worker(sock, batcher)
+        return
+
+    if hasattr(gc, "freeze"):
+        gc.freeze()
+    children = []
+    for _ in range(workers):
+        pid = os.fork()
+        if pid == 0:
+            try:
+                run_worker(sock, batcher)
+            finally:
+                os._exit(0)
+        children.append(pid)
+
+    def stop(signum, frame):
+        for child in children:
+            try:
+                os.kill(child, signal.SIGTERM)
+            except ProcessLookupError:
+                pass
+
+    signal.signal(signal.SIGTERM, stop)
+    try:
+        for child in children:
+            os.waitpid(child, 0)
+    except KeyboardInterrupt:
+        stop(signal.SIGINT, None)
+        for child in children:
+            os.waitpid(child, 0)
@@ -0,0 +1,33 @@
+import argparse
+import os
+
+from . import DEFAULT_BATCH_DELAY, DEFAULT_BATCH_SIZE, DEFAULT_HOST, DEFAULT_PORT, create_socket, load_geocoder, serve
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(prog="python -m qc2c.serve", description="QC2C local lookup server")
+    parser.add_argument("--host", default=DEFAULT_HOST, help="TCP host (default: %(default)s)")
+    parser.add_argument("--port", type=int, default=DEFAULT_PORT, help="TCP port (default: %(default)s)")
+    parser.add_argument("--unix", help="listen on Unix socket at this path instead of TCP")
+    parser.add_argument("--workers", type=int, default=1,
+                        help="number of pre-forked worker processes, 0 for all cores (default: 1)")
+    parser.add_argument("--batch-size", type=int, default=DEFAULT_BATCH_SIZE,
+                        help="maximum number of single point requests per batch (default: %(default)s)")
+    parser.add_argument("--batch-delay", type=float, default=DEFAULT_BATCH_DELAY * 1000,
+                        help="milliseconds to wait for more requests before a batch is resolved (default: 0)")
+    parser.add_argument("--max-distance", type=float,
+                        help="points outside of all polygons get the country with the nearest border within km")
+    parser.add_argument("--quantized", action="store_true",
+                        help="use quantized sectors instead of memory-mapped binary sectors")
+    args = parser.parse_args()
+
+    sock = create_socket(args.host, args.port, args.unix)
+    geocoder = load_geocoder(quantized=args.quantized)
+    workers = args.workers or os.cpu_count() or 1
+    print("qc2c: serving on %s with %d worker(s)" % (args.unix or "http://%s:%d" % sock.getsockname()[:2], workers),
+          flush=True)
+    serve(sock, geocoder, workers, args.max_distance, args.batch_size, args.batch_delay / 1000)
+
+
+if __name__ == "__main__":
+    main()
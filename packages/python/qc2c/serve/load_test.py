@@ -0,0 +1,161 @@
+import argparse
+import asyncio
+import json
+import random
+import subprocess
+import sys
+import time
+from typing import List, Optional, Tuple
+
+from . import DEFAULT_HOST, DEFAULT_PORT
+
+
+async def _request(
+    reader: asyncio.StreamReader, writer: asyncio.StreamWriter, method: str, target: str, body: bytes = b""
+) -> Tuple[int, dict]:
+    writer.write(
+        ("%s %s HTTP/1.1\r\nHost: localhost\r\nContent-Length: %d\r\n\r\n" % (method, target, len(body))).encode("latin-1")
+        + body
+    )
+    head = await reader.readuntil(b"\r\n\r\n")
+    lines = head.decode("latin-1").split("\r\n")
+    length = 0
+    for line in lines[1:]:
+        name, _, value = line.partition(":")
+        if name.strip().lower() == "content-length":
+            length = int(value)
+    return int(lines[0].split(" ")[1]), json.loads(await reader.readexactly(length))
+
+
+async def _connect(host: str, port: int, unix_path: Optional[str]):
+    if unix_path:
+        return await asyncio.open_unix_connection(unix_path)
+    return await asyncio.open_connection(host, port)
+
+
+async def wait_ready(host: str = DEFAULT_HOST, port: int = DEFAULT_PORT, unix_path: Optional[str] = None,
+                     timeout: float = 30.0) -> None:
+    """
+    Wait until the server answers health checks.
+
+    Args:
+        host: Server host.
+        port: Server port.
+        unix_path: If given, connect to Unix socket at this path instead of TCP.
+        timeout: Seconds to wait.
+
+    Raises:
+        TimeoutError: Server is not ready within timeout.
+    """
+    deadline = time.monotonic() + timeout
+    while True:
+        try:
+            reader, writer = await _connect(host, port, unix_path)
+            await _request(reader, writer, "GET", "/health")
+            writer.close()
+            return
+        except OSError:
+            if time.monotonic() > deadline:
+                raise TimeoutError("server is not ready")
+            await asyncio.sleep(0.1)
+
+
+async def run_load_test(
+    host: str = DEFAULT_HOST, port: int = DEFAULT_PORT, unix_path: Optional[str] = None, connections: int = 64,
+    requests: int = 20000, batch: int = 0, seed: int = 0,
+) -> dict:
+    """
+    Send lookup requests from concurrent keep-alive connections and measure throughput and latency.
+
+    Args:
+        host: Server host.
+        port: Server port.
+        unix_path: If given, connect to Unix socket at this path instead of TCP.
+        connections: Number of concurrent connections.
+        requests: Total number of requests.
+        batch: Points per POST request, 0 sends single point GET requests.
+        seed: Random points seed.
+
+    Returns:
+        Dict with requests, points, errors, seconds, throughput and latency percentiles in milliseconds.
+    """
+    rng = random.Random(seed)
+    latencies: List[float] = []
+    errors = 0
+    remaining = requests
+
+    async def client() -> None:
+        nonlocal remaining, errors
+        reader, writer = await _connect(host, port, unix_path)
+        try:
+            while remaining > 0:
+                remaining -= 1
+                if batch:
+                    points = [[rng.uniform(-60, 70), rng.uniform(-180, 180)] for _ in range(batch)]
+                    method, target, body = "POST", "/lookup", json.dumps({"points": points}).encode("utf-8")
+                else:
+                    lat, lng = rng.uniform(-60, 70), rng.uniform(-180, 180)
+                    method, target, body = "GET", "/lookup?lat=%.6f&lng=%.6f" % (lat, lng), b""
+                start = time.perf_counter()
+                status, _ = await _request(reader, writer, method, target, body)
+                latencies.append(time.perf_counter() - start)
+                if status != 200:
+                    errors += 1
+        finally:
+            writer.close()
+
+    start = time.perf_counter()
+    await asyncio.gather(*(client() for _ in range(connections)))
+    seconds = time.perf_counter() - start
+
+    latencies.sort()
+    points = len(latencies) * max(batch, 1)
+    return {
+        "requests": len(latencies),
+        "points": points,
+        "errors": errors,
+        "seconds": seconds,
+        "requests_per_second": len(latencies) / seconds,
+        "points_per_second": points / seconds,
+        "latency_ms": {
+            name: 1000 * latencies[min(int(q * len(latencies)), len(latencies) - 1)]
+            for name, q in (("p50", 0.5), ("p90", 0.9), ("p99", 0.99), ("max", 1.0))
+        },
+    }
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(prog="python -m qc2c.serve.load_test", description="QC2C server load test")
+    parser.add_argument("--host", default=DEFAULT_HOST, help="server host (default: %(default)s)")
+    parser.add_argument("--port", type=int, default=DEFAULT_PORT, help="server port (default: %(default)s)")
+    parser.add_argument("--unix", help="connect to Unix socket at this path instead of TCP")
+    parser.add_argument("--connections", type=int, default=64, help="concurrent connections (default: %(default)s)")
+    parser.add_argument("--requests", type=int, default=20000, help="total requests (default: %(default)s)")
+    parser.add_argument("--batch", type=int, default=0,
+                        help="points per POST request, 0 sends single point GET requests (default: 0)")
+    parser.add_argument("--seed", type=int, default=0, help="random points seed (default: %(default)s)")
+    parser.add_argument("--start-server", action="store_true",
+                        help="start `python -m qc2c.serve` on localhost for the test, remaining arguments are passed")
+    args, server_args = parser.parse_known_args()
+
+    server = None
+    if args.start_server:
+        address = ["--unix", args.unix] if args.unix else ["--host", args.host, "--port", str(args.port)]
+        server = subprocess.Popen([sys.executable, "-m", __package__] + address + server_args)
+    try:
+        asyncio.run(wait_ready(args.host, args.port, args.unix))
+        report = asyncio.run(run_load_test(
+            args.host, args.port, args.unix, args.connections, args.requests, args.batch, args.seed,
+        ))
+    finally:
+        if server is not None:
+            server.terminate()
+            server.wait()
+
+    print("requests: %(requests)d, points: %(points)d, errors: %(errors)d in %(seconds).2f s" % report)
+    print("throughput: %(requests_per_second).0f requests/s, %(points_per_second).0f points/s" % report)
+    print("latency: p50 %(p50).2f ms, p90 %(p90).2f ms, p99 %(p99).2f ms, max %(max).2f ms" % report["latency_ms"])
+
+
+if __name__ == "__main__":
+    main()
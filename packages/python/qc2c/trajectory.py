@@ -0,0 +1,80 @@
+from typing import Iterable, Iterator, Optional, Tuple
+
+
+class Trajectory:
+    """
+    Stateful lookup of consecutive points of a track, e.g. vehicle or device positions.
+
+    Every point resolved with point in polygon tests leaves a circle around it, within which
+    the result cannot change (see `CompiledSector.get_country_radius`). Following points of the same sector
+    inside that circle are answered with a single distance check, others by grid cells or a full search,
+    which sets a new circle. Results are always the same as of `Geocoder.lookup`.
+
+    Lookups of the trajectory are not recorded in `Geocoder` metrics.
+
+    Args:
+        geocoder: Geocoder providing sectors, grids and sector locator.
+        max_distance: If given, points outside of all polygons get the country with the nearest border
+            within this distance in km, as in `Geocoder.lookup`.
+    """
+
+    def __init__(self, geocoder, max_distance: Optional[float] = None):
+        self.geocoder = geocoder
+        self.max_distance = max_distance
+        # last point resolved with point in polygon tests
+        self.sector = None
+        self.lat = 0.0
+        self.lng = 0.0
+        self.radius_squared = 0.0
+        self.country = None
+        # number of lookups and of lookups answered by the last circle
+        self.lookups = 0
+        self.hits = 0
+
+    def lookup(self, lat: float, lng: float) -> Optional[str]:
+        """
+        Determine the country of the next point.
+
+        Args:
+            lat: Latitude.
+            lng: Longitude.
+
+        Returns:
+            Country key if found, else None.
+        """
+        self.lookups += 1
+        geocoder = self.geocoder
+        key = geocoder.get_sector(lat, lng)
+        if key is None:
+            return None
+
+        d_lat = lat - self.lat
+        d_lng = lng - self.lng
+        if key == self.sector and d_lat * d_lat + d_lng * d_lng < self.radius_squared:
+            self.hits += 1
+            country = self.country
+        else:
+            grid = geocoder.get_grid(key)
+            resolved, country = (False, None) if grid is None else grid.lookup(lat, lng)
+            if not resolved:
+                country, radius = geocoder.sectors[key].get_country_radius(lat, lng)
+                self.sector, self.lat, self.lng, self.country = key, lat, lng, country
+                self.radius_squared = radius * radius
+
+        if country is None and self.max_distance:
+            return geocoder.nearest(lat, lng, self.max_distance)
+        return country
+
+    def stream(self, points: Iterable[Tuple[float, float]]) -> Iterator[Optional[str]]:
+        """
+        Determine countries of points as they arrive, suitable for unbounded streams.
+
+        Args:
+            points: Iterable of (lat, lng) pairs.
+
+        Returns:
+            Iterator of country keys, None where no country was found.
+        """
+        lookup = self.lookup
+        for lat, lng in points:
+            yield lookup(lat, lng)
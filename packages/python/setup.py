@@ -12,11 +12,26 @@ setup(
     url="https://github.com/deadsmond/QC2C",
     author="Adam Lewicki",
     packages=find_packages(),
+    package_data={
+        "qc2c.data.bin": ["*.bin"],
+        "qc2c.data.grid": ["*.grid"],
+        "qc2c.data.gz": ["*.json.gz"],
+        "qc2c.data.json": ["*.json"],
+        "qc2c.data.quantized": ["*.qsec"],
+    },
     install_requires=[],
+    extras_require={
+        "arrow": ["numpy", "pyarrow"],
+        "numpy": ["numpy"],
+        "pandas": ["numpy", "pandas"],
+    },
+    entry_points={
+        "console_scripts": ["qc2c=qc2c.cli:main"],
+    },
     classifiers=[
         "Programming Language :: Python :: 3",
         "License :: OSI Approved :: MIT License",
         "Operating System :: OS Independent",
     ],
-    python_requires=">=3.6",
+    python_requires=">=3.7",
 )
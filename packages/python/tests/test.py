@@ -1,5 +1,6 @@
 import unittest
-from python.qc2c.core import get_sector, get_country, point_in_polygon
+from python.qc2c.core import get_sector, get_country, point_in_polygon, point_in_flat_polygon, flatten_polygon, \
+    get_quadtree_sector
 
 
 class SectorCountryTest(unittest.TestCase):
@@ -23,6 +24,39 @@ class SectorCountryTest(unittest.TestCase):
         self.assertEqual(get_sector(sectors_manifest, coords_inside_sector2), "sector2")
         self.assertIsNone(get_sector(sectors_manifest, coords_outside))
 
+    def test_get_sector_extended_manifest(self):
+        sectors_manifest = {"sector1": {"bounds": [0, 0, 5, 5], "center": {}}, "sector2": {"bounds": [5, 0, 10, 5]}}
+
+        self.assertEqual(get_sector(sectors_manifest, {"lat": 3, "lng": 3}), "sector1")
+        self.assertEqual(get_sector(sectors_manifest, {"lat": 5, "lng": 3}), "sector1")
+        self.assertEqual(get_sector(sectors_manifest, {"lat": 7, "lng": 3}), "sector2")
+
+    def test_get_sector_quadtree_manifest(self):
+        sectors_manifest = {
+            "world_sector_q0.json.gz": [-90, -180, 0, 0],
+            "world_sector_q1.json.gz": [-90, 0, 0, 180],
+            "world_sector_q20.json.gz": [0, -180, 45, -90],
+            "world_sector_q21.json.gz": [0, -90, 45, 0],
+            "world_sector_q22.json.gz": [45, -180, 90, -90],
+            "world_sector_q23.json.gz": [45, -90, 90, 0],
+            "world_sector_q3.json.gz": [0, 0, 90, 180],
+        }
+        flat_manifest = {"sector%d" % index: bounds for index, bounds in enumerate(sectors_manifest.values())}
+        keys = dict(zip(flat_manifest, sectors_manifest))
+
+        self.assertEqual(get_sector(sectors_manifest, {"lat": 50, "lng": -100}), "world_sector_q22.json.gz")
+        self.assertEqual(get_sector(sectors_manifest, {"lat": 10, "lng": 10}), "world_sector_q3.json.gz")
+        self.assertIsNone(get_sector(sectors_manifest, {"lat": 91, "lng": 10}))
+        # points on edges belong to the first sector in manifest order, as in flat manifests
+        for lat, lng in [(0, 0), (45, -90), (0, -90), (90, 180), (-90, -180), (45, 0), (20, 0)]:
+            coordinates = {"lat": lat, "lng": lng}
+            self.assertEqual(get_quadtree_sector(sectors_manifest, coordinates),
+                             keys[get_sector(flat_manifest, coordinates)])
+        with self.assertRaises(ValueError):
+            get_quadtree_sector(flat_manifest, {"lat": 0, "lng": 0})
+        # keys looking like quadtree paths do not change how get_sector scans bounds
+        self.assertEqual(get_sector({"local_q1.json": [0, 0, 10, 10]}, {"lat": 5, "lng": 5}), "local_q1.json")
+
     def test_get_country(self):
         sector_manifest = {
             "country1": [[0, 0], [0, 5], [5, 5], [5, 0]],
@@ -36,3 +70,22 @@ class SectorCountryTest(unittest.TestCase):
         self.assertEqual(get_country(sector_manifest, coords_in_country1), "country1")
         self.assertEqual(get_country(sector_manifest, coords_in_country2), "country2")
         self.assertIsNone(get_country(sector_manifest, coords_outside))
+
+    def test_get_country_multi_polygon(self):
+        sector_manifest = {
+            "country1": [[[0, 0], [0, 2], [2, 2], [2, 0]], [[4, 4], [4, 6], [6, 6], [6, 4]]],
+            "country2": [[[[10, 10], [10, 20], [20, 20], [20, 10]], [[14, 14], [14, 16], [16, 16], [16, 14]]]],
+        }
+
+        self.assertEqual(get_country(sector_manifest, {"lat": 1, "lng": 1}), "country1")
+        self.assertEqual(get_country(sector_manifest, {"lat": 5, "lng": 5}), "country1")
+        self.assertEqual(get_country(sector_manifest, {"lat": 12, "lng": 12}), "country2")
+        self.assertIsNone(get_country(sector_manifest, {"lat": 15, "lng": 15}))
+
+    def test_point_in_flat_polygon(self):
+        coordinates, offsets = flatten_polygon([[[0, 0], [0, 10], [10, 10], [10, 0]], [[4, 4], [4, 6], [6, 6], [6, 4]]])
+
+        self.assertEqual(offsets, (0, 4, 8))
+        self.assertTrue(point_in_flat_polygon([2, 2], coordinates, offsets))
+        self.assertFalse(point_in_flat_polygon([5, 5], coordinates, offsets))
+        self.assertFalse(point_in_flat_polygon([11, 11], coordinates, offsets))
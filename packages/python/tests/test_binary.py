@@ -0,0 +1,62 @@
+import os
+import tempfile
+import unittest
+from python.qc2c.binary import BinarySector, dump_sector, dumps_sector, load_sector
+from python.qc2c.geocoder import Geocoder
+from python.qc2c.sector import CompiledSector
+
+
+class BinarySectorTest(unittest.TestCase):
+
+    def setUp(self):
+        self.sector_manifest = {
+            "country1": [[[0, 0], [0, 5], [5, 5], [5, 0]]],
+            "country2": [[[6, 6], [6, 10], [10, 10], [10, 6]], [[12, 12], [12, 13], [13, 13]]],
+        }
+
+    def test_round_trip(self):
+        sector = BinarySector(dumps_sector(self.sector_manifest))
+
+        self.assertEqual(list(sector), ["country1", "country2"])
+        self.assertEqual(
+            {key: [[list(point) for point in polygon] for polygon in polygons] for key, polygons in sector.items()},
+            self.sector_manifest,
+        )
+        self.assertEqual(sector["country2"][1][-1], (13, 13))
+
+    def test_grid_index(self):
+        buffer = dumps_sector(self.sector_manifest)
+        sector = BinarySector(buffer)
+        compiled = CompiledSector(sector)
+        reference = CompiledSector(self.sector_manifest)
+
+        self.assertIsNone(sector.get_index_cells(0.5))
+        self.assertEqual(len(sector.get_index_cells(1.0)), len(reference.index.cells))
+        self.assertEqual(
+            [[(key, box, polygon is None) for key, box, polygon in cell] for cell in compiled.index.cells],
+            [[(key, box, polygon is None) for key, box, polygon in cell] for cell in reference.index.cells],
+        )
+        self.assertEqual(compiled.get_country(2, 2), "country1")
+
+        # version 1 sectors, without index, build it on load
+        legacy = bytearray(buffer[:buffer.index(b"country2") + len("country2")])
+        legacy[4:6] = b"\x01\x00"
+        self.assertIsNone(BinarySector(bytes(legacy)).get_index_cells(1.0))
+        self.assertEqual(CompiledSector(BinarySector(bytes(legacy))).get_country(7, 7), "country2")
+
+    def test_load_sector(self):
+        with tempfile.TemporaryDirectory() as directory:
+            file_path = os.path.join(directory, "sector.bin")
+            dump_sector(self.sector_manifest, file_path, typecode="f")
+            sector = load_sector(file_path)
+
+            self.assertEqual(len(sector["country2"]), 2)
+            self.assertEqual(list(sector["country1"][0]), [(0, 0), (0, 5), (5, 5), (5, 0)])
+            del sector
+
+    def test_geocoder(self):
+        geocoder = Geocoder(binary=True)
+
+        self.assertEqual(geocoder.lookup(52.23, 21.01), "POL")
+        self.assertEqual(geocoder.lookup(-33.87, 151.21), "AUS")
+        self.assertIsNone(geocoder.lookup(-40, -120))
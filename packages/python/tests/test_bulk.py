@@ -0,0 +1,54 @@
+import unittest
+from python.qc2c.core import get_sector, get_country
+
+try:
+    import numpy as np
+    from python.qc2c.bulk import decode_codes, lookup_codes, lookup_many, points_in_polygon
+except ImportError:
+    np = None
+
+
+@unittest.skipIf(np is None, "numpy is not installed")
+class BulkLookupTest(unittest.TestCase):
+
+    def setUp(self):
+        self.sectors_manifest = {"sector1": [0, 0, 5, 5], "sector2": [6, 6, 10, 10]}
+        self.sectors = {
+            "sector1": {"country1": [[0, 0], [0, 5], [5, 5], [5, 0]]},
+            "sector2": {"country2": [[6, 6], [6, 10], [10, 10], [10, 6]]},
+        }
+
+    def test_points_in_polygon(self):
+        polygon = [[0, 0], [0, 2], [2, 2], [2, 0]]
+
+        result = points_in_polygon([1, 3, 1.5], [1, 3, 0.5], polygon)
+
+        self.assertEqual(result.tolist(), [True, False, True])
+
+    def test_lookup_many(self):
+        result = lookup_many(self.sectors_manifest, self.sectors, [2, 7, 11], [2, 7, 11])
+
+        self.assertEqual(result.tolist(), ["country1", "country2", None])
+
+    def test_lookup_many_matches_scalar_path(self):
+        rng = np.random.default_rng(0)
+        lats = rng.uniform(-1, 11, 500)
+        lngs = rng.uniform(-1, 11, 500)
+
+        result = lookup_many(self.sectors_manifest, self.sectors, lats, lngs)
+
+        for lat, lng, country in zip(lats, lngs, result):
+            coordinates = {"lat": lat, "lng": lng}
+            sector = get_sector(self.sectors_manifest, coordinates)
+            expected = get_country(self.sectors[sector], coordinates) if sector else None
+            self.assertEqual(country, expected)
+
+    def test_lookup_codes(self):
+        lats = np.array([2, 7, 11, 3], dtype=np.float64)
+
+        codes, categories = lookup_codes(self.sectors_manifest, self.sectors, lats, [2, 7, 11, 3], ["country2"])
+
+        self.assertEqual(codes.dtype, np.int32)
+        self.assertEqual(codes.tolist(), [1, 0, -1, 1])
+        self.assertEqual(categories, ["country2", "country1"])
+        self.assertEqual(decode_codes(codes, categories).tolist(), ["country1", "country2", None, "country1"])
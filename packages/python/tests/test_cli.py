@@ -0,0 +1,93 @@
+import csv
+import os
+import random
+import tempfile
+import unittest
+from python.qc2c.cli import annotate_csv, annotate_parquet, main
+from python.qc2c.geocoder import Geocoder
+
+try:
+    import pyarrow as pa
+    import pyarrow.parquet as pq
+except ImportError:
+    pa = None
+
+
+class AnnotateTest(unittest.TestCase):
+
+    def setUp(self):
+        random.seed(3)
+        self.points = [(random.uniform(-60, 70), random.uniform(-180, 180)) for _ in range(500)]
+        self.directory = tempfile.TemporaryDirectory()
+        self.input_file = os.path.join(self.directory.name, "input.csv")
+        with open(self.input_file, "w", encoding="utf-8", newline="") as file:
+            writer = csv.writer(file, delimiter=";")
+            writer.writerow(["id", "latitude", "longitude"])
+            writer.writerows([i, lat, lng] for i, (lat, lng) in enumerate(self.points))
+            writer.writerow(["malformed", "", "east"])
+            writer.writerow(["infinite", "inf", "0"])
+            writer.writerow(["short"])
+
+    def tearDown(self):
+        self.directory.cleanup()
+
+    def read_output(self, file_path):
+        with open(file_path, "r", encoding="utf-8", newline="") as file:
+            return list(csv.reader(file, delimiter=";"))
+
+    def test_annotate_csv(self):
+        geocoder = Geocoder()
+        expected = [geocoder.lookup(lat, lng) or "" for lat, lng in self.points] + ["", "", ""]
+
+        for workers in (1, 2):
+            output_file = os.path.join(self.directory.name, "output_%d.csv" % workers)
+            stats = annotate_csv(
+                self.input_file, output_file, "latitude", "longitude", chunk_size=64, workers=workers,
+                delimiter=";", quiet=True,
+            )
+            rows = self.read_output(output_file)
+            self.assertEqual(rows[0], ["id", "latitude", "longitude", "country"])
+            self.assertEqual([row[-1] for row in rows[1:]], expected)
+            self.assertEqual(rows[-1], ["short", ""])
+            self.assertEqual(stats["rows"], len(self.points) + 3)
+            self.assertEqual(stats["found"], len([country for country in expected if country]))
+
+        # rejected input creates no output file
+        output_file = os.path.join(self.directory.name, "rejected.csv")
+        with self.assertRaises(ValueError):
+            annotate_csv(self.input_file, output_file, "latitude", "longitude", country_column="id", delimiter=";",
+                         quiet=True)
+        self.assertFalse(os.path.exists(output_file))
+
+    @unittest.skipIf(pa is None, "pyarrow is not installed")
+    def test_annotate_parquet(self):
+        input_file = os.path.join(self.directory.name, "input.parquet")
+        output_file = os.path.join(self.directory.name, "output.parquet")
+        table = pa.table({"lat": [52.23, -40.0, None, float("inf"), 48.86], "lng": [21.01, -140.0, 0.0, 0.0, 2.35]})
+        pq.write_table(table, input_file)
+
+        for workers in (1, 2):
+            stats = annotate_parquet(input_file, output_file, workers=workers, quiet=True)
+            self.assertEqual(pq.read_table(output_file).column("country").to_pylist(),
+                             ["POL", None, None, None, "FRA"])
+            self.assertEqual((stats["rows"], stats["found"]), (5, 2))
+
+        # empty input still gets the country column
+        pq.write_table(table.slice(0, 0), input_file)
+        annotate_parquet(input_file, output_file, workers=1, quiet=True)
+        output = pq.read_table(output_file)
+        self.assertEqual((output.num_rows, output.schema.names), (0, ["lat", "lng", "country"]))
+
+        os.remove(output_file)
+        with self.assertRaises(ValueError):
+            annotate_parquet(input_file, output_file, country_column="lat", workers=1, quiet=True)
+        self.assertFalse(os.path.exists(output_file))
+
+    def test_main(self):
+        output_file = os.path.join(self.directory.name, "output.csv")
+        main(["annotate", self.input_file, "-o", output_file, "--lat-col", "latitude", "--lng-col", "longitude",
+              "--country-col", "iso", "--delimiter", ";", "--workers", "1", "-q"])
+        self.assertEqual(self.read_output(output_file)[0][-1], "iso")
+
+        with self.assertRaises(SystemExit):
+            main(["annotate", self.input_file, "-o", output_file, "--lat-col", "y", "--workers", "1", "-q"])
@@ -0,0 +1,107 @@
+import unittest
+from python.qc2c.geocoder import Geocoder
+
+try:
+    import numpy as np
+except ImportError:
+    np = None
+
+try:
+    import pyarrow as pa
+    from python.qc2c import arrow
+except ImportError:
+    pa = None
+
+try:
+    import pandas as pd
+    from python.qc2c import dataframe
+except ImportError:
+    pd = None
+
+POINTS = [(52.23, 21.01), (48.86, 2.35), (-40, -140), (52.23, 21.01), (40.71, -74.01)]
+
+
+@unittest.skipIf(np is None, "numpy is not installed")
+class LookupCodesTest(unittest.TestCase):
+
+    def test_lookup_codes(self):
+        geocoder = Geocoder()
+        lats = np.array([lat for lat, _ in POINTS])
+        lngs = np.array([lng for _, lng in POINTS])
+
+        codes, categories = geocoder.lookup_codes(lats, lngs)
+        self.assertEqual(sorted(categories), ["FRA", "NY", "POL"])
+        self.assertEqual([categories[code] if code >= 0 else None for code in codes],
+                         ["POL", "FRA", None, "POL", "NY"])
+        self.assertEqual(geocoder.lookup_many(lats, lngs).tolist(), ["POL", "FRA", None, "POL", "NY"])
+
+        # codes of the next batch extend the same categories
+        reversed_codes, reversed_categories = geocoder.lookup_codes(lats[::-1], lngs[::-1], categories=categories)
+        self.assertIs(reversed_categories, categories)
+        self.assertEqual(len(categories), 3)
+        self.assertEqual(reversed_codes.tolist(), codes[::-1].tolist())
+
+    def test_nearest(self):
+        geocoder = Geocoder()
+        lats, lngs = np.array([54.9, 52.23, -40]), np.array([18.5, 21.01, -120])
+
+        # fallback is on by default, unlike in lookup
+        self.assertEqual(geocoder.lookup_many(lats, lngs).tolist(), ["POL", "POL", None])
+        self.assertEqual(geocoder.lookup_many(lats, lngs, max_distance=None).tolist(), [None, "POL", None])
+        codes, categories = geocoder.lookup_codes(lats, lngs, max_distance=20)
+        self.assertEqual(codes.tolist(), [0, 0, -1])
+        self.assertEqual(categories, ["POL"])
+
+    def test_nearest_across_sectors(self):
+        geocoder = Geocoder()
+        # Fiji across the antimeridian, Papua New Guinea islands in the neighbouring sector
+        lats, lngs = np.array([-15.917, -9.927]), np.array([-179.956, 152.486])
+
+        self.assertEqual(geocoder.lookup_many(lats, lngs).tolist(), ["FJI", "PNG"])
+        for lat, lng in zip(lats, lngs):
+            self.assertEqual(geocoder.nearest(lat, lng, 20), geocoder.lookup_many([lat], [lng])[0])
+
+    def test_nearest_matches_scalar(self):
+        geocoder = Geocoder()
+        random = np.random.default_rng(0)
+        lats, lngs = random.uniform(-60, 75, 2000), random.uniform(-180, 180, 2000)
+
+        expected = [geocoder.lookup(lat, lng) or geocoder.nearest(lat, lng, 20) for lat, lng in zip(lats, lngs)]
+        self.assertEqual(geocoder.lookup_many(lats, lngs).tolist(), expected)
+
+    def test_nearest_skips_missing_coordinates(self):
+        geocoder = Geocoder()
+        lats, lngs = np.array([54.9, np.nan, 52.23, np.inf]), np.array([18.5, 18.5, np.nan, 0])
+
+        self.assertEqual(geocoder.lookup_many(lats, lngs, max_distance=20).tolist(), ["POL", None, None, None])
+        codes, categories = geocoder.lookup_codes(lats, lngs, max_distance=20)
+        self.assertEqual((codes.tolist(), categories), ([0, -1, -1, -1], ["POL"]))
+
+
+@unittest.skipIf(pa is None, "pyarrow is not installed")
+class ArrowTest(unittest.TestCase):
+
+    def test_lookup(self):
+        table = pa.Table.from_batches([
+            pa.record_batch([pa.array([lat for lat, _ in POINTS[:2]]), pa.array([lng for _, lng in POINTS[:2]])],
+                            names=["lat", "lng"]),
+            pa.record_batch([pa.array([lat for lat, _ in POINTS[2:]]), pa.array([lng for _, lng in POINTS[2:]])],
+                            names=["lat", "lng"]),
+        ])
+
+        countries = arrow.lookup(table)
+        self.assertEqual(countries.type, pa.dictionary(pa.int32(), pa.string()))
+        self.assertEqual(countries.to_pylist(), ["POL", "FRA", None, "POL", "NY"])
+
+
+@unittest.skipIf(pd is None, "pandas is not installed")
+class DataFrameTest(unittest.TestCase):
+
+    def test_lookup(self):
+        frame = pd.DataFrame(POINTS, columns=["y", "x"], index=range(10, 15))
+
+        countries = frame.qc2c.lookup("y", "x")
+        self.assertEqual(countries.dtype, "category")
+        self.assertEqual(list(countries.index), list(frame.index))
+        self.assertEqual(countries.astype(object).where(countries.notna(), None).tolist(),
+                         ["POL", "FRA", None, "POL", "NY"])
@@ -0,0 +1,59 @@
+import unittest
+from math import inf, nan
+from python.qc2c.geocoder import Geocoder, SectorCache
+
+
+class GeocoderTest(unittest.TestCase):
+
+    def test_lookup(self):
+        geocoder = Geocoder()
+
+        self.assertEqual(geocoder.lookup(52.23, 21.01), "POL")
+        self.assertEqual(geocoder.lookup(-33.87, 151.21), "AUS")
+        self.assertIsNone(geocoder.lookup(-40, -120))
+
+    def test_non_finite_coordinates(self):
+        points = [(nan, 21.01), (52.23, nan), (inf, 21.01), (52.23, -inf)]
+
+        for grid in (True, False):
+            geocoder = Geocoder(grid=grid)
+            for lat, lng in points:
+                self.assertIsNone(geocoder.get_sector(lat, lng))
+                self.assertIsNone(geocoder.lookup(lat, lng))
+                self.assertIsNone(geocoder.lookup(lat, lng, max_distance=50))
+            self.assertEqual(list(geocoder.stream(points + [(52.23, 21.01)])), [None] * 4 + ["POL"])
+
+            # sectors and grids get them too, when called directly
+            key = geocoder.get_sector(52.23, 21.01)
+            for lat, lng in points:
+                self.assertIsNone(geocoder.sectors[key].get_country(lat, lng))
+                if grid:
+                    self.assertEqual(geocoder.get_grid(key).lookup(lat, lng), (False, None))
+
+    def test_sectors_are_loaded_lazily(self):
+        geocoder = Geocoder(grid=False)
+        self.assertEqual(len(geocoder.sectors), 0)
+
+        geocoder.lookup(52.23, 21.01)
+        geocoder.lookup(48.85, 2.35)
+
+        self.assertEqual(len(geocoder.sectors), 1)
+        self.assertIn(geocoder.get_sector(52.23, 21.01), geocoder.sectors)
+
+
+class SectorCacheTest(unittest.TestCase):
+
+    def test_least_recently_used_sector_is_evicted(self):
+        loaded = []
+
+        class Cache(SectorCache):
+            def load(self, key):
+                loaded.append(key)
+                return {}
+
+        cache = Cache(maxsize=2)
+        for key in ["a", "b", "a", "c", "a", "b"]:
+            cache[key]
+
+        self.assertEqual(loaded, ["a", "b", "c", "b"])
+        self.assertEqual(len(cache), 2)
@@ -0,0 +1,49 @@
+import os
+import random
+import tempfile
+import unittest
+from python.qc2c.geocoder import Geocoder
+from python.qc2c.grid import CellGrid, dumps_grid, load_grid
+
+
+class CellGridTest(unittest.TestCase):
+
+    def setUp(self):
+        # 2 x 3 cells of 1 degree from [10, 20]: empty, country1, boundary / country2, country2, empty
+        self.buffer = dumps_grid([0, 1, None, 2, 2, 0], ["country1", "country2"], (10, 20), 1.0, 3)
+
+    def test_lookup(self):
+        grid = CellGrid(self.buffer)
+
+        self.assertEqual((grid.rows, grid.cols), (2, 3))
+        self.assertEqual(grid.lookup(10.5, 20.5), (True, None))
+        self.assertEqual(grid.lookup(10.5, 21.5), (True, "country1"))
+        self.assertEqual(grid.lookup(10.5, 22.5), (False, None))
+        self.assertEqual(grid.lookup(11.5, 20.5), (True, "country2"))
+        # upper edges belong to the last row and column, points outside of grid are not answered
+        self.assertEqual(grid.lookup(12, 23), (True, None))
+        self.assertEqual(grid.lookup(12.5, 20.5), (False, None))
+        self.assertEqual(grid.lookup(9.5, 20.5), (False, None))
+
+    def test_load_grid(self):
+        with tempfile.TemporaryDirectory() as directory:
+            file_path = os.path.join(directory, "sector.grid")
+            with open(file_path, "wb") as file:
+                file.write(self.buffer)
+            grid = load_grid(file_path)
+
+            self.assertEqual(grid.lookup(11.5, 21.5), (True, "country2"))
+            del grid
+
+    def test_geocoder(self):
+        geocoder = Geocoder()
+        reference = Geocoder(grid=False)
+
+        self.assertEqual(geocoder.lookup(52.23, 21.01), "POL")
+        self.assertIsNone(geocoder.lookup(-40, -120))
+        # both points lie in cells answered by the grid, sector was not loaded
+        self.assertEqual(len(geocoder.sectors), 0)
+        random.seed(1)
+        for _ in range(2000):
+            lat, lng = random.uniform(-90, 90), random.uniform(-180, 180)
+            self.assertEqual(geocoder.lookup(lat, lng), reference.lookup(lat, lng))
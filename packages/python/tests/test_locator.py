@@ -0,0 +1,39 @@
+import random
+import unittest
+from python.qc2c.core import get_sector
+from python.qc2c.locator import SectorLocator
+
+
+class SectorLocatorTest(unittest.TestCase):
+
+    def setUp(self):
+        self.sectors_manifest = {
+            "sector1": {"bounds": [24, -180, 90, -26], "center": {}},
+            "sector2": {"bounds": [-90, -180, 24, -26], "center": {}},
+            "sector3": {"bounds": [-10.5, -26, 90, 62.25], "center": {}},
+        }
+
+    def test_get_sector(self):
+        locator = SectorLocator(self.sectors_manifest)
+
+        self.assertEqual(locator.get_sector(50, -100), "sector1")
+        self.assertEqual(locator.get_sector(-50, -100), "sector2")
+        self.assertEqual(locator.get_sector(0, 0), "sector3")
+        self.assertIsNone(locator.get_sector(-50, 100))
+
+    def test_shared_edges_belong_to_first_sector(self):
+        locator = SectorLocator(self.sectors_manifest)
+
+        self.assertEqual(locator.get_sector(24, -100), "sector1")
+        self.assertEqual(locator.get_sector(24, -26), "sector1")
+        self.assertEqual(locator.get_sector(-10.5, -26), "sector2")
+        self.assertEqual(locator.get_sector(0, 62.25), "sector3")
+
+    def test_matches_get_sector(self):
+        locator = SectorLocator(self.sectors_manifest, cell_size=7)
+        random.seed(0)
+        points = [(random.uniform(-90, 90), random.uniform(-180, 180)) for _ in range(1000)]
+        points += [(lat, lng) for lat in (-90, -10.5, 24, 90) for lng in (-180, -26, 62.25, 180)]
+
+        for lat, lng in points:
+            self.assertEqual(locator.get_sector(lat, lng), get_sector(self.sectors_manifest, {"lat": lat, "lng": lng}))
@@ -0,0 +1,63 @@
+import random
+import unittest
+from python.qc2c.geocoder import Geocoder
+from python.qc2c.metrics import LookupMetrics
+from python.qc2c.sector import CompiledSector
+
+
+class LookupMetricsTest(unittest.TestCase):
+
+    def test_snapshot(self):
+        metrics = LookupMetrics(buckets=(10, 100))
+        metrics.add(1, 1, "sector", "country", "polygon", polygons=2, vertices=40, cache_hit=False, seconds=5e-6)
+        metrics.add(1, 1, "sector", None, "polygon", polygons=1, vertices=10, cache_hit=True, seconds=50e-6)
+        metrics.add(1, 1, None, None, "outside", seconds=1)
+
+        snapshot = metrics.snapshot()
+        self.assertEqual(snapshot["lookups"], 3)
+        self.assertEqual(snapshot["misses"], 2)
+        self.assertEqual(snapshot["paths"], {"outside": 1, "grid": 0, "polygon": 2})
+        self.assertEqual((snapshot["cache_hits"], snapshot["cache_misses"]), (1, 1))
+        self.assertEqual((snapshot["polygons"], snapshot["vertices"]), (3, 50))
+        self.assertEqual(snapshot["sectors"]["sector"]["lookups"], 2)
+        self.assertEqual(snapshot["latency_us"], {"buckets": [10, 100, None], "counts": [1, 1, 1]})
+
+        metrics.reset()
+        self.assertEqual(metrics.snapshot()["lookups"], 0)
+
+    def test_get_country_stats(self):
+        sector = CompiledSector({
+            "country": [[[0, 0], [0, 10], [10, 10], [10, 0]]],
+            "enclave": [[[4, 4], [4, 6], [6, 6], [6, 4]]],
+        }, cell_size=1)
+
+        random.seed(0)
+        for _ in range(500):
+            lat, lng = random.uniform(-1, 11), random.uniform(-1, 11)
+            country, polygons, vertices = sector.get_country_stats(lat, lng)
+            self.assertEqual(country, sector.get_country(lat, lng))
+            self.assertLessEqual(polygons, 2)
+        # cell fully inside country needs no point in polygon test, enclave is rejected by its bounding box
+        self.assertEqual(sector.get_country_stats(2.5, 2.5), ("country", 0, 0))
+        self.assertEqual(sector.get_country_stats(4.5, 4.5), ("enclave", 1, 4))
+
+    def test_geocoder(self):
+        events = []
+        geocoder = Geocoder(metrics=LookupMetrics(callback=events.append))
+        reference = Geocoder()
+
+        random.seed(2)
+        points = [(random.uniform(-90, 90), random.uniform(-180, 180)) for _ in range(500)]
+        for lat, lng in points:
+            self.assertEqual(geocoder.lookup(lat, lng), reference.lookup(lat, lng))
+
+        snapshot = geocoder.get_metrics()
+        self.assertEqual(snapshot["lookups"], len(points))
+        self.assertEqual(sum(snapshot["paths"].values()), len(points))
+        self.assertEqual(sum(snapshot["latency_us"]["counts"]), len(points))
+        self.assertEqual(snapshot["cache_misses"], len(snapshot["cached_sectors"]))
+        self.assertEqual(len(events), len(points))
+        self.assertEqual(events[-1]["country"], reference.lookup(*points[-1]))
+
+        with self.assertRaises(ValueError):
+            reference.get_metrics()
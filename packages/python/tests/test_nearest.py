@@ -0,0 +1,50 @@
+import random
+import unittest
+from python.qc2c.core import flatten_polygon
+from python.qc2c.geocoder import Geocoder
+from python.qc2c.nearest import KDTree, distance_to_polygon, haversine
+from python.qc2c.sector import CompiledSector
+
+
+class NearestCountryTest(unittest.TestCase):
+
+    def test_haversine(self):
+        self.assertAlmostEqual(haversine(0, 0, 1, 0), 111.195, places=2)
+        self.assertAlmostEqual(haversine(52.23, 21.01, 52.23, 21.01), 0)
+
+    def test_kd_tree_matches_brute_force(self):
+        random.seed(0)
+        points = [(str(i), random.uniform(-90, 90), random.uniform(-180, 180)) for i in range(200)]
+        tree = KDTree(points)
+
+        for _ in range(200):
+            lat, lng = random.uniform(-90, 90), random.uniform(-180, 180)
+            expected = min(points, key=lambda point: haversine(lat, lng, point[1], point[2]))
+            self.assertEqual(tree.nearest(lat, lng)[0], expected[0])
+
+        self.assertIsNone(tree.nearest(0, 0, max_distance=0.001))
+
+    def test_distance_to_polygon(self):
+        polygon = flatten_polygon([[[0, 0], [0, 1], [1, 1], [1, 0]]])
+
+        self.assertAlmostEqual(distance_to_polygon(0.5, 1.1, polygon), 0.1 * 111.195, places=3)
+        self.assertAlmostEqual(distance_to_polygon(-0.1, 0.5, polygon), 0.1 * 111.195, places=3)
+
+    def test_get_nearest_country(self):
+        sector = CompiledSector({
+            "country1": [[[0, 0], [0, 1], [1, 1], [1, 0]]],
+            "country2": [[[0, 1.3], [0, 2], [1, 2], [1, 1.3]]],
+        }, cell_size=0.25)
+
+        self.assertEqual(sector.get_nearest_country(0.5, 1.1, 50)[0], "country1")
+        self.assertEqual(sector.get_nearest_country(0.5, 1.2, 50)[0], "country2")
+        self.assertIsNone(sector.get_nearest_country(0.5, 1.15, 10))
+
+    def test_geocoder_nearest(self):
+        geocoder = Geocoder()
+
+        self.assertIsNone(geocoder.lookup(-40, -120, max_distance=20))
+        self.assertIsNone(geocoder.lookup(54.9, 18.5))
+        self.assertEqual(geocoder.lookup(54.9, 18.5, max_distance=20), "POL")
+        self.assertEqual(geocoder.nearest(52.23, 21.01, method="centroid"), None)
+        self.assertEqual(geocoder.nearest(52.23, 21.01, 200, method="centroid"), "POL")
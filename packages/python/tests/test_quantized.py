@@ -0,0 +1,65 @@
+import os
+import random
+import tempfile
+import unittest
+from python.qc2c.geocoder import Geocoder
+from python.qc2c.quantized import CompiledQuantizedSector, QuantizedSector, dumps_sector, load_sector, quantize
+from python.qc2c.sector import CompiledSector
+
+
+class QuantizedSectorTest(unittest.TestCase):
+
+    def setUp(self):
+        self.sector_manifest = {
+            "country1": [[[0.12345, -0.5], [0, 5], [5, 5.25], [5, 0]]],
+            "country2": [[[6, 6], [6, 10], [10, 10], [10, 6]], [[-12, -12], [-12, -13], [-13, -13]]],
+        }
+
+    def test_round_trip(self):
+        sector = QuantizedSector(dumps_sector(self.sector_manifest, resolution=1e-3))
+
+        self.assertEqual(list(sector), ["country1", "country2"])
+        self.assertEqual(quantize(0.12345, 1e-3), 123)
+        self.assertEqual(list(sector.coordinates[:4]), [123, -500, 0, 5000])
+        for key, polygons in self.sector_manifest.items():
+            for polygon, decoded in zip(polygons, sector[key]):
+                for point, decoded_point in zip(polygon, decoded):
+                    self.assertAlmostEqual(point[0], decoded_point[0], delta=5e-4)
+                    self.assertAlmostEqual(point[1], decoded_point[1], delta=5e-4)
+
+    def test_load_sector(self):
+        with tempfile.TemporaryDirectory() as directory:
+            file_path = os.path.join(directory, "sector.qsec")
+            with open(file_path, "wb") as file:
+                file.write(dumps_sector(self.sector_manifest))
+            sector = load_sector(file_path)
+
+            self.assertEqual(len(sector["country2"]), 2)
+            self.assertEqual(sector.resolution, 1e-4)
+
+    def test_compiled_sector(self):
+        sector = CompiledQuantizedSector(QuantizedSector(dumps_sector(self.sector_manifest)))
+        reference = CompiledSector(self.sector_manifest)
+
+        random.seed(0)
+        for _ in range(1000):
+            lat, lng = random.uniform(-14, 11), random.uniform(-14, 11)
+            self.assertEqual(sector.get_country(lat, lng), reference.get_country(lat, lng))
+        self.assertEqual(sector.get_nearest_country(10.05, 8, 20)[0], "country2")
+        self.assertAlmostEqual(sector.get_country_radius(8.5, 7.5)[1], reference.get_country_radius(8.5, 7.5)[1])
+
+    def test_geocoder(self):
+        geocoder = Geocoder(quantized=True)
+        reference = Geocoder()
+
+        self.assertEqual(geocoder.lookup(52.23, 21.01), "POL")
+        random.seed(6)
+        for _ in range(2000):
+            lat, lng = random.uniform(-90, 90), random.uniform(-180, 180)
+            country = geocoder.lookup(lat, lng)
+            if country != reference.lookup(lat, lng):
+                # results differ only for points closer to a border than quantization resolution
+                sector = reference.sectors[reference.get_sector(lat, lng)]
+                self.assertLess(sector.get_country_radius(lat, lng)[1], 1e-4)
+        with self.assertRaises(ValueError):
+            Geocoder(binary=True, quantized=True)
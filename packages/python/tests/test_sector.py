@@ -0,0 +1,72 @@
+import random
+import unittest
+from python.qc2c.core import flatten_polygon, get_country
+from python.qc2c.sector import CompiledSector, GridIndex
+
+
+class CompiledSectorTest(unittest.TestCase):
+
+    def test_get_country(self):
+        sector = CompiledSector({
+            "country1": [[[0, 0], [0, 5], [5, 5], [5, 0]]],
+            "country2": [[[6, 6], [6, 10], [10, 10], [10, 6]], [[12, 12], [12, 13], [13, 13], [13, 12]]],
+        })
+
+        self.assertEqual(sector.get_country(2, 2), "country1")
+        self.assertEqual(sector.get_country(7, 7), "country2")
+        self.assertEqual(sector.get_country(12.5, 12.5), "country2")
+        self.assertIsNone(sector.get_country(11, 11))
+
+    def test_enclave_takes_precedence(self):
+        sector = CompiledSector({
+            "country": [[[0, 0], [0, 10], [10, 10], [10, 0]]],
+            "enclave": [[[4, 4], [4, 6], [6, 6], [6, 4]]],
+        })
+
+        self.assertEqual(list(sector), ["enclave", "country"])
+        self.assertEqual(sector.get_country(5, 5), "enclave")
+        self.assertEqual(sector.get_country(2, 2), "country")
+
+    def test_polygon_with_hole(self):
+        sector = CompiledSector({
+            "country": [[[[0, 0], [0, 10], [10, 10], [10, 0]], [[4, 4], [4, 6], [6, 6], [6, 4]]]],
+        }, cell_size=0.5)
+
+        self.assertEqual(sector.get_country(2, 2), "country")
+        self.assertIsNone(sector.get_country(5, 5))
+
+    def test_polygons_read_on_access(self):
+        class Manifest(dict):
+            reads = 0
+
+            def __getitem__(self, key):
+                Manifest.reads += 1
+                return super().__getitem__(key)
+
+        sector = CompiledSector(Manifest({"country": [[[0, 0], [0, 10], [10, 10], [10, 0]]], "empty": []}))
+
+        self.assertEqual(Manifest.reads, 0)
+        self.assertEqual(list(sector), ["country"])
+        self.assertEqual(sector["country"], [[[0, 0], [0, 10], [10, 10], [10, 0]]])
+        self.assertEqual(Manifest.reads, 1)
+        self.assertRaises(KeyError, lambda: sector["empty"])
+
+    def test_grid_index(self):
+        polygon = flatten_polygon([[[0, 0], [0, 10], [10, 10], [10, 0]]])
+        index = GridIndex([("country", (0, 0, 10, 10), polygon)], cell_size=2)
+
+        self.assertEqual(index.candidates(5, 5), (("country", (0, 0, 10, 10), None),))
+        self.assertEqual(index.candidates(1, 5), (("country", (0, 0, 10, 10), polygon),))
+
+    def test_matches_get_country(self):
+        sector_manifest = {
+            "country1": [[0, 0], [0, 5], [3, 7], [5, 5], [5, 0]],
+            "country2": [[6, 6], [6, 10], [10, 10], [8, 7], [10, 6]],
+        }
+        sector = CompiledSector(sector_manifest, cell_size=0.5)
+        random.seed(0)
+
+        for _ in range(500):
+            lat, lng = random.uniform(-1, 11), random.uniform(-1, 11)
+            expected = get_country(sector_manifest, {"lat": lat, "lng": lng})
+            self.assertEqual(sector.get_country(lat, lng), expected)
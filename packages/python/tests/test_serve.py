@@ -0,0 +1,133 @@
+import asyncio
+import json
+import unittest
+from python.qc2c.geocoder import Geocoder
+from python.qc2c.serve import Batcher, LookupServer, create_socket
+from python.qc2c.serve.load_test import _request, run_load_test
+
+
+class ServeTest(unittest.TestCase):
+
+    def setUp(self):
+        self.geocoder = Geocoder()
+
+    def test_batcher(self):
+        async def lookup_all(batcher, points):
+            return await asyncio.gather(*(batcher.lookup(lat, lng) for lat, lng in points))
+
+        points = [(52.23, 21.01), (48.86, 2.35), (0, -30), (40.71, -74.01)] * 5
+        batcher = Batcher(self.geocoder, batch_size=8)
+        countries = asyncio.run(lookup_all(batcher, points))
+
+        self.assertEqual(countries, [self.geocoder.lookup(lat, lng) for lat, lng in points])
+        # concurrent lookups are coalesced into full batches and the rest
+        self.assertEqual((batcher.batches, batcher.points), (3, 20))
+
+    def test_batcher_isolates_errors(self):
+        class FailingGeocoder:
+            def lookup(self, lat, lng, max_distance=None):
+                if lat > 90:
+                    raise ValueError("invalid latitude")
+                return "POL"
+
+        async def lookup_all(batcher, points):
+            return await asyncio.gather(*(batcher.lookup(lat, lng) for lat, lng in points), return_exceptions=True)
+
+        results = asyncio.run(lookup_all(Batcher(FailingGeocoder()), [(52.23, 21.01), (100, 0), (52.23, 21.01)]))
+        self.assertEqual((results[0], results[2]), ("POL", "POL"))
+        self.assertIsInstance(results[1], ValueError)
+
+    def test_server(self):
+        async def run():
+            sock = create_socket(port=0)
+            port = sock.getsockname()[1]
+            listener = await asyncio.start_server(LookupServer(Batcher(self.geocoder)).handle, sock=sock)
+            async with listener:
+                reader, writer = await asyncio.open_connection("127.0.0.1", port)
+                responses = [
+                    await _request(reader, writer, "GET", "/lookup?lat=52.23&lng=21.01"),
+                    await _request(reader, writer, "POST", "/lookup", json.dumps({"points": [[-40, -140], [52.23, 21.01]]})
+                                   .encode("utf-8")),
+                    await _request(reader, writer, "GET", "/lookup?lat=north"),
+                    await _request(reader, writer, "GET", "/unknown"),
+                ]
+                writer.close()
+                report = await run_load_test(port=port, connections=8, requests=200)
+            return responses, report
+
+        responses, report = asyncio.run(run())
+        self.assertEqual(responses[0], (200, {"country": "POL"}))
+        self.assertEqual(responses[1], (200, {"countries": [None, "POL"]}))
+        self.assertEqual([status for status, _ in responses[2:]], [400, 404])
+        self.assertEqual((report["requests"], report["errors"]), (200, 0))
+
+    def test_non_finite_points(self):
+        async def get(port, query):
+            reader, writer = await asyncio.open_connection("127.0.0.1", port)
+            response = await _request(reader, writer, "GET", "/lookup?" + query)
+            writer.close()
+            return response
+
+        async def run():
+            sock = create_socket(port=0)
+            port = sock.getsockname()[1]
+            # batches larger than concurrent requests, so all of them are resolved together
+            listener = await asyncio.start_server(LookupServer(Batcher(self.geocoder, batch_size=8)).handle, sock=sock)
+            async with listener:
+                responses = await asyncio.gather(*(
+                    get(port, query) for query in ("lat=52.23&lng=21.01", "lat=nan&lng=0", "lat=52.23&lng=inf",
+                                                   "lat=48.86&lng=2.35")
+                ))
+                reader, writer = await asyncio.open_connection("127.0.0.1", port)
+                responses += [
+                    await _request(reader, writer, "POST", "/lookup", b'{"points": [[52.23, 21.01], [NaN, 0]]}'),
+                    # above batch size, resolved in worker thread
+                    await _request(reader, writer, "POST", "/lookup", json.dumps({"points": [[52.23, 21.01]] * 20})
+                                   .encode("utf-8")),
+                ]
+                writer.close()
+            return responses
+
+        responses = asyncio.run(run())
+        self.assertEqual(responses[0], (200, {"country": "POL"}))
+        self.assertEqual([status for status, _ in responses[1:3]], [400, 400])
+        self.assertEqual(responses[3], (200, {"country": "FRA"}))
+        self.assertEqual(responses[4][0], 400)
+        self.assertEqual(responses[5], (200, {"countries": ["POL"] * 20}))
+
+    def test_internal_error(self):
+        class FailingServer(LookupServer):
+            async def dispatch(self, method, target, body):
+                raise RuntimeError("unexpected")
+
+        async def run():
+            sock = create_socket(port=0)
+            port = sock.getsockname()[1]
+            listener = await asyncio.start_server(FailingServer(Batcher(self.geocoder)).handle, sock=sock)
+            async with listener:
+                reader, writer = await asyncio.open_connection("127.0.0.1", port)
+                response = await _request(reader, writer, "GET", "/health")
+                writer.close()
+            return response
+
+        self.assertEqual(asyncio.run(run()), (500, {"error": "internal error: RuntimeError"}))
+
+    def test_invalid_content_length(self):
+        async def send(port, content_length):
+            reader, writer = await asyncio.open_connection("127.0.0.1", port)
+            writer.write(("POST /lookup HTTP/1.1\r\nContent-Length: %s\r\n\r\n" % content_length).encode("latin-1"))
+            response = await reader.read()
+            writer.close()
+            return response
+
+        async def run():
+            sock = create_socket(port=0)
+            port = sock.getsockname()[1]
+            listener = await asyncio.start_server(LookupServer(Batcher(self.geocoder)).handle, sock=sock)
+            async with listener:
+                return [await send(port, content_length) for content_length in ("abc", "-5", "+5")]
+
+        for response in asyncio.run(run()):
+            # connection is closed after the error, body is not read
+            self.assertTrue(response.startswith(b"HTTP/1.1 400 "))
+            self.assertTrue(response.endswith(b'{"error":"invalid content-length"}'))
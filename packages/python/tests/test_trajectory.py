@@ -0,0 +1,51 @@
+import math
+import random
+import unittest
+from python.qc2c.geocoder import Geocoder
+from python.qc2c.sector import CompiledSector
+from python.qc2c.trajectory import Trajectory
+
+
+class TrajectoryTest(unittest.TestCase):
+
+    def test_get_country_radius(self):
+        sector = CompiledSector({
+            "country": [[[0, 0], [0, 10], [10, 10], [10, 0]]],
+            "enclave": [[[4, 4], [4, 6], [6, 6], [6, 4]]],
+            "island": [[[12, 2], [13, 4], [12, 6]]],
+        }, cell_size=2)
+
+        random.seed(0)
+        for _ in range(300):
+            lat, lng = random.uniform(-1, 14), random.uniform(-1, 11)
+            country, radius = sector.get_country_radius(lat, lng)
+            self.assertEqual(country, sector.get_country(lat, lng))
+            for _ in range(10):
+                angle, distance = random.uniform(0, 2 * math.pi), random.uniform(0, radius)
+                self.assertEqual(
+                    sector.get_country(lat + distance * math.cos(angle), lng + distance * math.sin(angle)), country
+                )
+        # distance to the nearest enclave edge
+        self.assertAlmostEqual(sector.get_country_radius(5, 5.5)[1], 0.5)
+        # points outside of the index are not reused
+        self.assertEqual(sector.get_country_radius(-1, -1), (None, 0.0))
+
+    def test_stream(self):
+        for grid in (True, False):
+            geocoder = Geocoder(grid=grid)
+
+            # random walks of small steps, crossing borders now and then
+            random.seed(4)
+            points = []
+            for _ in range(20):
+                lat, lng, heading = random.uniform(-50, 65), random.uniform(-170, 170), 0.0
+                for _ in range(200):
+                    heading += random.gauss(0, 0.2)
+                    lat, lng = lat + 0.01 * math.cos(heading), lng + 0.01 * math.sin(heading)
+                    points.append((lat, lng))
+
+            trajectory = Trajectory(geocoder)
+            self.assertEqual(list(trajectory.stream(points)), [geocoder.lookup(lat, lng) for lat, lng in points])
+            self.assertEqual(trajectory.lookups, len(points))
+            self.assertEqual(list(geocoder.stream(iter(points[:50]))), [geocoder.lookup(*point) for point in points[:50]])
+        self.assertGreater(trajectory.hits, 0)
@@ -0,0 +1,50 @@
+import argparse
+
+from .pipeline import parse_stages, run
+from .scripts.stage_2.main import MAX_PASSES
+from .scripts.stage_3.main import QUANTIZATION_RESOLUTION
+
+
+def get_stages(value: str) -> list:
+    try:
+        return parse_stages(value)
+    except ValueError as error:
+        raise argparse.ArgumentTypeError(str(error))
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(prog='python -m workflow', description='QC2C sectors generation workflow')
+    commands = parser.add_subparsers(dest='command', required=True)
+
+    run_parser = commands.add_parser('run', help='run consecutive stages in a single process')
+    run_parser.add_argument('--stages', type=get_stages, default=parse_stages('1-4'),
+                            help='range of consecutive stages to run, e.g. 1-4 or 2-3 (default: 1-4)')
+    run_parser.add_argument('--dump', type=get_stages, default=[],
+                            help='intermediate stages to write to data/output, e.g. 1,2 for preview_world_sectors.py')
+    run_parser.add_argument('--jobs', type=int, default=1,
+                            help='number of worker processes merging countries in stage 1, 0 for all cores (default: 1)')
+    run_parser.add_argument('--max-passes', type=int, default=MAX_PASSES,
+                            help='maximum number of simplification passes per sector in stage 2 (default: %(default)s)')
+    run_parser.add_argument('--no-cache', action='store_true',
+                            help='compute everything again, ignoring results cached in data/cache')
+    run_parser.add_argument('--countries', default='countries.json',
+                            help='countries GeoJSON in data/input, FeatureCollection or newline-delimited (.geojsonl) '
+                                 '(default: countries.json)')
+    run_parser.add_argument('--max-vertices', type=int, default=0,
+                            help='generate quadtree sectors with at most this many vertices each in stage 1, '
+                                 'instead of reading data/input/world_sectors.json (default: 0, disabled)')
+    run_parser.add_argument('--resolution', type=float, default=QUANTIZATION_RESOLUTION,
+                            help='size of integer unit of quantized sectors in degrees (default: %(default)s)')
+    run_parser.add_argument('--report', help='write JSON report of step timers and per country / sector values '
+                                             'of each stage to file')
+    run_parser.add_argument('--profile',
+                            help='write cProfile stats (or pyinstrument .html page) of the run to file')
+    args = parser.parse_args()
+
+    if args.stages != list(range(args.stages[0], args.stages[-1] + 1)):
+        parser.error('--stages must be a range of consecutive stages')
+    if not set(args.dump) <= set(args.stages):
+        parser.error('--dump stages must be part of --stages')
+
+    run(args.stages, args.dump, args.jobs, args.max_passes, not args.no_cache, args.countries,
+        args.max_vertices, args.report, args.profile, args.resolution)
@@ -0,0 +1,123 @@
+import gzip
+import json
+import shutil
+import time
+from os import makedirs, path
+
+from .scripts.stage_1 import main as stage_1
+from .scripts.stage_2 import main as stage_2
+from .scripts.stage_3 import main as stage_3
+from .scripts.stage_4 import main as stage_4
+# the same module the stage scripts record to, imported by them from scripts directory
+from .scripts.stage_1.main import profiler
+
+DATA_DIRECTORY = path.join(path.dirname(path.abspath(__file__)), 'data')
+STAGES = (1, 2, 3, 4)
+
+
+def parse_stages(stages: str) -> list:
+    # "1-4" -> [1, 2, 3, 4], "1,3" -> [1, 3]
+    result = set()
+    for part in stages.split(','):
+        first, _, last = part.partition('-')
+        first = int(first)
+        last = int(last or first)
+        if not (STAGES[0] <= first <= last <= STAGES[-1]):
+            raise ValueError("stages must be within %d-%d, got: %s" % (STAGES[0], STAGES[-1], part))
+        result.update(range(first, last + 1))
+    return sorted(result)
+
+
+def get_output_directory(stage: int) -> str:
+    return path.join(DATA_DIRECTORY, 'output', 'stage_%d' % stage)
+
+
+def load_stage(stage: int) -> tuple:
+    # read world manifest and sectors written by stage script (or dumped by pipeline) from disk
+    directory = get_output_directory(stage)
+    with open(path.join(directory, 'world_sectors.json'), 'r') as file:
+        world_sectors = json.load(file)
+
+    sectors = {}
+    if stage < 3:
+        for sector in world_sectors:
+            with open(path.join(directory, sector), 'r') as file:
+                sectors[sector] = json.load(file)
+    else:
+        # after stage 3 sectors are compressed and manifest keys point to gzip files
+        world_sectors = {key[:-len('.gz')]: value for key, value in world_sectors.items()}
+        for sector in world_sectors:
+            with gzip.open(path.join(directory, '%s.gz' % sector), 'rt', encoding='utf-8') as file:
+                sectors[sector] = json.load(file)
+    return world_sectors, sectors
+
+
+def dump_stage(stage: int, world_sectors: dict, sectors: dict, resolution: float = stage_3.QUANTIZATION_RESOLUTION):
+    # write stage output in the same layout as the stage script, replacing previous files
+    directory = get_output_directory(stage)
+    shutil.rmtree(directory, ignore_errors=True)
+    makedirs(directory)
+
+    if stage < 3:
+        stage_1.save_world_sectors(world_sectors, directory)
+        stage_1.save_sectors(sectors, directory)
+        return
+
+    for sector, sector_data in sectors.items():
+        bounds = world_sectors[sector]
+        stage_3.export_sector(sector, sector_data, directory, bounds['bounds'] if stage == 4 else bounds, resolution)
+    if stage == 3:
+        with open(path.join(directory, 'world_sectors.json'), 'w') as file:
+            json.dump(stage_3.get_sectors_manifest(world_sectors), file, separators=(',', ':'))
+    else:
+        stage_4.save_world_sectors(stage_3.get_sectors_manifest(world_sectors),
+                                   path.join(directory, 'world_sectors.json.gz'))
+
+
+def run_stage(stage: int, world_sectors: dict, sectors: dict, jobs: int, max_passes: int, use_cache: bool,
+              countries_file: str, max_vertices: int) -> tuple:
+    if stage == 1:
+        return stage_1.generate_sectors(path.join(DATA_DIRECTORY, 'input'), jobs, use_cache, countries_file,
+                                        max_vertices)
+    if stage == 2:
+        return world_sectors, {sector: stage_2.simplify_sector_data(sector, sector_data, max_passes, use_cache)
+                               for sector, sector_data in sectors.items()}
+    if stage == 3:
+        # stage 3 only changes encoding of sectors, files are written once by the last stage
+        return world_sectors, sectors
+    # extend manifest with center coordinates of each country in sector
+    return {sector: {'bounds': bounds, 'center': stage_4.get_centers(sectors[sector])}
+            for sector, bounds in world_sectors.items()}, sectors
+
+
+def run(stages: list, dump: list = (), jobs: int = 1, max_passes: int = stage_2.MAX_PASSES,
+        use_cache: bool = True, countries_file: str = 'countries.json', max_vertices: int = 0,
+        report_file: str = None, profile_file: str = None, resolution: float = stage_3.QUANTIZATION_RESOLUTION):
+    # run consecutive stages in a single process, passing sectors between them in memory.
+    # Output of the last stage is always written, intermediate stages only if listed in dump.
+    # Instrumentation of each stage is collected separately and written as a single report.
+    run_start_time = time.time()
+    stage_reports = []
+
+    with profiler.profile(profile_file):
+        world_sectors, sectors = (None, None) if stages[0] == STAGES[0] else load_stage(stages[0] - 1)
+        for stage in stages:
+            stage_start_time = time.time()
+            profiler.reset()
+            world_sectors, sectors = run_stage(stage, world_sectors, sectors, jobs, max_passes, use_cache,
+                                               countries_file, max_vertices)
+            if stage == stages[-1] or stage in dump:
+                with profiler.timer('dump_stage'):
+                    dump_stage(stage, world_sectors, sectors, resolution)
+            stage_runtime = time.time() - stage_start_time
+            print(f"Stage {stage} runtime: {stage_runtime:.2f} seconds")
+            profiler.print_timers(5)
+            stage_reports.append(profiler.get_report(stage=stage, runtime=stage_runtime))
+
+    total_runtime = time.time() - run_start_time
+    print(f"Total runtime: {total_runtime:.2f} seconds")
+    if report_file:
+        profiler.save_report({'runtime': total_runtime, 'arguments': {
+            'stages': stages, 'dump': list(dump), 'jobs': jobs, 'max_passes': max_passes, 'use_cache': use_cache,
+            'countries_file': countries_file, 'max_vertices': max_vertices, 'resolution': resolution},
+            'stages': stage_reports}, report_file)
@@ -0,0 +1,45 @@
+import hashlib
+import json
+import os
+from os import path
+
+# build cache shared by workflow stages:
+# results are stored as json files named by hash of everything they were computed from,
+# so unchanged countries and sectors are read back instead of being computed again
+CACHE_DIRECTORY = path.join(path.dirname(path.abspath(__file__)), '../data/cache')
+
+
+def get_cache_key(*inputs) -> str:
+    # floats are serialized with full precision, so any change of geometry changes the key
+    data = json.dumps(inputs, separators=(',', ':'), sort_keys=True)
+    return hashlib.sha256(data.encode('utf-8')).hexdigest()
+
+
+def get_file_hash(file_path: str) -> str:
+    # used to invalidate results of a stage whenever its script changes
+    with open(file_path, 'rb') as file:
+        return hashlib.sha256(file.read()).hexdigest()
+
+
+def get_cache_path(stage: str, key: str) -> str:
+    return path.join(CACHE_DIRECTORY, stage, key[:2], '%s.json' % key)
+
+
+def load_cached(stage: str, key: str):
+    # returns None if there is no (readable) entry for the key
+    try:
+        with open(get_cache_path(stage, key), 'r') as file:
+            return json.load(file)
+    except (OSError, ValueError):
+        return None
+
+
+def save_cached(stage: str, key: str, value):
+    cache_path = get_cache_path(stage, key)
+    os.makedirs(path.dirname(cache_path), exist_ok=True)
+
+    # write to temporary file first, so interrupted runs never leave broken entries
+    temporary_path = '%s.%d.tmp' % (cache_path, os.getpid())
+    with open(temporary_path, 'w') as file:
+        json.dump(value, file, separators=(',', ':'))
+    os.replace(temporary_path, cache_path)
@@ -0,0 +1,120 @@
+import cProfile
+import json
+import os
+import platform
+import time
+from contextlib import contextmanager
+from functools import wraps
+from os import path
+
+# run instrumentation shared by workflow stages:
+# timers sum wall time and calls of named steps, records collect per country / per sector values
+# (durations, vertex counts), both are written as a single JSON report per run.
+# Worker processes collect their own values, which are passed back with results and merged.
+timers = {}
+records = {}
+
+
+def reset():
+    timers.clear()
+    records.clear()
+
+
+@contextmanager
+def timer(name: str):
+    start_time = time.perf_counter()
+    try:
+        yield
+    finally:
+        add_time(name, time.perf_counter() - start_time)
+
+
+def timed(function):
+    # decorator timing every call of the function under its name
+    @wraps(function)
+    def wrapper(*args, **kwargs):
+        with timer(function.__name__):
+            return function(*args, **kwargs)
+    return wrapper
+
+
+def add_time(name: str, seconds: float, calls: int = 1):
+    entry = timers.setdefault(name, [0, 0.0])
+    entry[0] += calls
+    entry[1] += seconds
+
+
+def record(category: str, key: str, **values):
+    # numeric values of the same key are summed, e.g. a country split into many sectors
+    entry = records.setdefault(category, {}).setdefault(key, {})
+    for name, value in values.items():
+        entry[name] = entry.get(name, 0) + value
+
+
+def collect() -> dict:
+    # values collected since the last reset, used to pass them from worker processes
+    collected = {'timers': {name: list(entry) for name, entry in timers.items()},
+                 'records': {category: {key: dict(entry) for key, entry in entries.items()}
+                             for category, entries in records.items()}}
+    reset()
+    return collected
+
+
+def merge(collected: dict):
+    for name, (calls, seconds) in collected['timers'].items():
+        add_time(name, seconds, calls)
+    for category, entries in collected['records'].items():
+        for key, values in entries.items():
+            record(category, key, **values)
+
+
+def get_report(**details) -> dict:
+    # timers sorted by total time, slowest steps first
+    report = dict(details)
+    report['timers'] = {name: {'calls': calls, 'seconds': seconds}
+                        for name, (calls, seconds) in sorted(timers.items(), key=lambda item: -item[1][1])}
+    report['records'] = {category: dict(entries) for category, entries in records.items()}
+    return report
+
+
+def save_report(report: dict, output_file: str):
+    # reports are stamped, so reports of many runs can be compared over time
+    report = dict(report, created=time.strftime('%Y-%m-%dT%H:%M:%S'), python=platform.python_version())
+    directory = path.dirname(path.abspath(output_file))
+    os.makedirs(directory, exist_ok=True)
+    with open(output_file, 'w') as file:
+        json.dump(report, file, indent=2)
+
+
+def print_timers(limit: int = 10):
+    for name, (calls, seconds) in sorted(timers.items(), key=lambda item: -item[1][1])[:limit]:
+        print(f"{name}: {seconds:.2f} seconds in {calls} calls")
+
+
+@contextmanager
+def profile(output_file: str = None):
+    # optional call profiling of the whole run: pyinstrument for .html files (if installed), cProfile otherwise.
+    # cProfile stats can be inspected with: python -m pstats FILE or snakeviz FILE
+    if not output_file:
+        yield
+        return
+
+    if output_file.endswith('.html'):
+        from pyinstrument import Profiler
+        profiler = Profiler()
+        profiler.start()
+        try:
+            yield
+        finally:
+            profiler.stop()
+            with open(output_file, 'w') as file:
+                file.write(profiler.output_html())
+        return
+
+    profiler = cProfile.Profile()
+    profiler.enable()
+    try:
+        yield
+    finally:
+        profiler.disable()
+        profiler.dump_stats(output_file)
@@ -1,11 +1,33 @@
 ﻿import json
+import shapely
 from shapely.geometry import shape, Polygon, MultiPolygon, box
-from shapely.ops import unary_union
+from shapely.strtree import STRtree
 from tqdm import tqdm
+from heapq import heappush, heappop
 import time
-import shutil
+import argparse
+import sys
+from typing import Iterator
+from multiprocessing import Pool, cpu_count
 from os import path
 
+sys.path.insert(0, path.join(path.dirname(path.abspath(__file__)), '..'))
+from build_cache import get_cache_key, get_file_hash, load_cached, save_cached  # noqa: E402
+import profiler  # noqa: E402
+
+# simplification tolerance in degrees
+TOLERANCE = 0.1
+# polygons are clipped to sectors extended by this margin in degrees,
+# wider than tolerance so simplified borders never uncover sector edges
+SECTOR_MARGIN = 2 * TOLERANCE
+# size of chunks read by streaming GeoJSON reader
+READ_SIZE = 1 << 20
+# world box split by quadtree partitioning, same as qc2c.core.QUADTREE_BOUNDS
+QUADTREE_BOUNDS = (-90.0, -180.0, 90.0, 180.0)
+QUADTREE_MAX_DEPTH = 8
+# extensions of newline-delimited GeoJSON files, with a single feature per line
+NEWLINE_DELIMITED_EXTENSIONS = ('.geojsonl', '.geojsons', '.ndjson', '.jsonl')
+
 
 def get_sector_grid(coordinates) -> list:
     sectors = []
@@ -16,34 +38,185 @@ def get_sector_grid(coordinates) -> list:
     return sectors
 
 
+class FeatureReader:
+    # incremental reader of features array of GeoJSON FeatureCollection:
+    # file is read in chunks and features are decoded one by one,
+    # so only the feature being decoded is kept in memory instead of the whole collection
+    decoder = json.JSONDecoder()
+
+    def __init__(self, datafile, read_size: int = READ_SIZE):
+        self.datafile = datafile
+        self.read_size = read_size
+        self.buffer = ''
+        self.position = 0
+
+    def fill(self) -> bool:
+        # drop consumed part of buffer and read next chunk,
+        # chunks grow with buffer, so values larger than a chunk are decoded in linear time
+        chunk = self.datafile.read(max(self.read_size, len(self.buffer) - self.position))
+        self.buffer = self.buffer[self.position:] + chunk
+        self.position = 0
+        return bool(chunk)
+
+    def peek(self) -> str:
+        # skip whitespace and return next character without consuming it
+        while True:
+            while self.position < len(self.buffer) and self.buffer[self.position].isspace():
+                self.position += 1
+            if self.position < len(self.buffer):
+                return self.buffer[self.position]
+            if not self.fill():
+                raise ValueError('unexpected end of GeoJSON file')
+
+    def expect(self, characters: str) -> str:
+        character = self.peek()
+        if character not in characters:
+            raise ValueError('expected one of %r in GeoJSON file, got %r' % (characters, character))
+        self.position += 1
+        return character
+
+    def read_value(self):
+        self.peek()
+        while True:
+            try:
+                value, end = self.decoder.raw_decode(self.buffer, self.position)
+            except json.JSONDecodeError:
+                # value is not complete yet
+                if not self.fill():
+                    raise
+                continue
+            # number at the end of buffer may continue in the next chunk
+            if end == len(self.buffer) and self.fill():
+                continue
+            self.position = end
+            return value
+
+    def __iter__(self):
+        # walk keys of top level object, decoding all of them but features on the go
+        self.expect('{')
+        if self.peek() == '}':
+            return
+        while True:
+            key = self.read_value()
+            self.expect(':')
+            if key == 'features':
+                self.expect('[')
+                if self.peek() == ']':
+                    self.position += 1
+                else:
+                    while True:
+                        yield self.read_value()
+                        if self.expect(',]') == ']':
+                            break
+            else:
+                self.read_value()
+            if self.expect(',}') == '}':
+                return
+
+
+@profiler.timed
+def partition_sectors(world_map: list, max_vertices: int, max_depth: int = QUADTREE_MAX_DEPTH) -> dict:
+    # generate world manifest: split world box into quadrants until each of them holds at most max_vertices
+    # vertices of polygons clipped to it. Sectors are named by path of quadrants from the world box
+    # (0: lower lat and lng, 1: lower lat, 2: lower lng, 3: upper lat and lng) and listed depth first,
+    # so qc2c.core.get_quadtree_sector resolves them in logarithmic time with the same result as get_sector
+    shapes = []
+    for polygon in world_map:
+        poly_shape = Polygon([(y, x) for x, y in next(iter(polygon.values()))])
+        shapes.append(poly_shape if poly_shape.is_valid else poly_shape.buffer(0))
+    tree = STRtree(shapes)
+
+    world_sectors = {}
+    # quadrants waiting for split, children are pushed in reverse so they are taken in order
+    stack = [('', QUADTREE_BOUNDS)]
+    while stack:
+        quadrant_path, bounds = stack.pop()
+        lat_min, lng_min, lat_max, lng_max = bounds
+        clip_box = box(lat_min - SECTOR_MARGIN, lng_min - SECTOR_MARGIN, lat_max + SECTOR_MARGIN,
+                       lng_max + SECTOR_MARGIN)
+        candidates = tree.geometries.take(tree.query(clip_box, predicate='intersects'))
+        vertices = int(shapely.get_num_coordinates(shapely.intersection(candidates, clip_box)).sum())
+
+        if vertices <= max_vertices or len(quadrant_path) >= max_depth:
+            world_sectors['world_sector_q%s.json' % quadrant_path] = list(bounds)
+            continue
+        lat_mid = (lat_min + lat_max) / 2
+        lng_mid = (lng_min + lng_max) / 2
+        quadrants = [(lat_min, lng_min, lat_mid, lng_mid), (lat_min, lng_mid, lat_mid, lng_max),
+                     (lat_mid, lng_min, lat_max, lng_mid), (lat_mid, lng_mid, lat_max, lng_max)]
+        for quadrant in reversed(range(4)):
+            stack.append((quadrant_path + str(quadrant), quadrants[quadrant]))
+    return world_sectors
+
+
+@profiler.timed
+def save_world_sectors(world_sectors: dict, output_directory: str):
+    # one sector per line, as in the input manifest
+    lines = ['  %s: %s' % (json.dumps(key), json.dumps(bounds)) for key, bounds in world_sectors.items()]
+    with open(path.join(output_directory, 'world_sectors.json'), 'w') as file:
+        file.write('{\n%s\n}\n' % ',\n'.join(lines))
+
+
+def iter_features(input_file) -> Iterator[dict]:
+    with open(input_file, 'r', encoding='utf-8') as datafile:
+        if input_file.endswith(NEWLINE_DELIMITED_EXTENSIONS):
+            for line in datafile:
+                # GeoJSON text sequences (RFC 8142) prefix features with record separator
+                line = line.strip().lstrip('\x1e')
+                if line:
+                    yield json.loads(line)
+        else:
+            yield from FeatureReader(datafile)
+
+
+@profiler.timed
 def get_map(input_file) -> list:
     result = []
 
-    with open(input_file, 'r') as datafile:
-        data = json.load(datafile)
-        data = data["features"]
-        # Create a new list with objects containing only property1 and property2
-        data = [{"name": item["properties"]["ISO_A3"], "geometry": item["geometry"]} for item in data]
+    # features are simplified as they arrive, only simplified polygons are kept
+    for item in iter_features(input_file):
+        name = item["properties"]["ISO_A3"]
+        geometry = shape(item.pop('geometry'))
+        del item
+
+        vertices_in = int(shapely.get_num_coordinates(geometry))
+        count = len(result)
+        if isinstance(geometry, MultiPolygon):
+            # append multiple polygons
+            for polygon in list(geometry.geoms):
+                polygon = polygon.simplify(tolerance=TOLERANCE, preserve_topology=True)
+                result.append({name: list(polygon.exterior.coords)})
+        else:
+            # append single polygon
+            geometry = geometry.simplify(tolerance=TOLERANCE, preserve_topology=True)
+            result.append({name: list(geometry.exterior.coords)})
+        profiler.record('countries', name, vertices_in=vertices_in,
+                        vertices_simplified=sum(len(polygon[name]) for polygon in result[count:]))
+
+        # Reduce points in the Polygon
+    return result
 
-        for item in data:
-            geometry = shape(item['geometry'])
 
-            if isinstance(geometry, MultiPolygon):
-                # append multiple polygons
-                for polygon in list(geometry.geoms):
-                    polygon = polygon.simplify(tolerance=0.1, preserve_topology=True)
-                    result.append({item["name"]: list(polygon.exterior.coords)})
-            else:
-                # append single polygon
-                geometry = geometry.simplify(tolerance=0.1, preserve_topology=True)
-                result.append({item["name"]: list(geometry.exterior.coords)})
+def get_polygon_parts(geometry) -> list:
+    # polygons of clipping result, without lines and points left where polygon only touches the box
+    if isinstance(geometry, Polygon):
+        return [] if geometry.is_empty else [geometry]
+    if hasattr(geometry, 'geoms'):
+        return [part for item in geometry.geoms for part in get_polygon_parts(item)]
+    return []
 
-            # Reduce points in the Polygon
-    return result
 
-
-def map_polygons_to_sectors(polygons, sectors) -> dict:
+@profiler.timed
+def map_polygons_to_sectors(polygons, sectors, margin: float = SECTOR_MARGIN) -> dict:
     assigned_polygons = {sector['id']: [] for sector in sectors}
+    # polygons, vertices and json size of each sector, without and with clipping
+    report = {sector['id']: {'polygons': [0, 0], 'vertices': [0, 0], 'size': [0, 0]} for sector in sectors}
+
+    # keep only parts of polygons inside sector, extended with margin so lookups on sector edges stay correct
+    clip_boxes = {}
+    for sector in sectors:
+        min_x, min_y, max_x, max_y = shape(sector['geometry']).bounds
+        clip_boxes[sector['id']] = box(min_x - margin, min_y - margin, max_x + margin, max_y + margin)
 
     for polygon in polygons:
 
@@ -53,73 +226,127 @@ def map_polygons_to_sectors(polygons, sectors) -> dict:
         switched_list = [(y, x) for x, y in coordinates]
 
         poly_shape = Polygon(switched_list)
+        if not poly_shape.is_valid:
+            poly_shape = poly_shape.buffer(0)
 
         for sector in sectors:
             sector_shape = shape(sector['geometry'])
 
             if poly_shape.intersects(sector_shape):
-                # TODO keep only the part that does not go outside of sector!
-                # TODO Get the difference (remove parts of the main polygon that don't intersect)
+                clip_box = clip_boxes[sector['id']]
+                unclipped = [[y, x] for x, y in coordinates]
+                if clip_box.contains(poly_shape):
+                    parts = [unclipped]
+                else:
+                    parts = [[list(point) for point in part.exterior.coords]
+                             for part in get_polygon_parts(poly_shape.intersection(clip_box))]
+
+                for part in parts:
+                    assigned_polygons[sector['id']].append({name: part})
+
+                sector_report = report[sector['id']]
+                sector_report['polygons'][0] += 1
+                sector_report['polygons'][1] += len(parts)
+                sector_report['vertices'][0] += len(coordinates)
+                sector_report['vertices'][1] += sum(len(part) for part in parts)
+                sector_report['size'][0] += len(json.dumps(unclipped, separators=(',', ':')))
+                sector_report['size'][1] += sum(len(json.dumps(part, separators=(',', ':'))) for part in parts)
+
+    print_clipping_report(report)
+    for sector, sector_report in report.items():
+        profiler.record('sectors', sector, vertices_in=sector_report['vertices'][0],
+                        vertices_clipped=sector_report['vertices'][1])
+    return assigned_polygons
 
-                assigned_polygons[sector['id']].append({name: [[y, x] for x, y in coordinates]})
 
-    return assigned_polygons
+def print_clipping_report(report: dict):
+    for sector, sector_report in report.items():
+        polygons_before, polygons_after = sector_report['polygons']
+        vertices_before, vertices_after = sector_report['vertices']
+        size_before, size_after = sector_report['size']
+        print(f"map_polygons_to_sectors: {sector}: polygons {polygons_before} -> {polygons_after}, "
+              f"vertices {vertices_before} -> {vertices_after}, size {size_before} -> {size_after} bytes")
+
+
+def get_merge_candidates(polygons, ranks, index, others, rest_tree) -> list:
+    # 3. create merged polygon of polygon[index] with each of the others at once:
+    others = list(others)
+    if not others:
+        return []
+    with profiler.timer('union'):
+        merged = shapely.union(polygons[index], [polygons[other] for other in others])
+    # 3.1 reduce polygon
+    with profiler.timer('convex_hull'):
+        merged = shapely.convex_hull(merged)
+    # 3.2 Reduce points in the Polygon
+    with profiler.timer('simplify'):
+        merged = shapely.simplify(merged, tolerance=TOLERANCE, preserve_topology=True)
+
+    # 4. Check which merged polygons intersect any polygon in rest_polygons
+    with profiler.timer('intersects'):
+        blocked = set(rest_tree.query(merged, predicate='intersects')[0].tolist())
+
+    # 5. keep merges not touching the rest, keyed by positions of the pair in the list of polygons
+    candidates = []
+    for position, other in enumerate(others):
+        merged_polygon = merged[position]
+        if position not in blocked and merged_polygon.geom_type == 'Polygon':
+            first, second = sorted((index, other), key=ranks.__getitem__)
+            candidates.append(((ranks[first], ranks[second]), first, second, merged_polygon))
+    return candidates
 
 
 def merge_polygons(country_polygons, rest_polygons, label) -> list:
-    # Step 1: Create a list to store the merged polygons
+    # Step 1: Create a list to store the merged polygons, merged polygons are appended at the end
     merged_polygons = [Polygon(coordinates) for coordinates in country_polygons]
+    alive = set(range(len(merged_polygons)))
+    # position of polygon in the list of polygons left, merged polygon takes position of the first of the pair
+    ranks = list(range(len(merged_polygons)))
 
     start_time = time.time()
-    total_polygons = len(merged_polygons)
+
+    # 2. index polygons of other countries once, intersection tests only touch nearby ones
+    rest_tree = STRtree([Polygon(rest_polygon) for rest_polygon in rest_polygons])
+
+    # queue of possible merges, first pair in list order first - each merge gives the same result
+    # as scanning pairs from the start of the list, but pairs are evaluated once instead of after every merge
+    queue = []
+    for i in range(len(merged_polygons)):
+        for candidate in get_merge_candidates(merged_polygons, ranks, i, range(i + 1, len(merged_polygons)),
+                                              rest_tree):
+            heappush(queue, candidate)
 
     # Use tqdm to create a loading bar
-    for _ in tqdm(range(total_polygons), desc="merge_polygons: %s" % label, unit="polygon"):
-        # Flag to check if any merging occurred in this iteration
-        merged = False
-
-        # 2. Iterate through each pair of polygons in merged_polygons
-        for i in range(len(merged_polygons)):
-            for j in range(i + 1, len(merged_polygons)):
-                # 3. create merged polygon for each pair:
-                merged_polygon = unary_union([merged_polygons[i], merged_polygons[j]])
-                # 3.1 reduce polygon
-                merged_polygon = merged_polygon.convex_hull
-                # 3.2 Reduce points in the Polygon
-                merged_polygon = merged_polygon.simplify(tolerance=0.1, preserve_topology=True)
-                # TODO 3.3 replace with square in some cases? if number of points > 4?
-
-                # 4. Check if the current pair intersects with any polygon in rest_polygons
-                intersects_rest = any(
-                    merged_polygon.intersects(Polygon(rest_polygon)) for rest_polygon in rest_polygons)
-
-                # 5. If they don't intersect, merge them and update the merged_polygons list
-                if not intersects_rest:
-                    merged_polygons[i] = merged_polygon
-                    merged_polygons.pop(j)
-
-                    # Set the merged flag to True
-                    merged = True
-                    break
-
-            # 6. If merging occurred, break from the outer loop to start a new iteration
-            if merged:
-                break
-
-        # 7. If no merging occurred in this iteration, break from the while loop
-        if not merged:
-            break
+    progress = tqdm(total=max(len(merged_polygons) - 1, 0), desc="merge_polygons: %s" % label, unit="polygon")
+    while queue:
+        _, i, j, merged_polygon = heappop(queue)
+        # 6. skip merges of polygons already merged into other ones
+        if i not in alive or j not in alive:
+            continue
+
+        # 7. replace the pair with merged polygon and evaluate its merges with the remaining polygons only
+        alive.difference_update((i, j))
+        merged_polygons.append(merged_polygon)
+        ranks.append(ranks[i])
+        k = len(merged_polygons) - 1
+        for candidate in get_merge_candidates(merged_polygons, ranks, k, sorted(alive), rest_tree):
+            heappush(queue, candidate)
+        alive.add(k)
+        progress.update()
+    progress.close()
 
     # Calculate and print the elapsed time
     elapsed_time = time.time() - start_time
     print(f"\n{label}: total time: {elapsed_time:.2f} sec")
 
     # Step 8: Return the final list of merged polygons
-    return merged_polygons
+    return [merged_polygons[i] for i in sorted(alive, key=ranks.__getitem__)]
 
 
-def simplify_polygons(polygons: list) -> dict:
-    results = {}
+def get_country_tasks(polygons: list) -> list:
+    # split sector into independent (country_polygons, rest_polygons, name) merge tasks,
+    # in order of first appearance of each country
+    tasks = []
     already_processed = set()
     for i in range(len(polygons)):
         polygon = polygons[i]
@@ -135,18 +362,107 @@ def simplify_polygons(polygons: list) -> dict:
             rest_polygons.extend([next(iter(obj.values())) for obj in polygons if
                                   name in already_processed])
 
-            # merge country polygons if they do not intersect any other polygon from the rest of polygons
-            country_merged = merge_polygons(country_polygons, rest_polygons, name)
-            results[name] = [list(country.exterior.coords) for country in country_merged]
+            tasks.append((country_polygons, rest_polygons, name))
 
             # add this country to already_processed check
             already_processed.add(name)
+    return tasks
+
+
+def merge_country(task: tuple) -> list:
+    country_polygons, rest_polygons, name = task
+    # merge country polygons if they do not intersect any other polygon from the rest of polygons
+    country_merged = merge_polygons(country_polygons, rest_polygons, name)
+    return [list(country.exterior.coords) for country in country_merged]
+
+
+@profiler.timed
+def merge_sector_country(sector: str, task: tuple) -> list:
+    start_time = time.perf_counter()
+    result = merge_country(task)
+    elapsed_time = time.perf_counter() - start_time
+
+    country_polygons, _, name = task
+    vertices_in = sum(len(polygon) for polygon in country_polygons)
+    vertices_out = sum(len(polygon) for polygon in result)
+    profiler.record('countries', name, merge_seconds=elapsed_time, vertices_merged=vertices_out)
+    profiler.record('sectors', sector, merge_seconds=elapsed_time, vertices_before_merge=vertices_in,
+                    vertices_merged=vertices_out)
+    return result
+
+
+def merge_indexed_country(indexed_task: tuple) -> tuple:
+    # runs in worker process, its instrumentation is sent back with the result
+    index, task = indexed_task
+    return index, merge_sector_country(*task), profiler.collect()
+
+
+def get_polygon_bounds(coordinates: list) -> tuple:
+    xs = [x for x, _ in coordinates]
+    ys = [y for _, y in coordinates]
+    return min(xs), min(ys), max(xs), max(ys)
+
+
+def get_task_keys(polygons: list, tasks: list, bounds: list, script_hash: str) -> list:
+    # cache key of each country merge: its polygons, neighbors it can collide with, sector bounds and tolerance.
+    # Merged polygons never leave bounding box of the country polygons,
+    # so only neighbors touching this box can change the result and edits of the rest of sector keep the key.
+    hashes = [(name, get_polygon_bounds(coordinates), get_cache_key(coordinates))
+              for polygon in polygons for name, coordinates in polygon.items()]
+    keys = []
+    for country_polygons, _, name in tasks:
+        min_x, min_y, max_x, max_y = get_polygon_bounds([point for polygon in country_polygons for point in polygon])
+        neighbors = []
+        for other, (other_min_x, other_min_y, other_max_x, other_max_y), polygon_hash in hashes:
+            if other != name and other_min_x <= max_x and other_max_x >= min_x \
+                    and other_min_y <= max_y and other_max_y >= min_y:
+                neighbors.append(polygon_hash)
+        # order of neighbors does not change the result
+        keys.append(get_cache_key(script_hash, name, bounds, TOLERANCE, country_polygons, sorted(neighbors)))
+    return keys
+
+
+def simplify_sectors(sectors: dict, sectors_bounds: dict, jobs: int, use_cache: bool = True) -> dict:
+    # fan out countries of all sectors, tasks do not depend on each other
+    tasks = []
+    keys = []
+    script_hash = get_file_hash(path.abspath(__file__))
+    for sector, polygons in sectors.items():
+        sector_tasks = get_country_tasks(polygons)
+        tasks.extend((sector, task) for task in sector_tasks)
+        keys.extend(get_task_keys(polygons, sector_tasks, sectors_bounds[sector], script_hash))
+
+    # reuse merges of countries which did not change since the previous run
+    merged = [load_cached('stage_1', key) if use_cache else None for key in keys]
+    missing = [index for index in range(len(tasks)) if merged[index] is None]
+    print(f"simplify_sectors: {len(tasks) - len(missing)} cached, {len(missing)} to merge")
+
+    if jobs == 1:
+        for index in missing:
+            merged[index] = merge_sector_country(*tasks[index])
+            save_cached('stage_1', keys[index], merged[index])
+    else:
+        # schedule countries with the most polygons first, so long tasks do not finish last
+        schedule = sorted(missing, key=lambda index: len(tasks[index][1][0]), reverse=True)
+        # workers start with empty instrumentation, values of parent process are not sent back twice
+        with Pool(jobs, initializer=profiler.reset) as pool:
+            for index, result, collected in pool.imap_unordered(merge_indexed_country,
+                                                                [(index, tasks[index]) for index in schedule]):
+                merged[index] = result
+                profiler.merge(collected)
+                save_cached('stage_1', keys[index], result)
+
+    # collect results in the serial order, so output files are identical
+    results = {sector: {} for sector in sectors}
+    for (sector, task), result in zip(tasks, merged):
+        results[sector][task[2]] = result
     return results
 
 
-def save_sectors(assigned_polygons):
+@profiler.timed
+def save_sectors(assigned_polygons, output_directory):
     for output_file, data in assigned_polygons.items():
-        with open(path.join(source_directory, '../../data/output/stage_1', output_file), 'w') as _:
+        with open(path.join(output_directory, output_file), 'w') as _:
             json.dump(data, _, separators=(',', ':'))
 
 
@@ -155,25 +471,12 @@ def remove_country_from_map(map_list: list, country: str) -> list:
     return map_list
 
 
-# data source: https://datahub.io/core/geo-countries
-if __name__ == '__main__':
-    source_directory = path.dirname(path.abspath(__file__))
-
-    # Record the start time
-    run_start_time = time.time()
-
-    # copy world manifest to output
-    shutil.copy(path.join(source_directory, '../../data/input', 'world_sectors.json'),
-                path.join(source_directory, '../../data/output/stage_1', 'world_sectors.json'))
-
-    # Coordinates for sectors (min_x, min_y, max_x, max_y)
-    with open(path.join(source_directory, '../../data/input', 'world_sectors.json'), 'r') as file:
-        world_sector_coordinates = json.load(file)
-    world_sectors = get_sector_grid(world_sector_coordinates)
-
+def generate_sectors(input_directory: str, jobs: int, use_cache: bool = True,
+                     countries_file: str = 'countries.json', max_vertices: int = 0) -> tuple:
+    # returns world manifest and simplified sectors, kept in memory for the next stages
     # load geojson of all countries
-    world_map = get_map(path.join(source_directory, '../../data/input', 'countries.json'))
-    usa_map = get_map(path.join(source_directory, '../../data/input', 'us_states.json'))
+    world_map = get_map(path.join(input_directory, countries_file))
+    usa_map = get_map(path.join(input_directory, 'us_states.json'))
 
     # Remove the item to be replaced from the first list
     world_map = remove_country_from_map(world_map, "USA")
@@ -197,15 +500,53 @@ if __name__ == '__main__':
     # # SECTOR: 5
     # world_map.pop("ATF", None) # ??
 
+    # Coordinates for sectors (min_x, min_y, max_x, max_y): hand drawn or generated from vertex density
+    if max_vertices:
+        world_sector_coordinates = partition_sectors(world_map, max_vertices)
+    else:
+        with open(path.join(input_directory, 'world_sectors.json'), 'r') as file:
+            world_sector_coordinates = json.load(file)
+    world_sectors = get_sector_grid(world_sector_coordinates)
+
     # split world map into sectors
     world_sectors = map_polygons_to_sectors(world_map, world_sectors)
 
     # simplify sectors
-    for world_sector in world_sectors:
-        world_sectors[world_sector] = simplify_polygons(world_sectors[world_sector])
+    world_sectors = simplify_sectors(world_sectors, world_sector_coordinates, jobs or cpu_count(), use_cache)
+    return world_sector_coordinates, world_sectors
 
-    # save sectors to separate files
-    save_sectors(world_sectors)
+
+# data source: https://datahub.io/core/geo-countries
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Stage 1: generate simplified sector maps')
+    parser.add_argument('--jobs', type=int, default=1,
+                        help='number of worker processes merging countries, 0 for all cores (default: 1)')
+    parser.add_argument('--no-cache', action='store_true',
+                        help='merge all countries again, ignoring results cached in data/cache')
+    parser.add_argument('--countries', default='countries.json',
+                        help='countries GeoJSON in data/input, FeatureCollection or newline-delimited (.geojsonl) '
+                             '(default: countries.json)')
+    parser.add_argument('--max-vertices', type=int, default=0,
+                        help='generate quadtree sectors with at most this many vertices each, '
+                             'instead of reading data/input/world_sectors.json (default: 0, disabled)')
+    parser.add_argument('--report', help='write JSON report of step timers and per country / sector values to file')
+    parser.add_argument('--profile', help='write cProfile stats (or pyinstrument .html page) of the run to file')
+    args = parser.parse_args()
+
+    source_directory = path.dirname(path.abspath(__file__))
+
+    # Record the start time
+    run_start_time = time.time()
+
+    with profiler.profile(args.profile):
+        # generate simplified sectors
+        world_sector_coordinates, world_sectors = generate_sectors(path.join(source_directory, '../../data/input'),
+                                                                   args.jobs, not args.no_cache, args.countries,
+                                                                   args.max_vertices)
+
+        # save world manifest and sectors to separate files
+        save_world_sectors(world_sector_coordinates, path.join(source_directory, '../../data/output/stage_1'))
+        save_sectors(world_sectors, path.join(source_directory, '../../data/output/stage_1'))
 
     # Record the end time
     run_end_time = time.time()
@@ -213,3 +554,8 @@ if __name__ == '__main__':
     total_runtime = run_end_time - run_start_time
     # Print the total runtime
     print(f"Total runtime: {total_runtime} seconds")
+
+    # slowest steps, full instrumentation goes to report
+    profiler.print_timers()
+    if args.report:
+        profiler.save_report(profiler.get_report(stage=1, runtime=total_runtime, arguments=vars(args)), args.report)
@@ -1,41 +1,67 @@
 ﻿import json
-from shapely.geometry import MultiPolygon, Polygon
+from shapely.geometry import Polygon
+from shapely.strtree import STRtree
+import argparse
 import time
 import shutil
+import sys
 from os import path
-import copy
-from tqdm import tqdm
 
+sys.path.insert(0, path.join(path.dirname(path.abspath(__file__)), '..'))
+from build_cache import get_cache_key, get_file_hash, load_cached, save_cached  # noqa: E402
+import profiler  # noqa: E402
 
-def reduce_points(multi_polygon):
-    reduced_polygons = []
+# maximum number of simplification passes per sector
+MAX_PASSES = 100
 
-    for polygon in multi_polygon.geoms:
-        reduced_polygon = reduce_polygon_points(polygon, multi_polygon.difference(polygon))
-        reduced_polygons.append(reduced_polygon)
 
-    return MultiPolygon(reduced_polygons)
+def get_orientation(ring: list) -> int:
+    # sign of ring area: positive for counter-clockwise, negative for clockwise rings
+    area = sum(ring[i - 1][0] * ring[i][1] - ring[i][0] * ring[i - 1][1] for i in range(len(ring)))
+    return (area > 0) - (area < 0)
 
 
-def reduce_polygon_points(polygon_list: list, other_polygons_list: list) -> list:
+@profiler.timed
+def reduce_polygon_points(polygon_list: list, neighbors_tree: STRtree) -> tuple:
     # iterate through the points of the polygon and remove them one by one,
-    # checking if the resulting polygon still intersects with other_polygons
-    reduced_polygon_list = copy.deepcopy(polygon_list)
+    # checking if the resulting polygon still does not intersect with other polygons and covers the original one.
+    # Removing a point only adds or cuts the triangle made by the point and its neighbors,
+    # so only this triangle is tested against the neighbors index.
+    closed = len(polygon_list) > 1 and polygon_list[0] == polygon_list[-1]
+    reduced_polygon_list = polygon_list[:-1] if closed else list(polygon_list)
     original_polygon = Polygon(polygon_list)
 
+    # polygon with a point removed always covers the original one, so it touches the same polygons
+    if neighbors_tree.query(original_polygon, predicate='intersects').size:
+        return polygon_list, 0
+
+    orientation = get_orientation(reduced_polygon_list)
+    removed = 0
     i = 0
-    while i < len(reduced_polygon_list) and len(reduced_polygon_list) > 4:
-        test_polygon_list = copy.deepcopy(reduced_polygon_list)
-        test_polygon_list.pop(i)
-        test_polygon = Polygon(test_polygon_list)
-        # check if polygon with removed point does not intersect with any other polygon and still covers the same area
-        if not any(test_polygon.intersects(Polygon(other_polygon)) for other_polygon in
-                   other_polygons_list) and test_polygon.contains(original_polygon):
-            reduced_polygon_list = copy.deepcopy(test_polygon_list)
-            i = 0
-        else:
-            i += 1
-    return reduced_polygon_list
+    while i < len(reduced_polygon_list) and len(reduced_polygon_list) > 3:
+        a = reduced_polygon_list[i - 1]
+        b = reduced_polygon_list[i]
+        c = reduced_polygon_list[(i + 1) % len(reduced_polygon_list)]
+        cross = (b[0] - a[0]) * (c[1] - b[1]) - (b[1] - a[1]) * (c[0] - b[0])
+
+        # removing convex point cuts the triangle out, so polygon would not cover the original any more
+        if cross * orientation <= 0:
+            triangle_free = cross == 0 or not neighbors_tree.query(Polygon([a, b, c]),
+                                                                   predicate='intersects').size
+            if triangle_free:
+                test_polygon_list = reduced_polygon_list[:i] + reduced_polygon_list[i + 1:]
+                # new edge must not cross the rest of polygon
+                if Polygon(test_polygon_list).contains(original_polygon):
+                    reduced_polygon_list = test_polygon_list
+                    removed += 1
+                    # neighbors of removed point may become removable now
+                    i = max(i - 1, 0)
+                    continue
+        i += 1
+
+    if closed:
+        reduced_polygon_list.append(reduced_polygon_list[0])
+    return reduced_polygon_list, removed
 
 
 def copy_and_remove(source_folder, destination_folder):
@@ -46,46 +72,98 @@ def copy_and_remove(source_folder, destination_folder):
     shutil.copytree(source_folder, destination_folder)
 
 
-def simplify_sector(sector: str):
+@profiler.timed
+def simplify_sector(sector_data: dict, geometries: dict) -> int:
+    # iterate through sector and simplify it, geometries of polygons are kept in sync with sector_data
+    removed = 0
+    for country in sector_data:
+        # index rest of polygons
+        rest_polygons = [polygon for key, polygons in geometries.items() if key != country for polygon in polygons]
+        with profiler.timer('strtree'):
+            neighbors_tree = STRtree(rest_polygons)
+
+        # simplify country polygon
+        for index, polygon in enumerate(sector_data[country]):
+            reduced_polygon, polygon_removed = reduce_polygon_points(polygon, neighbors_tree)
+            if polygon_removed:
+                sector_data[country][index] = reduced_polygon
+                geometries[country][index] = Polygon(reduced_polygon)
+                removed += polygon_removed
+    return removed
+
+
+def get_vertices(sector_data: dict) -> int:
+    return sum(len(polygon) for polygons in sector_data.values() for polygon in polygons)
+
+
+def simplify_sector_data(sector: str, sector_data: dict, max_passes: int, use_cache: bool = True) -> dict:
+    start_time = time.perf_counter()
+    vertices_in = get_vertices(sector_data)
+    # every country of sector is a neighbor of all others, so the whole sector is a single cache entry
+    key = get_cache_key(get_file_hash(path.abspath(__file__)), max_passes, sector_data)
+    cached = load_cached('stage_2', key) if use_cache else None
+    if cached is not None:
+        print(f"simplify_sector: {sector}: cached")
+        profiler.record('sectors', sector, seconds=time.perf_counter() - start_time, cached=1,
+                        vertices_in=vertices_in, vertices_out=get_vertices(cached))
+        return cached
+
+    geometries = {country: [Polygon(polygon) for polygon in polygons] for country, polygons in sector_data.items()}
+
+    # simplify sector until no more points can be removed
+    for iteration in range(1, max_passes + 1):
+        removed = simplify_sector(sector_data, geometries)
+        print(f"simplify_sector: {sector}: pass {iteration}: removed {removed} points")
+        if not removed:
+            break
+    save_cached('stage_2', key, sector_data)
+    profiler.record('sectors', sector, seconds=time.perf_counter() - start_time, passes=iteration,
+                    vertices_in=vertices_in, vertices_out=get_vertices(sector_data))
+    return sector_data
+
+
+def simplify_sector_file(sector: str, max_passes: int, use_cache: bool = True):
     # get sector data
-    with open(path.join(source_directory, '../../data/output/stage_2', sector), 'r') as file:
+    with open(path.join(source_directory, '../../data/output/stage_2', sector), 'r') as file, \
+            profiler.timer('json_load'):
         sector_data = json.load(file)
 
-    # iterate through sector and simplify it
-    for country in sector_data:
-        results = []
-        # get rest of polygons
-        rest_polygons = [value for key, value in sector_data.items() if key != country]
-        rest_polygons = [item for sublist in rest_polygons for item in sublist]
-        # simplify country polygon
-        for polygon in sector_data[country]:
-            results.append(reduce_polygon_points(polygon, rest_polygons))
-        sector_data[country] = results
+    sector_data = simplify_sector_data(sector, sector_data, max_passes, use_cache)
 
     # save sector data
-    with open(path.join(source_directory, '../../data/output/stage_2', sector), 'w') as _:
+    with open(path.join(source_directory, '../../data/output/stage_2', sector), 'w') as _, \
+            profiler.timer('json_dump'):
         json.dump(sector_data, _, separators=(',', ':'))
 
 
 # data source: https://datahub.io/core/geo-countries
 if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Stage 2: remove unnecessary polygon points')
+    parser.add_argument('--max-passes', type=int, default=MAX_PASSES,
+                        help='maximum number of simplification passes per sector (default: %(default)s)')
+    parser.add_argument('--no-cache', action='store_true',
+                        help='simplify all sectors again, ignoring results cached in data/cache')
+    parser.add_argument('--report', help='write JSON report of step timers and per sector values to file')
+    parser.add_argument('--profile', help='write cProfile stats (or pyinstrument .html page) of the run to file')
+    args = parser.parse_args()
+
     source_directory = path.dirname(path.abspath(__file__))
 
     # Record the start time
     run_start_time = time.time()
 
-    # copy data from previous stage
-    copy_and_remove(path.join(source_directory, '../../data/output/stage_1'),
-                    path.join(source_directory, '../../data/output/stage_2'))
+    with profiler.profile(args.profile):
+        # copy data from previous stage
+        copy_and_remove(path.join(source_directory, '../../data/output/stage_1'),
+                        path.join(source_directory, '../../data/output/stage_2'))
 
-    # get world manifest
-    with open(path.join(source_directory, '../../data/output/stage_2', 'world_sectors.json'), 'r') as file:
-        world_sectors = json.load(file)
+        # get world manifest
+        with open(path.join(source_directory, '../../data/output/stage_2', 'world_sectors.json'), 'r') as file:
+            world_sectors = json.load(file)
 
-    # simplify sectors N times to get even better approximations
-    for world_sector in world_sectors:
-        for _ in tqdm(range(20), desc="simplify_sector: %s" % world_sector, unit="loop"):
-            simplify_sector(world_sector)
+        # simplify sectors to a fixed point to get even better approximations
+        for world_sector in world_sectors:
+            simplify_sector_file(world_sector, args.max_passes, not args.no_cache)
 
     # Record the end time
     run_end_time = time.time()
@@ -93,3 +171,8 @@ if __name__ == '__main__':
     total_runtime = run_end_time - run_start_time
     # Print the total runtime
     print(f"Total runtime: {total_runtime} seconds")
+
+    # slowest steps, full instrumentation goes to report
+    profiler.print_timers()
+    if args.report:
+        profiler.save_report(profiler.get_report(stage=2, runtime=total_runtime, arguments=vars(args)), args.report)
@@ -1,10 +1,34 @@
-﻿import json
-import json_minify
+﻿import argparse
+import json
 import gzip
 import time
 import shutil
+import sys
 from os import path, listdir, remove
 
+import numpy as np
+import shapely
+from shapely.geometry import Polygon
+from shapely.strtree import STRtree
+
+sys.path.insert(0, path.join(path.dirname(path.abspath(__file__)), '..'))
+import profiler  # noqa: E402
+
+# qc2c is not installed with the workflow, use sources from the repository, so files are written
+# by the same serializers that read them
+sys.path.insert(0, path.join(path.dirname(path.abspath(__file__)), '../../../packages/python'))
+from qc2c.binary import dump_sector  # noqa: E402
+from qc2c.grid import dumps_grid  # noqa: E402
+from qc2c.quantized import dumps_sector as dumps_quantized_sector  # noqa: E402
+
+# size of precomputed grid cells in degrees
+GRID_CELL_SIZE = 0.5
+# cells are tested grown by this margin, so float rounding of ray casting never disagrees with them
+GRID_MARGIN = 1e-9
+# size of integer unit of quantized sectors in degrees, far below simplification tolerance;
+# cells are also grown by resolution, so moving points to integer units never disagrees with them
+QUANTIZATION_RESOLUTION = 1e-4
+
 
 def copy_and_remove(source_folder, destination_folder):
     # Remove previous files in destination_folder
@@ -14,24 +38,112 @@ def copy_and_remove(source_folder, destination_folder):
     shutil.copytree(source_folder, destination_folder)
 
 
-def simplify_sector(sector: str):
+def simplify_sector(sector: str, bounds: list, resolution: float = QUANTIZATION_RESOLUTION):
     sector_path = path.join(source_directory, '../../data/output/stage_3')
     # get sector data
-    with open(path.join(sector_path, sector), 'r') as file:
+    with open(path.join(sector_path, sector), 'r') as file, profiler.timer('json_load'):
         sector_data = json.load(file)
 
-    # Dump the data to a JSON file with ASCII encoding
-    with open(path.join(sector_path, sector), 'w') as _:
-        json.dump(sector_data, _, ensure_ascii=True, separators=(',', ':'))
+    export_sector(sector, sector_data, sector_path, bounds, resolution)
 
+
+def export_sector(sector: str, sector_data: dict, output_directory: str, bounds: list,
+                  resolution: float = QUANTIZATION_RESOLUTION):
+    start_time = time.perf_counter()
     # reduce file size:
-    # Dump the data to a JSON file with minimal whitespace using json_minify
-    minified_json = json_minify.json_minify(json.dumps(sector_data))
+    # Dump the data to JSON with minimal whitespace and ASCII encoding
+    with profiler.timer('json_dump'):
+        minified_json = json.dumps(sector_data, ensure_ascii=True, separators=(',', ':'))
 
     # Compress the minified JSON using gzip
-    with gzip.open(path.join(sector_path, "%s.gz" % sector), "wb") as gzipped_file:
+    with profiler.timer('gzip'), gzip.open(path.join(output_directory, "%s.gz" % sector), "wb") as gzipped_file:
         gzipped_file.write(minified_json.encode('utf-8'))
 
+    # Store flat coordinates arrays for memory mapped loading
+    pack_sector(sector_data, path.join(output_directory, sector.replace('.json', '.bin')))
+
+    # Store integer coordinates, smaller and faster to decode than JSON
+    pack_quantized_sector(sector_data, path.join(output_directory, sector.replace('.json', '.qsec')), resolution)
+
+    # Store labels of grid cells, so most lookups need no point in polygon test
+    pack_grid(sector_data, bounds, path.join(output_directory, sector.replace('.json', '.grid')),
+              margin=GRID_MARGIN + resolution)
+
+    profiler.record('sectors', sector, seconds=time.perf_counter() - start_time,
+                    vertices=sum(len(polygon) for polygons in sector_data.values() for polygon in polygons),
+                    json_bytes=len(minified_json),
+                    gzip_bytes=path.getsize(path.join(output_directory, "%s.gz" % sector)),
+                    quantized_bytes=path.getsize(path.join(output_directory, sector.replace('.json', '.qsec'))))
+
+
+@profiler.timed
+def pack_sector(sector_data: dict, output_file: str, typecode: str = 'd'):
+    # write flat binary sector, readable with memory mapping by qc2c.binary.load_sector
+    dump_sector(sector_data, output_file, typecode)
+
+
+@profiler.timed
+def pack_quantized_sector(sector_data: dict, output_file: str, resolution: float = QUANTIZATION_RESOLUTION):
+    # write gzip compressed quantized sector, readable by qc2c.quantized.load_sector
+    with open(output_file, 'wb') as quantized_file:
+        quantized_file.write(dumps_quantized_sector(sector_data, resolution))
+
+
+@profiler.timed
+def rasterize_sector(sector_data: dict, bounds: list, cell_size: float = GRID_CELL_SIZE,
+                     margin: float = GRID_MARGIN) -> tuple:
+    # label cells of sector grid: 0 for cells not touching any polygon, index of country + 1 for cells
+    # lying strictly inside one polygon and not touching any other country, -1 for the rest (boundary cells)
+    lat_min, lng_min, lat_max, lng_max = bounds
+    rows = max(int(np.ceil((lat_max - lat_min) / cell_size)), 1)
+    cols = max(int(np.ceil((lng_max - lng_min) / cell_size)), 1)
+    labels = np.zeros(rows * cols, dtype=np.int64)
+
+    polygons = []
+    owners = []
+    for index, country_polygons in enumerate(sector_data.values()):
+        for polygon in country_polygons:
+            polygon = Polygon(polygon)
+            polygons.append(polygon if polygon.is_valid else polygon.buffer(0))
+            owners.append(index)
+    if not polygons:
+        return labels, rows, cols
+    owners = np.asarray(owners)
+
+    row, col = np.divmod(np.arange(rows * cols), cols)
+    cells = shapely.box(lat_min + row * cell_size - margin, lng_min + col * cell_size - margin,
+                        lat_min + (row + 1) * cell_size + margin, lng_min + (col + 1) * cell_size + margin)
+
+    # pairs of cells and polygons touching them
+    cell_index, polygon_index = STRtree(polygons).query(cells, predicate='intersects')
+    inside = shapely.contains_properly(np.asarray(polygons, dtype=object)[polygon_index], cells[cell_index])
+
+    touched = np.zeros(rows * cols, dtype=bool)
+    touched[cell_index] = True
+    # cells touched by polygons of more than one country, or not lying inside any of them
+    first_owner = np.full(rows * cols, -1)
+    first_owner[cell_index] = owners[polygon_index]
+    mixed = np.zeros(rows * cols, dtype=bool)
+    mixed[cell_index[owners[polygon_index] != first_owner[cell_index]]] = True
+    contained = np.zeros(rows * cols, dtype=bool)
+    contained[cell_index[inside]] = True
+
+    labels[touched] = -1
+    interior = touched & contained & ~mixed
+    labels[interior] = first_owner[interior] + 1
+    return labels, rows, cols
+
+
+@profiler.timed
+def pack_grid(sector_data: dict, bounds: list, output_file: str, cell_size: float = GRID_CELL_SIZE,
+              margin: float = GRID_MARGIN):
+    # write grid of cells labels, readable with memory mapping by qc2c.grid.load_grid
+    labels, rows, cols = rasterize_sector(sector_data, bounds, cell_size, margin)
+    # boundary cells are labeled -1 by rasterize_sector and None by dumps_grid
+    labels = [None if label < 0 else label for label in labels.tolist()]
+    with open(output_file, 'wb') as binary_file:
+        binary_file.write(dumps_grid(labels, list(sector_data), (bounds[0], bounds[1]), cell_size, cols))
+
 
 def adjust_world_sectors_manifest():
     source_directory = path.dirname(path.abspath(__file__))
@@ -40,47 +152,54 @@ def adjust_world_sectors_manifest():
     with open(path.join(source_directory, '../../data/output/stage_3/world_sectors.json'), "r") as json_file:
         data = json.load(json_file)
 
-    # Modify keys by adding ".gz"
-    modified_data = {key + ".gz": value for key, value in data.items()}
-
-    # Dump the modified data to a JSON file with minimal whitespace using json_minify
-    minified_json = json_minify.json_minify(json.dumps(modified_data))
-
     # Save the modified and minified data to a new file
     with open(path.join(source_directory, '../../data/output/stage_3/world_sectors.json'), "w") as output_file:
-        output_file.write(minified_json)
+        json.dump(get_sectors_manifest(data), output_file, separators=(',', ':'))
+
+
+def get_sectors_manifest(world_sectors: dict) -> dict:
+    # Modify keys by adding ".gz"
+    return {key + ".gz": value for key, value in world_sectors.items()}
 
 
 # data source: https://datahub.io/core/geo-countries
 if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Stage 3: compress sectors and precompute grid cells')
+    parser.add_argument('--resolution', type=float, default=QUANTIZATION_RESOLUTION,
+                        help='size of integer unit of quantized sectors in degrees (default: %(default)s)')
+    parser.add_argument('--report', help='write JSON report of step timers and per sector values to file')
+    parser.add_argument('--profile', help='write cProfile stats (or pyinstrument .html page) of the run to file')
+    args = parser.parse_args()
+
     source_directory = path.dirname(path.abspath(__file__))
 
     # Record the start time
     run_start_time = time.time()
 
-    # copy data from previous stage
-    copy_and_remove(path.join(source_directory, '../../data/output/stage_2'),
-                    path.join(source_directory, '../../data/output/stage_3'))
+    with profiler.profile(args.profile):
+        # copy data from previous stage
+        copy_and_remove(path.join(source_directory, '../../data/output/stage_2'),
+                        path.join(source_directory, '../../data/output/stage_3'))
 
-    # get world manifest
-    with open(path.join(source_directory, '../../data/output/stage_3', 'world_sectors.json'), 'r') as file:
-        world_sectors = json.load(file)
+        # get world manifest
+        with open(path.join(source_directory, '../../data/output/stage_3', 'world_sectors.json'), 'r') as file:
+            world_sectors = json.load(file)
 
-    # simplify sectors N times to get even better approximations
-    for world_sector in world_sectors:
-        simplify_sector(world_sector)
+        # simplify sectors N times to get even better approximations
+        for world_sector in world_sectors:
+            simplify_sector(world_sector, world_sectors[world_sector], args.resolution)
 
-    # adjust file names in world_sectors.json
-    adjust_world_sectors_manifest()
+        # adjust file names in world_sectors.json
+        adjust_world_sectors_manifest()
 
-    # List all files in the folder
-    files = listdir(path.join(source_directory, '../../data/output/stage_3'))
+        # List all files in the folder
+        files = listdir(path.join(source_directory, '../../data/output/stage_3'))
 
-    # Iterate over the files and remove the JSON files
-    for _ in files:
-        if _.endswith(".json") and not _.endswith("sectors.json"):
-            file_path = path.join(source_directory, '../../data/output/stage_3', _)
-            remove(file_path)
+        # Iterate over the files and remove the JSON files
+        for _ in files:
+            if _.endswith(".json") and not _.endswith("sectors.json"):
+                file_path = path.join(source_directory, '../../data/output/stage_3', _)
+                remove(file_path)
 
     # Record the end time
     run_end_time = time.time()
@@ -88,3 +207,8 @@ if __name__ == '__main__':
     total_runtime = run_end_time - run_start_time
     # Print the total runtime
     print(f"Total runtime: {total_runtime} seconds")
+
+    # slowest steps, full instrumentation goes to report
+    profiler.print_timers()
+    if args.report:
+        profiler.save_report(profiler.get_report(stage=3, runtime=total_runtime, arguments=vars(args)), args.report)
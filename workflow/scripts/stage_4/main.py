@@ -1,12 +1,16 @@
-﻿import json
-import json_minify
+﻿import argparse
+import json
 import gzip
 import time
 import shutil
+import sys
 from os import path, remove
 
 from shapely import MultiPolygon, Polygon
 
+sys.path.insert(0, path.join(path.dirname(path.abspath(__file__)), '..'))
+import profiler  # noqa: E402
+
 
 def copy_and_remove(source_folder, destination_folder):
     # Remove previous files in destination_folder
@@ -20,48 +24,69 @@ def simplify_sector(sector: str) -> dict:
     sector_path = path.join(source_directory, '../../data/output/stage_4')
     # get sector data
     # Compress the minified JSON using gzip
-    with gzip.open(path.join(sector_path, sector), 'rt', encoding='utf-8') as gzipped_file:
+    with gzip.open(path.join(sector_path, sector), 'rt', encoding='utf-8') as gzipped_file, \
+            profiler.timer('json_load'):
         sector_data = json.load(gzipped_file)
 
-    # Iterate through the dictionary and update the values with the center coordinates
+    start_time = time.perf_counter()
+    centers = get_centers(sector_data)
+    profiler.record('sectors', sector, seconds=time.perf_counter() - start_time, countries=len(centers))
+    return centers
+
+
+@profiler.timed
+def get_centers(sector_data: dict) -> dict:
+    # Iterate through the dictionary and get the center coordinates of each country
+    centers = {}
     for key, data in sector_data.items():
         multipolygon = MultiPolygon([Polygon(coordinates) for coordinates in data])
         center = multipolygon.centroid
-        sector_data[key] = (center.x, center.y)
+        centers[key] = (center.x, center.y)
+    return centers
 
-    return sector_data
+
+@profiler.timed
+def save_world_sectors(world_sectors: dict, output_file: str):
+    # Compress the JSON data and write it to a Gzip file
+    with gzip.open(output_file, "w") as gzip_file:
+        # Dump the modified data to a JSON file with minimal whitespace
+        minified_json = json.dumps(world_sectors, separators=(',', ':'))
+        gzip_file.write(minified_json.encode('utf-8'))
 
 
 # data source: https://datahub.io/core/geo-countries
 if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Stage 4: add country centers to world manifest')
+    parser.add_argument('--report', help='write JSON report of step timers and per sector values to file')
+    parser.add_argument('--profile', help='write cProfile stats (or pyinstrument .html page) of the run to file')
+    args = parser.parse_args()
+
     source_directory = path.dirname(path.abspath(__file__))
 
     # Record the start time
     run_start_time = time.time()
 
-    # copy data from previous stage
-    copy_and_remove(path.join(source_directory, '../../data/output/stage_3'),
-                    path.join(source_directory, '../../data/output/stage_4'))
+    with profiler.profile(args.profile):
+        # copy data from previous stage
+        copy_and_remove(path.join(source_directory, '../../data/output/stage_3'),
+                        path.join(source_directory, '../../data/output/stage_4'))
 
-    # get world manifest
-    with open(path.join(source_directory, '../../data/output/stage_4', 'world_sectors.json'), 'r') as file:
-        world_sectors = json.load(file)
+        # get world manifest
+        with open(path.join(source_directory, '../../data/output/stage_4', 'world_sectors.json'), 'r') as file:
+            world_sectors = json.load(file)
 
-    # simplify sectors
-    for world_sector in world_sectors:
-        world_sectors[world_sector] = {
-            'bounds': world_sectors[world_sector],
-            'center': simplify_sector(world_sector)
-        }
+        # simplify sectors
+        for world_sector in world_sectors:
+            world_sectors[world_sector] = {
+                'bounds': world_sectors[world_sector],
+                'center': simplify_sector(world_sector)
+            }
 
-    # Compress the JSON data and write it to a Gzip file
-    with gzip.open(path.join(source_directory, '../../data/output/stage_4/world_sectors.json.gz'), "w") as gzip_file:
-        # Dump the modified data to a JSON file with minimal whitespace using json_minify
-        minified_json = json_minify.json_minify(json.dumps(world_sectors))
-        gzip_file.write(minified_json.encode('utf-8'))
+        save_world_sectors(world_sectors,
+                           path.join(source_directory, '../../data/output/stage_4/world_sectors.json.gz'))
 
-    # delete json manifest
-    remove(path.join(source_directory, '../../data/output/stage_4/world_sectors.json'))
+        # delete json manifest
+        remove(path.join(source_directory, '../../data/output/stage_4/world_sectors.json'))
 
     # Record the end time
     run_end_time = time.time()
@@ -69,3 +94,8 @@ if __name__ == '__main__':
     total_runtime = run_end_time - run_start_time
     # Print the total runtime
     print(f"Total runtime: {total_runtime} seconds")
+
+    # slowest steps, full instrumentation goes to report
+    profiler.print_timers()
+    if args.report:
+        profiler.save_report(profiler.get_report(stage=4, runtime=total_runtime, arguments=vars(args)), args.report)
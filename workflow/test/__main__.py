@@ -1 +1,69 @@
-# here goes testing script
+import argparse
+import json
+import sys
+from os import path
+
+from .benchmark import DATA_DIRECTORY, get_regressions, get_report, load_borders, load_output, sample_grid, \
+    sample_random
+
+# accuracy and speed benchmark of generated sectors against input borders,
+# run from repository root with: python -m workflow.test
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(prog='python -m workflow.test',
+                                     description='Compare generated sectors with input borders, '
+                                                 'fail on accuracy or speed regression')
+    parser.add_argument('--inputs', nargs='+', default=['countries.json', 'us_states.json'],
+                        help='input GeoJSON files in data/input (default: countries.json us_states.json)')
+    parser.add_argument('--output', default=path.join(DATA_DIRECTORY, 'output/stage_4'),
+                        help='directory with generated sectors (default: data/output/stage_4)')
+    parser.add_argument('--grid-step', type=float, default=0,
+                        help='sample points of a regular net with this step in degrees, instead of random points')
+    parser.add_argument('--points-per-country', type=int, default=200,
+                        help='number of random points drawn in every country (default: 200)')
+    parser.add_argument('--seed', type=int, default=0, help='seed of random points (default: 0)')
+    parser.add_argument('--repeat', type=int, default=5,
+                        help='runs of each lookup path, the median one is reported (default: 5)')
+    parser.add_argument('--baseline', default=path.join(path.dirname(path.abspath(__file__)), 'baseline.json'),
+                        help='report to compare with, created by the first run (default: test/baseline.json)')
+    parser.add_argument('--update-baseline', action='store_true', help='replace baseline with this run')
+    parser.add_argument('--report', help='write JSON report to this file')
+    parser.add_argument('--max-slowdown', type=float, default=0.25,
+                        help='allowed throughput loss of any lookup path, as fraction, '
+                             'grown by spread of repeated runs, by at most half of it (default: 0.25)')
+    parser.add_argument('--max-accuracy-loss', type=float, default=0.002,
+                        help='allowed growth of overall mismatch rate (default: 0.002)')
+    parser.add_argument('--max-country-loss', type=float, default=0.05,
+                        help='allowed growth of mismatch rate of a single country (default: 0.05)')
+    args = parser.parse_args()
+
+    borders = load_borders([path.join(DATA_DIRECTORY, 'input', input_file) for input_file in args.inputs])
+    if args.grid_step:
+        points = sample_grid(borders, args.grid_step)
+    else:
+        points = sample_random(borders, args.points_per_country, args.seed)
+    print(f"{len(points)} points in {len(borders)} countries")
+
+    report = get_report(*load_output(args.output), points, args.repeat)
+    if args.report:
+        with open(args.report, 'w') as file:
+            json.dump(report, file, indent=2)
+
+    # the worst countries
+    worst = sorted(report['countries'].items(), key=lambda item: item[1]['mismatch_rate'], reverse=True)[:10]
+    for name, entry in worst:
+        if entry['mismatch_rate']:
+            print(f"{name}: mismatch rate {entry['mismatch_rate']:.2%} of {entry['points']} points")
+
+    if args.update_baseline or not path.exists(args.baseline):
+        with open(args.baseline, 'w') as file:
+            json.dump(report, file, indent=2)
+        print(f"baseline saved to {args.baseline}")
+        sys.exit(0)
+
+    with open(args.baseline, 'r') as file:
+        baseline = json.load(file)
+    regressions = get_regressions(report, baseline, args.max_slowdown, args.max_accuracy_loss,
+                                  args.max_country_loss)
+    for regression in regressions:
+        print(f"REGRESSION {regression}")
+    sys.exit(1 if regressions else 0)
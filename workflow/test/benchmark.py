@@ -0,0 +1,282 @@
+import gzip
+import json
+import random
+import sys
+import time
+from os import path
+from statistics import median
+
+from shapely.geometry import Point, shape
+from shapely.prepared import prep
+
+from ..scripts.stage_1.main import iter_features
+
+# qc2c is not installed with the workflow, use sources from the repository
+sys.path.insert(0, path.join(path.dirname(path.abspath(__file__)), '../../packages/python'))
+from qc2c.binary import load_sector as load_binary_sector  # noqa: E402
+from qc2c.core import get_country, get_sector  # noqa: E402
+from qc2c.geocoder import Geocoder  # noqa: E402
+from qc2c.grid import load_grid  # noqa: E402
+from qc2c.locator import SectorLocator  # noqa: E402
+from qc2c.quantized import CompiledQuantizedSector  # noqa: E402
+from qc2c.quantized import load_sector as load_quantized_sector  # noqa: E402
+from qc2c.sector import CompiledSector  # noqa: E402
+
+try:
+    from qc2c.bulk import lookup_many  # noqa: E402
+    import numpy as np  # noqa: E402
+except ImportError:  # bulk path is measured only with numpy
+    np = None
+
+DATA_DIRECTORY = path.join(path.dirname(path.abspath(__file__)), '../data')
+# stage 1 replaces USA with its states and drops AK, so they are not part of the output
+EXCLUDED_COUNTRIES = {'USA', 'AK'}
+# attempts to draw a point inside country, per requested point
+MAX_ATTEMPTS = 100
+# points per lookup_many call when measuring latency of the bulk path
+BULK_BATCH_SIZE = 1000
+# spread of runs widens the allowed slowdown by at most this fraction of it
+MAX_NOISE = 0.5
+
+
+def load_borders(input_files: list) -> dict:
+    # original (not simplified) borders of every country from input GeoJSON files
+    borders = {}
+    for input_file in input_files:
+        for feature in iter_features(input_file):
+            name = feature['properties']['ISO_A3']
+            if name in EXCLUDED_COUNTRIES:
+                continue
+            # kept in GeoJSON order [lng, lat], sampled points are swapped to [lat, lng]
+            geometry = shape(feature['geometry'])
+            borders.setdefault(name, []).append(geometry)
+    return borders
+
+
+def sample_random(borders: dict, points_per_country: int, seed: int) -> list:
+    # random land points, drawn separately for every country, so editing one country does not move the others
+    points = []
+    for name in sorted(borders):
+        generator = random.Random('%s:%s' % (seed, name))
+        for geometry in borders[name]:
+            prepared = prep(geometry)
+            min_lng, min_lat, max_lng, max_lat = geometry.bounds
+            count = max(1, points_per_country // len(borders[name]))
+            drawn = 0
+            for _ in range(count * MAX_ATTEMPTS):
+                lat, lng = generator.uniform(min_lat, max_lat), generator.uniform(min_lng, max_lng)
+                if prepared.contains(Point(lng, lat)):
+                    points.append((lat, lng, name))
+                    drawn += 1
+                    if drawn == count:
+                        break
+    return points
+
+
+def sample_grid(borders: dict, step: float) -> list:
+    # land points of a regular net with given step in degrees
+    points = []
+    for name in sorted(borders):
+        for geometry in borders[name]:
+            prepared = prep(geometry)
+            min_lng, min_lat, max_lng, max_lat = geometry.bounds
+            row = int(min_lat // step)
+            while row * step <= max_lat:
+                col = int(min_lng // step)
+                while col * step <= max_lng:
+                    if prepared.contains(Point(col * step, row * step)):
+                        points.append((row * step, col * step, name))
+                    col += 1
+                row += 1
+    return points
+
+
+def load_output(directory: str) -> tuple:
+    # world manifest, sectors and optional outputs of stage 4: grids, binary and quantized sectors,
+    # each one a dict by sector key, empty if any sector misses the file
+    with gzip.open(path.join(directory, 'world_sectors.json.gz'), 'rt', encoding='utf-8') as file:
+        world_sectors = json.load(file)
+    sectors = {}
+    for sector in world_sectors:
+        with gzip.open(path.join(directory, sector), 'rt', encoding='utf-8') as file:
+            sectors[sector] = json.load(file)
+
+    def load_all(extension, load):
+        files = {sector: path.join(directory, sector.split('.', 1)[0] + extension) for sector in world_sectors}
+        if not all(path.exists(file_path) for file_path in files.values()):
+            return {}
+        return {sector: load(file_path) for sector, file_path in files.items()}
+
+    grids = load_all('.grid', load_grid)
+    binary = load_all('.bin', lambda file_path: CompiledSector(load_binary_sector(file_path)))
+    quantized = load_all('.qsec', lambda file_path: CompiledQuantizedSector(load_quantized_sector(file_path)))
+    return world_sectors, sectors, grids, binary, quantized
+
+
+def get_lookups(world_sectors: dict, sectors: dict, grids: dict, binary: dict, quantized: dict) -> dict:
+    # lookup paths measured by benchmark, each taking latitude and longitude
+    locator = SectorLocator(world_sectors)
+    compiled = {key: CompiledSector(sector) for key, sector in sectors.items()}
+    # public entry point, reads sectors bundled with the package, which are copies of stage 4 output
+    geocoder = Geocoder(cache_size=None)
+
+    def core_sector(lat, lng):
+        return get_sector(world_sectors, {'lat': lat, 'lng': lng})
+
+    def core_country(lat, lng):
+        key = get_sector(world_sectors, {'lat': lat, 'lng': lng})
+        return None if key is None else get_country(sectors[key], {'lat': lat, 'lng': lng})
+
+    def compiled_country(lat, lng):
+        key = locator.get_sector(lat, lng)
+        return None if key is None else compiled[key].get_country(lat, lng)
+
+    def get_grid_country(compiled_sectors):
+        # same as Geocoder.lookup: cells labels first, polygons of the sector for boundary cells
+        def grid_country(lat, lng):
+            key = locator.get_sector(lat, lng)
+            if key is None:
+                return None
+            resolved, country = grids[key].lookup(lat, lng)
+            return country if resolved else compiled_sectors[key].get_country(lat, lng)
+        return grid_country
+
+    def get_sector_country(compiled_sectors):
+        def sector_country(lat, lng):
+            key = locator.get_sector(lat, lng)
+            return None if key is None else compiled_sectors[key].get_country(lat, lng)
+        return sector_country
+
+    lookups = {'get_sector': core_sector, 'get_country': core_country, 'compiled': compiled_country}
+    if grids:
+        lookups['grid'] = get_grid_country(compiled)
+    # memory-mapped .bin and quantized .qsec sectors, behind grids where generated
+    for name, compiled_sectors in (('binary', binary), ('quantized', quantized)):
+        if compiled_sectors:
+            lookups[name] = (get_grid_country if grids else get_sector_country)(compiled_sectors)
+    lookups['geocoder'] = geocoder.lookup
+    return lookups
+
+
+def get_percentile(values: list, percentile: float) -> float:
+    return values[min(int(len(values) * percentile / 100), len(values) - 1)]
+
+
+def get_latencies(latencies: list) -> dict:
+    latencies = sorted(latencies)
+    return {'p50': get_percentile(latencies, 50), 'p90': get_percentile(latencies, 90),
+            'p99': get_percentile(latencies, 99), 'max': latencies[-1]}
+
+
+def get_throughput(count: int, elapsed: list) -> dict:
+    # median throughput (points / second) of repeated runs, and relative spread of runs, a measure of noise
+    runs = [count / seconds for seconds in elapsed if seconds]
+    if not runs:
+        return {'throughput': 0.0, 'spread': 0.0}
+    throughput = median(runs)
+    return {'throughput': throughput, 'spread': (max(runs) - min(runs)) / throughput}
+
+
+def measure(lookup, points: list, repeat: int) -> tuple:
+    # results, throughput of repeated runs, and latencies of single calls in microseconds;
+    # the first run is not timed, it loads lazily read sectors and grids
+    results = [lookup(lat, lng) for lat, lng, _ in points]
+    elapsed = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        results = [lookup(lat, lng) for lat, lng, _ in points]
+        elapsed.append(time.perf_counter() - start)
+
+    latencies = []
+    for lat, lng, _ in points:
+        start = time.perf_counter_ns()
+        lookup(lat, lng)
+        latencies.append((time.perf_counter_ns() - start) / 1000)
+    return results, get_throughput(len(points), elapsed), get_latencies(latencies)
+
+
+def measure_bulk(world_sectors: dict, sectors: dict, points: list, repeat: int,
+                 batch_size: int = BULK_BATCH_SIZE) -> tuple:
+    # same as measure, latencies are of lookup_many calls with batch_size points
+    lats = np.array([lat for lat, _, _ in points])
+    lngs = np.array([lng for _, lng, _ in points])
+    elapsed = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        results = lookup_many(world_sectors, sectors, lats, lngs)
+        elapsed.append(time.perf_counter() - start)
+
+    latencies = []
+    for offset in range(0, len(points), batch_size):
+        start = time.perf_counter_ns()
+        lookup_many(world_sectors, sectors, lats[offset:offset + batch_size], lngs[offset:offset + batch_size])
+        latencies.append((time.perf_counter_ns() - start) / 1000)
+    return results.tolist(), get_throughput(len(points), elapsed), get_latencies(latencies)
+
+
+def get_report(world_sectors: dict, sectors: dict, grids: dict, binary: dict, quantized: dict, points: list,
+               repeat: int) -> dict:
+    report = {'points': len(points), 'paths': {}, 'countries': {}}
+    lookups = get_lookups(world_sectors, sectors, grids, binary, quantized)
+    measures = ((name, lambda lookup=lookup: measure(lookup, points, repeat)) for name, lookup in lookups.items())
+    if np is not None:
+        measures = list(measures) + [('bulk', lambda: measure_bulk(world_sectors, sectors, points, repeat))]
+
+    country_results = None
+    for name, run in measures:
+        results, throughput, latency = run()
+        entry = dict(throughput, latency_us=latency)
+        if name == 'bulk':
+            entry['batch_size'] = BULK_BATCH_SIZE
+        if name != 'get_sector':
+            entry['mismatch_rate'] = get_mismatch_rate(results, points)
+            country_results = country_results or results
+        report['paths'][name] = entry
+        print(f"{name}: {entry['throughput']:,.0f} points/s (spread {entry['spread']:.0%}), "
+              f"latency{' per batch' if name == 'bulk' else ''} p50 {latency['p50']:.1f} us, "
+              f"p99 {latency['p99']:.1f} us" +
+              (f", mismatch rate {entry['mismatch_rate']:.4%}" if 'mismatch_rate' in entry else ''))
+
+    # per country accuracy of the reference core path
+    totals = {}
+    for result, (_, _, name) in zip(country_results, points):
+        total = totals.setdefault(name, [0, 0])
+        total[0] += 1
+        total[1] += result != name
+    for name, (count, mismatches) in sorted(totals.items()):
+        report['countries'][name] = {'points': count, 'mismatch_rate': mismatches / count}
+    return report
+
+
+def get_mismatch_rate(results: list, points: list) -> float:
+    if not points:
+        return 0.0
+    return sum(result != name for result, (_, _, name) in zip(results, points)) / len(points)
+
+
+def get_regressions(report: dict, baseline: dict, max_slowdown: float, max_accuracy_loss: float,
+                    max_country_loss: float) -> list:
+    # list of human readable regressions of report against baseline;
+    # allowed slowdown grows by spread of repeated runs, so noisy paths do not fail unchanged builds,
+    # but at most by MAX_NOISE of it, so a single slow run cannot hide a real regression
+    regressions = []
+    for name, entry in report['paths'].items():
+        reference = baseline['paths'].get(name)
+        if reference is None:
+            continue
+        spread = max(entry.get('spread', 0.0), reference.get('spread', 0.0))
+        noise = min(spread, max_slowdown * MAX_NOISE)
+        if entry['throughput'] < reference['throughput'] * (1 - max_slowdown - noise):
+            regressions.append(f"{name}: throughput {entry['throughput']:,.0f} points/s, "
+                               f"baseline {reference['throughput']:,.0f} points/s, noise {noise:.0%}"
+                               + (f" (spread {spread:.0%}, inconclusive, rerun with higher --repeat)"
+                                  if spread > noise else ""))
+        if 'mismatch_rate' in entry and entry['mismatch_rate'] > reference['mismatch_rate'] + max_accuracy_loss:
+            regressions.append(f"{name}: mismatch rate {entry['mismatch_rate']:.4%}, "
+                               f"baseline {reference['mismatch_rate']:.4%}")
+    for name, entry in report['countries'].items():
+        reference = baseline['countries'].get(name)
+        if reference is not None and entry['mismatch_rate'] > reference['mismatch_rate'] + max_country_loss:
+            regressions.append(f"{name}: mismatch rate {entry['mismatch_rate']:.2%}, "
+                               f"baseline {reference['mismatch_rate']:.2%}")
+    return regressions
@@ -0,0 +1,221 @@
+import io
+import json
+import random
+import tempfile
+import unittest
+from contextlib import redirect_stderr, redirect_stdout
+from unittest import mock
+
+from shapely.geometry import Polygon
+from shapely.ops import unary_union
+
+from ..scripts.stage_1 import main as stage_1
+from ..scripts.stage_1.main import FeatureReader, SECTOR_MARGIN, TOLERANCE, get_country_tasks, get_sector_grid, \
+    map_polygons_to_sectors, merge_country, merge_polygons
+# stage scripts import build cache as top level module, patch the same one
+import build_cache  # noqa: E402
+
+# unit tests of stage 1 helpers, run from repository root with: python -m unittest workflow.test.test_stage_1
+
+FEATURES = [
+    {'type': 'Feature', 'properties': {'ISO_A3': 'AAA', 'NAME': 'say "hi" {not an object} [nor array] \\ ,:'},
+     'geometry': {'type': 'Polygon', 'coordinates': [[[0.5, 1e-3], [-12.25, 3], [7, -0.125], [0.5, 1e-3]]]}},
+    {'type': 'Feature', 'properties': {'ISO_A3': 'BBB', 'NAME': 'Zoë — \\u escaped'},
+     'geometry': {'type': 'Point', 'coordinates': [123456789.125, -1]}},
+]
+
+
+def read_features(text: str, read_size: int) -> list:
+    return list(FeatureReader(io.StringIO(text), read_size))
+
+
+def merge_polygons_pairwise(country_polygons, rest_polygons) -> list:
+    # reference: merge_polygons before the merge queue, rescanning all pairs from the start after every merge
+    merged_polygons = [Polygon(coordinates) for coordinates in country_polygons]
+    while True:
+        for i in range(len(merged_polygons)):
+            for j in range(i + 1, len(merged_polygons)):
+                merged_polygon = unary_union([merged_polygons[i], merged_polygons[j]]).convex_hull
+                merged_polygon = merged_polygon.simplify(tolerance=TOLERANCE, preserve_topology=True)
+                if not any(merged_polygon.intersects(Polygon(rest_polygon)) for rest_polygon in rest_polygons):
+                    merged_polygons[i] = merged_polygon
+                    merged_polygons.pop(j)
+                    break
+            else:
+                continue
+            break
+        else:
+            return merged_polygons
+
+
+def get_squares(count: int, size: float, seed: int) -> list:
+    generator = random.Random(seed)
+    squares = []
+    for _ in range(count):
+        x, y = generator.uniform(0, 10), generator.uniform(0, 10)
+        squares.append([(x, y), (x, y + size), (x + size, y + size), (x + size, y), (x, y)])
+    return squares
+
+
+class FeatureReaderTest(unittest.TestCase):
+
+    def assert_features(self, text: str, expected: list):
+        # every chunk size splits keys, strings, escapes and numbers at different places
+        for read_size in range(1, 8):
+            self.assertEqual(read_features(text, read_size), expected, 'read_size %d' % read_size)
+
+    def test_compact(self):
+        collection = {'type': 'FeatureCollection', 'features': FEATURES}
+        self.assert_features(json.dumps(collection, separators=(',', ':')), FEATURES)
+
+    def test_whitespace(self):
+        collection = {'type': 'FeatureCollection', 'name': 'test', 'features': FEATURES, 'bbox': [0, 0, 1, 1]}
+        self.assert_features(json.dumps(collection, indent=4).replace('\n', ' \r\n\t\n'), FEATURES)
+        self.assert_features('\n { "features" :\n[\n%s\n ,\n\n%s ] \n}\n' % tuple(map(json.dumps, FEATURES)),
+                             FEATURES)
+
+    def test_escaped_strings(self):
+        text = json.dumps({'features': FEATURES}, ensure_ascii=False)
+        self.assertIn('\\"hi\\"', text)
+        self.assert_features(text, FEATURES)
+        self.assert_features(json.dumps({'features': FEATURES}), FEATURES)
+
+    def test_empty(self):
+        self.assert_features('{"type": "FeatureCollection", "features": []}', [])
+        self.assert_features('{"features": [ \n ], "type": "FeatureCollection"}', [])
+        self.assert_features('{}', [])
+        self.assert_features(' { } ', [])
+
+    def test_truncated(self):
+        text = json.dumps({'type': 'FeatureCollection', 'features': FEATURES})
+        # cut inside of key, string, number, between features and before the end of the collection
+        for end in (1, 5, text.index('NAME') + 2, text.index('hi'), text.index('123456') + 3,
+                    text.index('}, {') + 1, text.index('}, {') + 3, len(text) - 2, len(text) - 1):
+            for read_size in (1, 3, 1 << 20):
+                with self.assertRaises(ValueError, msg='end %d, read_size %d' % (end, read_size)):
+                    read_features(text[:end], read_size)
+
+    def test_invalid(self):
+        with self.assertRaises(ValueError):
+            read_features('[]', 4)
+        with self.assertRaises(ValueError):
+            read_features('{"features": [{}; {}]}', 4)
+
+
+class MergePolygonsTest(unittest.TestCase):
+
+    def test_matches_pairwise(self):
+        # small islands of one country between islands of another, so some merges are blocked
+        country_polygons = get_squares(14, 0.6, 0)
+        rest_polygons = get_squares(8, 0.8, 1)
+
+        with redirect_stdout(io.StringIO()), redirect_stderr(io.StringIO()):
+            merged = merge_polygons(country_polygons, rest_polygons, 'AAA')
+        expected = merge_polygons_pairwise(country_polygons, rest_polygons)
+        self.assertGreater(len(expected), 1)
+        self.assertLess(len(expected), len(country_polygons))
+        self.assertEqual([list(polygon.exterior.coords) for polygon in merged],
+                         [list(polygon.exterior.coords) for polygon in expected])
+
+    def test_sector_matches_pairwise(self):
+        # whole sector, countries merged in order of appearance with already merged ones in the rest
+        polygons = [{name: [list(point) for point in square]}
+                    for name, seed in (('AAA', 2), ('BBB', 3), ('CCC', 4)) for square in get_squares(6, 0.7, seed)]
+        random.Random(5).shuffle(polygons)
+
+        with redirect_stdout(io.StringIO()), redirect_stderr(io.StringIO()):
+            merged = {task[2]: merge_country(task) for task in get_country_tasks(polygons)}
+        expected = {task[2]: [list(polygon.exterior.coords) for polygon in merge_polygons_pairwise(*task[:2])]
+                    for task in get_country_tasks(polygons)}
+        self.assertEqual(list(merged), list(expected))
+        self.assertEqual(merged, expected)
+
+
+class CacheTest(unittest.TestCase):
+
+    def setUp(self):
+        directory = tempfile.TemporaryDirectory()
+        self.addCleanup(directory.cleanup)
+        patcher = mock.patch.object(build_cache, 'CACHE_DIRECTORY', directory.name)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+        polygons = [{name: [list(point) for point in square]}
+                    for name, seed in (('AAA', 6), ('BBB', 7)) for square in get_squares(4, 0.7, seed)]
+        self.sectors = {'sector.json': polygons}
+        self.bounds = {'sector.json': [0, 0, 10, 10]}
+
+    def simplify(self, sectors: dict) -> tuple:
+        # merged sectors and names of countries merged instead of read from cache
+        merge = mock.Mock(wraps=stage_1.merge_sector_country)
+        with mock.patch.object(stage_1, 'merge_sector_country', merge), \
+                redirect_stdout(io.StringIO()), redirect_stderr(io.StringIO()):
+            results = stage_1.simplify_sectors(sectors, self.bounds, 1)
+        return results, [task[2] for _, task in (call.args for call in merge.call_args_list)]
+
+    def test_hit(self):
+        results, merged = self.simplify(self.sectors)
+        self.assertEqual(merged, ['AAA', 'BBB'])
+        cached, merged = self.simplify(self.sectors)
+        self.assertEqual(merged, [])
+        # cached points are read back as lists, written output is the same
+        self.assertEqual(json.dumps(cached), json.dumps(results))
+
+    def test_input_changed(self):
+        self.simplify(self.sectors)
+        polygons = json.loads(json.dumps(self.sectors['sector.json']))
+        # moved vertex invalidates its country, BBB keeps its key as the polygon is outside of its bounding box
+        first = next(polygon for polygon in polygons if 'AAA' in polygon)
+        first['AAA'][1][0] += 1e-9
+        self.assertEqual(self.simplify({'sector.json': polygons})[1], ['AAA'])
+        # far away polygon of another country does not touch bounding box of AAA nor BBB
+        polygons.append({'CCC': [[50, 50], [50, 51], [51, 51], [51, 50], [50, 50]]})
+        self.assertEqual(self.simplify({'sector.json': polygons})[1], ['CCC'])
+
+    def test_tolerance_changed(self):
+        self.simplify(self.sectors)
+        with mock.patch.object(stage_1, 'TOLERANCE', TOLERANCE / 2):
+            self.assertEqual(self.simplify(self.sectors)[1], ['AAA', 'BBB'])
+        self.assertEqual(self.simplify(self.sectors)[1], [])
+
+    def test_code_changed(self):
+        self.simplify(self.sectors)
+        with mock.patch.object(stage_1, 'get_file_hash', return_value='0' * 64):
+            self.assertEqual(self.simplify(self.sectors)[1], ['AAA', 'BBB'])
+        self.assertEqual(self.simplify(self.sectors)[1], [])
+
+
+class ClippingTest(unittest.TestCase):
+
+    def map_polygons(self, polygons: list) -> dict:
+        sectors = get_sector_grid({'west.json': [0, 0, 10, 10], 'east.json': [0, 10, 10, 20]})
+        with redirect_stdout(io.StringIO()):
+            return map_polygons_to_sectors(polygons, sectors)
+
+    def test_clipping(self):
+        # input points are [lng, lat], as in GeoJSON, output points are [lat, lng]
+        inside = [[1, 1], [3, 1], [3, 2], [1, 1]]
+        crossing = [[5, 2], [15, 2], [15, 4], [5, 4], [5, 2]]
+        outside = [[30, 2], [32, 2], [32, 4], [30, 2]]
+        assigned = self.map_polygons([{'AAA': inside}, {'BBB': crossing}, {'CCC': outside}])
+
+        self.assertEqual(list(assigned), ['west.json', 'east.json'])
+        self.assertEqual(assigned['west.json'][0], {'AAA': [[lat, lng] for lng, lat in inside]})
+        self.assertEqual([next(iter(polygon)) for polygon in assigned['west.json']], ['AAA', 'BBB'])
+        self.assertEqual([next(iter(polygon)) for polygon in assigned['east.json']], ['BBB'])
+
+        # crossing polygon is cut at sector edges extended by margin, on both sides
+        for sector, (lng_min, lng_max) in (('west.json', (5, 10 + SECTOR_MARGIN)),
+                                           ('east.json', (10 - SECTOR_MARGIN, 15))):
+            part = Polygon(assigned[sector][-1]['BBB'])
+            self.assertEqual(part.bounds, (2, lng_min, 4, lng_max))
+            self.assertAlmostEqual(part.area, 2 * (lng_max - lng_min))
+
+    def test_touching(self):
+        # polygon reaching sector edge is kept whole in its sector, the neighbour gets the strip within margin
+        touching = [[5, 2], [10, 2], [10, 4], [5, 4], [5, 2]]
+        assigned = self.map_polygons([{'AAA': touching}])
+
+        self.assertEqual(assigned['west.json'], [{'AAA': [[lat, lng] for lng, lat in touching]}])
+        self.assertEqual(len(assigned['east.json']), 1)
+        self.assertEqual(Polygon(assigned['east.json'][0]['AAA']).bounds, (2, 10 - SECTOR_MARGIN, 4, 10))